@@ -85,11 +85,11 @@ class ImageMachine:
 
 
 from tasks.arc_text.main import main as arctext
-from tasks.general_table.factory import BackTableFactory
+from tasks.general_table.factory import BackTableFactory, GeneralTableFactory
 from tasks.financial_statement.fs_factory import FSFactory
 
 
-def main(mode, batch=10, lang=None, clear_output=False):
+def main(mode, batch=10, lang=None, clear_output=False, workers=0):
     """
     The main function is the entry point for the program.
     It creates an ImageMachine object and calls its run method to generate images.
@@ -107,6 +107,7 @@ def main(mode, batch=10, lang=None, clear_output=False):
     :param mode: 种类名
     :param batch: 数量
     :param lang: 语种
+    :param workers: 进程数，0 表示单进程，仅用于财报、排版、银行流水和 yaml 表格
     :return: None
     """
     if mode == "arctext":
@@ -120,7 +121,7 @@ def main(mode, batch=10, lang=None, clear_output=False):
                 "The lang of financial_statement only support 'zh_CN' and 'en'"
             )
         ff = FSFactory("all", batch, lang, need_proc=True)
-        ff.run()
+        return ff.run_parallel(workers) if workers else ff.run()
 
     if mode == "layout":
         if lang not in ("zh_CN", "en"):
@@ -128,16 +129,16 @@ def main(mode, batch=10, lang=None, clear_output=False):
                 "The lang of financial_statement only support 'zh_CN' and 'en'"
             )
         ff = FSFactory("sp", batch, lang, need_proc=True)
-        ff.run()
+        return ff.run_parallel(workers) if workers else ff.run()
 
     if mode == "bankflow":
         factory = BackTableFactory(batch)
-        factory.start()
+        return factory.run_parallel(workers) if workers else factory.start()
 
     if mode.endswith(".yaml"):
         # config = "config/%s.yaml" % mode
         factory = GeneralTableFactory(config=mode, batch=batch, use_faker=True)
-        factory.start()
+        return factory.run_parallel(workers) if workers else factory.start()
 
     if not lang:
         langs = [
@@ -198,6 +199,9 @@ if __name__ == "__main__":
         help=f"lang code, one of {lang_str}",
     )
     parser.add_argument("--clear_output", help="清空mode类输出文件夹下所有内容", action="store_true")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=0, help="进程数，0 表示单进程"
+    )
     args = parser.parse_args()
 
-    main(args.mode, args.batch, args.lang, args.clear_output)
+    main(args.mode, args.batch, args.lang, args.clear_output, args.workers)
@@ -6,3 +6,4 @@ PROJECT_DIR = osp.dirname(PACKAGE_DIR)
 
 STATIC_DIR = os.environ.get("TIS_STATIC_DIR", None) or osp.join(PACKAGE_DIR, "static")
 OUTPUT_DIR = os.environ.get("TIS_OUTPUT_DIR", None) or osp.join(PROJECT_DIR, "output")
+CACHE_DIR = os.environ.get("TIS_CACHE_DIR", None) or osp.join(PROJECT_DIR, "cache")
@@ -163,6 +163,50 @@ class AwesomeTable(prettytable.PrettyTable):
         if title_pos == "r":
             return _hstack(sos, vtitle)
 
+    def iter_rows(self, **kwargs):
+        """
+        逐行生成表格字符，每次只拼接一行数据
+        列宽仍需先遍历全部数据计算，但不会构造整张表的字符串
+        :return: yield list[str] 顶部边框、每行数据连同其下的横线、底部边框各为一组
+        """
+        title = kwargs.get("title") or self._title
+        if title and self._title_pos != "t":  # 侧边标题需要整体拼接
+            yield self.get_string(**kwargs).split("\n")
+            return
+
+        kwargs["header"] = False
+        options = self._get_options(kwargs)
+        if self.rowcount == 0 and (not options["print_empty"] or not options["border"]):
+            return
+        rows = self._get_rows(options)
+        formatted_rows = self._format_rows(rows, options)
+        self._compute_widths(formatted_rows, options)
+        self._hrule = self._stringify_hrule(options)
+
+        if title:
+            yield self._stringify_title(title, options).split("\n")
+        if options["border"] and options["hrules"] in (ALL, FRAME):
+            top = self._stringify_hrule(options, where="top_")
+            if title and options["vrules"] in (ALL, FRAME):
+                top = self.left_junction_char + top[1:-1] + self.right_junction_char
+            yield [top]
+
+        bottom = self._stringify_hrule(options, where="bottom_")
+        last = len(formatted_rows) - 1
+        for rno, row in enumerate(formatted_rows):
+            hrule = bottom if rno == last else self._hrule
+            yield self._stringify_row(row, options, hrule).split("\n")
+        if options["border"] and options["hrules"] == FRAME:
+            yield [bottom]
+
+    def iter_lines(self, **kwargs):
+        """
+        逐行生成字符串表示，与 get_string().split("\\n") 一致
+        :return: yield str
+        """
+        for lines in self.iter_rows(**kwargs):
+            yield from lines
+
     def _compute_table_width(self, options):
         """增加了竖线数量的统计"""
         table_width = 2 if options["vrules"] in (FRAME, ALL) else 0
@@ -414,6 +458,54 @@ class MultiTable(object):
         return self.get_string()
 
 
+def iter_lines(table):
+    """
+    表格的逐行迭代器
+    :param table: AwesomeTable | str | list[str]
+    :return: Iterator[str]
+    """
+    if isinstance(table, AwesomeTable):
+        return table.iter_lines()
+    if isinstance(table, list):
+        return iter(table)
+    return iter(str(table).split("\n"))
+
+
+def paginate_lines(lines, lines_per_page=40):
+    """流式分页，逐行读入，整页输出
+
+    1.保证按行分割，行内有换行不会被分开
+    2.必须分割时另起一页，以上一页最后的横线封顶
+    :param lines: Iterable[str] 表格字符行
+    :param lines_per_page: int 每页数据行数
+    :return: yield list[str] 每页的字符行
+    """
+    page = []
+    block = []  # 两条横线之间的数据行
+    lct = 0
+
+    def close_block():
+        nonlocal page, lct
+        if block and block[0][:1] == "║":
+            if lct >= lines_per_page:
+                yield page
+                page = [page[-1]]  # 封顶
+                lct = 0
+            lct += len(block)
+        page.extend(block)
+        block.clear()
+
+    for line in lines:
+        if line and line[0] in "╔╠╚":
+            yield from close_block()
+            page.append(line)
+        else:
+            block.append(line)
+    yield from close_block()
+    if page:
+        yield page
+
+
 def paginate(table, lines_per_page=40):
     """分页算法
 
@@ -421,23 +513,8 @@ def paginate(table, lines_per_page=40):
     2.必须分割时另起一页
     3.修复分割线
     """
-    lct = 0
-    lines = re.split(H_LINE_PATTERN, str(table))
-    out = ""
-    for line in lines:
-        if not line:
-            continue
-        if line[0] == "║":
-            if lct >= lines_per_page:
-                yield out
-                out = out.splitlines()[-1] + "\n" + line  # 封顶
-                lct = len(line.splitlines())
-            else:
-                out += line
-                lct += len(line.splitlines())
-        else:
-            out += line
-    yield out
+    for page in paginate_lines(iter_lines(table), lines_per_page):
+        yield "\n".join(page)
 
 
 def clear_symbols(table):
@@ -544,7 +621,10 @@ def add_width(table, num=1, align="m"):
     :param num: int 字符数
     :return: str
     """
-    lines = str(table).splitlines()
+    return "\n".join(_add_width_lines(str(table).splitlines(), num, align))
+
+
+def _add_width_lines(lines, num=1, align="m"):
     newlines = []
     for line in lines:
         try:
@@ -573,7 +653,7 @@ def add_width(table, num=1, align="m"):
         except IndexError:
             newline = line
         newlines.append(newline)
-    return "\n".join(newlines)
+    return newlines
 
 
 def add_newline(table, num=1, align="t"):
@@ -584,8 +664,11 @@ def add_newline(table, num=1, align="t"):
     :param align: str 对齐方式
     :return: str
     """
+    return "\n".join(_add_newline_lines(str(table).splitlines(), num, align))
+
+
+def _add_newline_lines(scale_lines, num=1, align="t"):
     idx = -1
-    scale_lines = str(table).splitlines()
     if align == "t":
         idx = -1
     elif align == "b":
@@ -599,12 +682,10 @@ def add_newline(table, num=1, align="t"):
             insect_line.append("║")
     insect_line = "".join(insect_line)
     if align == "t":
-        for _ in range(num):
-            scale_lines.insert(idx, insect_line)
+        scale_lines[-1:-1] = [insect_line] * num
     else:
-        for _ in range(num):
-            scale_lines.insert(1, insect_line)
-    return "\n".join(scale_lines)
+        scale_lines[1:1] = [insect_line] * num
+    return scale_lines
 
 
 def _hstack(self, other, merged=True, space=0, align="t"):
@@ -617,18 +698,23 @@ def _hstack(self, other, merged=True, space=0, align="t"):
     :param align: str 扩展行的对齐方式 't'顶端对齐 'b'底端对齐
     :return: str
     """
-    sos = str(self)  # str of self
-    soo = str(other)  # str of other
-    hos = len(sos.splitlines())
-    hoo = len(soo.splitlines())
+    return "\n".join(_hstack_lines(_lines(self), _lines(other), merged, space, align))
+
+
+def _lines(table):
+    """表格字符行，列表会复制一份以免被原地修改"""
+    if isinstance(table, list):
+        return list(table)
+    return str(table).splitlines()
+
+
+def _hstack_lines(self_lines, other_lines, merged=True, space=0, align="t"):
+    hos = len(self_lines)
+    hoo = len(other_lines)
     if hos > hoo:
-        soo = add_newline(soo, hos - hoo, align)
+        other_lines = _add_newline_lines(other_lines, hos - hoo, align)
     elif hos < hoo:
-        sos = add_newline(sos, hoo - hos, align)
-    else:
-        pass
-    self_lines = sos.splitlines()
-    other_lines = soo.splitlines()
+        self_lines = _add_newline_lines(self_lines, hoo - hos, align)
     new_lines = []
     for left, right in zip(self_lines, other_lines):
         if merged:
@@ -652,7 +738,7 @@ def _hstack(self, other, merged=True, space=0, align="t"):
             new_lines.append(left[:-1] + ret + right[1:])
         else:
             new_lines.append(left + " " * space + right)
-    return "\n".join(new_lines)
+    return new_lines
 
 
 def _vstack(self, other, merged=True, align="m"):
@@ -663,23 +749,21 @@ def _vstack(self, other, merged=True, align="m"):
     :param merged: bool 是否合并
     :return: str
     """
-    sos = str(self)  # str of self
-    soo = str(other)  # str of other
-    hos = len(sos.splitlines()[0])
-    hoo = len(soo.splitlines()[0])
+    return "\n".join(_vstack_lines(_lines(self), _lines(other), merged, align))
+
+
+def _vstack_lines(self_lines, other_lines, merged=True, align="m"):
+    hos = len(self_lines[0])
+    hoo = len(other_lines[0])
     if hos > hoo:
-        soo = add_width(soo, hos - hoo, align)
+        other_lines = _add_width_lines(other_lines, hos - hoo, align)
     elif hos < hoo:
-        sos = add_width(sos, hoo - hos, align)
-    else:
-        pass
-    if sos.splitlines()[-1][-1] != "╝" or soo[0] != "╔":
-        return sos + "\n" + soo
-    if not merged:
-        return sos + "\n" + soo  # {' '*len(sos.splitlines()[0])}
-
-    end_of_self = sos.splitlines()[-1]
-    begin_of_other = soo.splitlines()[0]
+        self_lines = _add_width_lines(self_lines, hoo - hos, align)
+    if self_lines[-1][-1] != "╝" or other_lines[0][0] != "╔" or not merged:
+        return self_lines + other_lines
+
+    end_of_self = self_lines[-1]
+    begin_of_other = other_lines[0]
     ret = []
     for end, beg in zip(end_of_self, begin_of_other):
         if end == beg == "═":
@@ -699,8 +783,7 @@ def _vstack(self, other, merged=True, align="m"):
         else:
             raise Exception("Unmatch symbol %s and %s" % (end, beg))
     midline = "".join(ret)
-    new_lines = sos.splitlines()[:-1] + [midline] + soo.splitlines()[1:]
-    return "\n".join(new_lines)
+    return self_lines[:-1] + [midline] + other_lines[1:]
 
 
 def hstack(tables, other=None, merged=True, align="t"):
@@ -711,8 +794,14 @@ def hstack(tables, other=None, merged=True, align="t"):
     :return: str
     """
     if isinstance(tables, list) and other is None:
-        return reduce(partial(_hstack, merged=merged, align=align), tables)
-    return _hstack(tables, other, merged, align)
+        if len(tables) == 1:
+            return tables[0]
+        lines = reduce(
+            partial(_hstack_lines, merged=merged, align=align),
+            map(_lines, tables),
+        )
+        return "\n".join(lines)
+    return _hstack(tables, other, merged, align=align)
 
 
 def vstack(tables, other=None, merged=True, align="m"):
@@ -723,7 +812,13 @@ def vstack(tables, other=None, merged=True, align="m"):
     :return: str
     """
     if isinstance(tables, list) and other is None:
-        return reduce(partial(_vstack, merged=merged, align=align), tables)
+        if len(tables) == 1:
+            return tables[0]
+        lines = reduce(
+            partial(_vstack_lines, merged=merged, align=align),
+            map(_lines, tables),
+        )
+        return "\n".join(lines)
     return _vstack(tables, other, merged, align)
 
 
@@ -0,0 +1,229 @@
+"""
+横条带并行光栅化
+整页按高度切成若干横条，文字和线按外接框的纵向范围分到条带，
+跨越条带边界的图元分到所有相交的条带。条带画布只包含自己的行，
+超出部分自然被裁掉，所以拼起来与整页绘制逐像素相同。
+各条带直接写入整页缓冲区的对应行，不再拼接。
+PIL 画文字和线时释放 GIL，默认在常驻线程池中并行；
+只有超大页面、且进程中没有其他线程时才 fork 子进程，写入共享匿名内存，
+避免普通页面每页 fork 的开销和带着其他线程 fork 的死锁风险。
+"""
+import mmap
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+MIN_BAND_HEIGHT = 64  # 条带太矮时并行的开销超过收益
+FORK_MIN_PIXELS = 2480 * 3508  # 300dpi 的 A4，小于它的页面用线程
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_CHANNELS = {"RGBA": 4, "RGB": 3, "L": 1}
+
+
+class BandDraw(ImageDraw.ImageDraw):
+    """条带画笔，接受整页坐标，纵坐标减去条带顶部"""
+
+    def __init__(self, image, top):
+        super().__init__(image)
+        self.top = top
+        self._nested = False
+
+    def _shift(self, xy):
+        if len(xy) and isinstance(xy[0], (tuple, list)):
+            return [(x, y - self.top) for x, y in xy]
+        xy = list(xy)
+        xy[1::2] = [y - self.top for y in xy[1::2]]
+        return xy
+
+    def line(self, xy, fill=None, width=0, joint=None):
+        super().line(self._shift(xy), fill, width, joint)
+
+    def text(self, xy, text, *args, **kwargs):
+        if self._nested:  # 多行文字会逐行再调用 text，只平移一次
+            return super().text(xy, text, *args, **kwargs)
+        self._nested = True
+        try:
+            return super().text((xy[0], xy[1] - self.top), text, *args, **kwargs)
+        finally:
+            self._nested = False
+
+
+def _segment(segment, fill, width, drawer):
+    x_0, y_0, x_1, y_1 = segment
+    drawer.line(((x_0, y_0), (x_1, y_1)), fill=fill, width=width)
+
+
+def _text(xy, text, fill, font, anchor, drawer):
+    drawer.text(xy, text, fill, font, anchor)
+
+
+def _multiline(text, op):
+    """getbbox 只量得出单行文字，多行文字画到所有条带"""
+    if isinstance(text, str) and "\n" in text:
+        return -np.inf, np.inf, op[2]
+    return op
+
+
+def draw_ops(obj):
+    """
+    图元拆成绘制操作，数组形式的图元按元素拆开
+    :param obj: Line、Text 等具有 render(drawer) 的图元，或 LineArray、TextArray
+    :return: list[tuple[float,float,callable]] 纵向范围 [上, 下) 和绘制函数
+    """
+    if hasattr(obj, "segments"):  # LineArray
+        pad = obj.width + 1
+        return [
+            (
+                min(seg[1], seg[3]) - pad,
+                max(seg[1], seg[3]) + pad + 1,
+                partial(_segment, seg, obj.fill, obj.width),
+            )
+            for seg in obj.segments.tolist()
+        ]
+    if hasattr(obj, "offsets"):  # TextArray
+        tops = (obj.xy[:, 1] + obj.offsets[:, 1]).tolist()
+        bottoms = (obj.xy[:, 1] + obj.offsets[:, 3]).tolist()
+        ops = []
+        for top, bottom, xy, text, anchor in zip(
+            tops, bottoms, obj.xy.tolist(), obj.texts, obj.anchors
+        ):
+            func = partial(_text, tuple(xy), text, obj.fill, obj.font, anchor)
+            ops.append(_multiline(text, (top, bottom, func)))
+        return ops
+    if hasattr(obj, "start") and hasattr(obj, "end"):  # Line
+        pad = obj.width + 1
+        top, bottom = sorted((obj.start[1], obj.end[1]))
+        return [(top - pad, bottom + pad + 1, obj.render)]
+    if hasattr(obj, "top") and hasattr(obj, "bottom"):  # Text 等带边框的元素
+        pad = max(getattr(obj, "line_widths", None) or [0]) + 1
+        op = (obj.top - pad, obj.bottom + pad + 1, obj.render)
+        return [_multiline(getattr(obj, "text", ""), op)]
+    return [(-np.inf, np.inf, obj.render)]
+
+
+def split_bands(height, bands=None):
+    """
+    条带的上下边界
+    :param height: int 页面高度
+    :param bands: int 条带数，None 为 CPU 核数
+    :return: list[tuple[int,int]]
+    """
+    bands = bands or os.cpu_count() or 1
+    bands = max(1, min(bands, height // MIN_BAND_HEIGHT))
+    edges = np.linspace(0, height, bands + 1).astype(int).tolist()
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def assign(ops, spans):
+    """
+    按纵向范围把绘制操作分到条带，保持原有的绘制顺序
+    :param ops: list 绘制操作
+    :param spans: list[tuple[int,int]] 条带边界
+    :return: list[list[callable]]
+    """
+    if not ops:
+        return [[] for _ in spans]
+    tops = np.array([op[0] for op in ops], np.float64)
+    bottoms = np.array([op[1] for op in ops], np.float64)
+    funcs = [op[2] for op in ops]
+    out = []
+    for top, bottom in spans:
+        hit = np.flatnonzero((tops < bottom) & (bottoms > top))
+        out.append([funcs[i] for i in hit.tolist()])
+    return out
+
+
+def _render_band(page, top, bottom, funcs):
+    strip = Image.fromarray(page[top:bottom])
+    drawer = BandDraw(strip, top)
+    for func in funcs:
+        func(drawer)
+    page[top:bottom] = np.asarray(strip).reshape(page[top:bottom].shape)
+
+
+def _thread_pool():
+    """常驻线程池，fork 出的子进程取用时各自重建"""
+    global _pool, _pool_pid  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(os.cpu_count() or 1, "band")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _fork_context(pixels):
+    """
+    值得并且可以安全 fork 时返回 fork 上下文
+    守护进程不能再有子进程，有其他线程时 fork 可能继承被占用的锁
+    :param pixels: int 页面像素数
+    :return: multiprocessing context|None
+    """
+    if pixels < FORK_MIN_PIXELS or threading.active_count() > 1:
+        return None
+    if "fork" not in mp.get_all_start_methods() or mp.current_process().daemon:
+        return None
+    return mp.get_context("fork")
+
+
+def _run(page, jobs):
+    if len(jobs) == 1:
+        _render_band(page, *jobs[0])
+        return
+    ctx = _fork_context(page.shape[0] * page.shape[1])
+    if ctx is None:
+        pool = _thread_pool()
+        list(pool.map(lambda job: _render_band(page, *job), jobs))
+        return
+    # fork 的子进程直接继承图元，不需要序列化
+    procs = [ctx.Process(target=_render_band, args=(page,) + job) for job in jobs]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    failed = [job[:2] for job, proc in zip(jobs, procs) if proc.exitcode != 0]
+    if failed:
+        raise RuntimeError("条带光栅化失败 %s" % failed)
+
+
+def render_bands(objects, size, bands=None, background=None, mode="RGBA"):
+    """
+    按横条带并行光栅化图元
+    :param objects: Iterable 图元，见 draw_ops
+    :param size: tuple[int,int] 页面宽高
+    :param bands: int 条带数，None 为 CPU 核数
+    :param background: PIL.Image 背景，None 时为全透明
+    :param mode: str 没有背景时的图片模式 RGBA/RGB/L
+    :return: PIL.Image
+    """
+    width, height = size
+    if background is not None:
+        mode = background.mode if background.mode in _CHANNELS else "RGBA"
+        background = background.convert(mode)
+    channels = _CHANNELS[mode]
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    buffer = mmap.mmap(-1, max(1, width * height * channels))  # 进程间共享
+    page = np.frombuffer(buffer, np.uint8, width * height * channels).reshape(shape)
+    if background is not None:
+        page[...] = np.asarray(background)
+
+    spans = split_bands(height, bands)
+    ops = [op for obj in objects for op in draw_ops(obj)]
+    jobs = [
+        (top, bottom, funcs)
+        for (top, bottom), funcs in zip(spans, assign(ops, spans))
+        if funcs
+    ]
+    if jobs:
+        _run(page, jobs)
+    if mode in ("RGBA", "L"):
+        # 直接引用共享缓冲区，修改时 PIL 才会复制
+        return Image.frombuffer(mode, size, buffer, "raw", mode, 0, 1)
+    return Image.fromarray(page, mode)
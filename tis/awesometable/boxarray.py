@@ -0,0 +1,422 @@
+"""
+数组形式的几何图元
+imagedata 中每个文字、单元格、线都是一个 Rect 对象，属性修改会层层触发回调，
+大表格会创建数万个对象。这里把同类图元存成 numpy 数组：
+BoxArray 是 (N,4) 的 left,top,right,bottom，LineArray 是 (N,4) 的起点终点，
+TextArray 保存锚点和相对锚点的文字框。移动、对齐、合并都是整列运算，
+渲染时直接遍历数组绘制，不再创建中间对象。
+"""
+import numpy as np
+from PIL import ImageDraw
+
+from awesometable.banded import render_bands
+
+# 锚点在单元格内的相对位置，0 左/上 1 中 2 右/下
+_ANCHOR_X = {"l": 0, "m": 1, "r": 2}
+_ANCHOR_Y = {"t": 0, "m": 1, "b": 2}
+
+
+class BoxArray:
+    """矩形数组"""
+
+    __slots__ = ("boxes",)
+
+    def __init__(self, boxes=None):
+        """
+        :param boxes: Iterable[box] 或 (N,4) 数组，box 为 (left, top, right, bottom)
+        """
+        if boxes is None:
+            boxes = np.zeros((0, 4), np.int32)
+        self.boxes = np.asarray(boxes, np.int32).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __getitem__(self, index):
+        return tuple(self.boxes[index].tolist())
+
+    @property
+    def width(self):
+        return self.boxes[:, 2] - self.boxes[:, 0]
+
+    @property
+    def height(self):
+        return self.boxes[:, 3] - self.boxes[:, 1]
+
+    @property
+    def bounds(self):
+        """
+        外接矩形
+        :return: box
+        """
+        return (
+            int(self.boxes[:, 0].min()),
+            int(self.boxes[:, 1].min()),
+            int(self.boxes[:, 2].max()),
+            int(self.boxes[:, 3].max()),
+        )
+
+    def move(self, dx, dy, index=None):
+        """
+        平移
+        :param index: 要移动的序号，切片或布尔数组，None 表示全部
+        :return: None
+        """
+        index = slice(None) if index is None else index
+        self.boxes[index] += np.array((dx, dy, dx, dy), np.int32)
+
+    def merge(self, index):
+        """
+        合并矩形，合并结果放在第一个位置，其余删除
+        :param index: list[int] 要合并的序号
+        :return: int 合并后矩形的序号
+        """
+        index = sorted(index)
+        part = self.boxes[index]
+        first = index[0]
+        self.boxes[first] = (
+            part[:, 0].min(),
+            part[:, 1].min(),
+            part[:, 2].max(),
+            part[:, 3].max(),
+        )
+        self.boxes = np.delete(self.boxes, index[1:], axis=0)
+        return first
+
+    def anchors(self, align, paddings=0):
+        """
+        各矩形内对齐点的坐标
+        :param align: 两个字母的对齐方式，如 lm，或与矩形一一对应的列表
+        :param paddings: 内边距，int、(N,) 数组或 (N,4) 的左上右下
+        :return: (N,2) 数组
+        """
+        n = len(self.boxes)
+        if isinstance(align, str):
+            ax = np.full(n, _ANCHOR_X[align[0]])
+            ay = np.full(n, _ANCHOR_Y[align[1]])
+        else:
+            ax = np.fromiter((_ANCHOR_X[a[0]] for a in align), np.int32, n)
+            ay = np.fromiter((_ANCHOR_Y[a[1]] for a in align), np.int32, n)
+        pad = np.asarray(paddings, np.int32)
+        if pad.ndim == 2:
+            pad_l, pad_t, pad_r, pad_b = pad.T
+        else:
+            pad_l = pad_t = pad_r = pad_b = pad
+        left, top, right, bottom = self.boxes.T
+        x = np.choose(ax, (left + pad_l, (left + right) // 2, right - pad_r))
+        y = np.choose(ay, (top + pad_t, (top + bottom) // 2, bottom - pad_b))
+        return np.stack([x, y], axis=1)
+
+    def border_lines(self):
+        """
+        所有矩形的四条边，相邻单元格共用的边只保留一条
+        :return: LineArray
+        """
+        left, top, right, bottom = self.boxes.T
+        segments = np.concatenate(
+            [
+                np.stack([left, top, left, bottom], 1),
+                np.stack([left, top, right, top], 1),
+                np.stack([right, top, right, bottom], 1),
+                np.stack([left, bottom, right, bottom], 1),
+            ]
+        )
+        return LineArray(np.unique(segments, axis=0))
+
+    def points(self):
+        """
+        四个角点，顺时针
+        :return: (N,4,2) 数组
+        """
+        left, top, right, bottom = self.boxes.T
+        return np.stack(
+            [
+                np.stack([left, top], 1),
+                np.stack([right, top], 1),
+                np.stack([right, bottom], 1),
+                np.stack([left, bottom], 1),
+            ],
+            axis=1,
+        )
+
+
+def fit_sizes(count, starts, spans, needs, sizes=None):
+    """
+    行高或列宽取所含单元格需要的最大值，跨多行多列的单元格放不下时把差额平分到所跨的行列
+    :param count: 行数或列数
+    :param starts: (N,) 单元格起始行或列
+    :param spans: (N,) 跨度
+    :param needs: (N,) 单元格需要的高度或宽度
+    :param sizes: 初始的最小尺寸
+    :return: list[int]
+    """
+    out = np.zeros(count, np.int64)
+    if sizes is not None:
+        sizes = list(sizes)[:count]
+        out[: len(sizes)] = sizes
+    starts = np.asarray(starts)
+    spans = np.asarray(spans)
+    needs = np.asarray(needs)
+    single = spans == 1
+    np.maximum.at(out, starts[single], needs[single])
+    out = out.tolist()
+    for i in np.flatnonzero(~single)[np.argsort(spans[~single], kind="stable")]:
+        start, span = int(starts[i]), int(spans[i])
+        have = sum(out[start : start + span])
+        if needs[i] > have:
+            extra, rest = divmod(int(needs[i]) - have, span)
+            for j in range(span):
+                out[start + j] += extra + (j < rest)
+    return out
+
+
+def solve_grid(widths, heights, rows, cols, rowspans=1, colspans=1, x=0, y=0):
+    """
+    由列宽、行高和跨度一次算出所有单元格的矩形
+    :param widths: (C,) 列宽
+    :param heights: (R,) 行高
+    :param rows: (N,) 单元格左上角所在行
+    :param cols: (N,) 单元格左上角所在列
+    :param rowspans: int 或 (N,) 跨行数
+    :param colspans: int 或 (N,) 跨列数
+    :param x: 表格左上角
+    :param y: 表格左上角
+    :return: BoxArray
+    """
+    xs = np.concatenate([[x], x + np.cumsum(widths)]).astype(np.int32)
+    ys = np.concatenate([[y], y + np.cumsum(heights)]).astype(np.int32)
+    rows = np.asarray(rows, np.int32)
+    cols = np.asarray(cols, np.int32)
+    return BoxArray(
+        np.stack(
+            [xs[cols], ys[rows], xs[cols + colspans], ys[rows + rowspans]], axis=1
+        )
+    )
+
+
+def solve_layout(
+    widths,
+    heights,
+    rows,
+    cols,
+    rowspans=1,
+    colspans=1,
+    align="lm",
+    paddings=0,
+    x=0,
+    y=0,
+):
+    """
+    一次算出单元格矩形、表格线和文字锚点
+    :param align: 对齐方式，见 BoxArray.anchors
+    :param paddings: 内边距，见 BoxArray.anchors
+    :return: tuple[BoxArray,LineArray,np.ndarray]
+    """
+    cells = solve_grid(widths, heights, rows, cols, rowspans, colspans, x, y)
+    return cells, cells.border_lines(), cells.anchors(align, paddings)
+
+
+def grid_of(boxes):
+    """
+    由单元格矩形反推网格，所有单元格的边界构成网格线
+    :param boxes: (N,4) 数组
+    :return: tuple 网格起点、列宽、行高、行、列、跨行数、跨列数
+    """
+    boxes = np.asarray(boxes, np.int32).reshape(-1, 4)
+    xs = np.unique(boxes[:, [0, 2]])
+    ys = np.unique(boxes[:, [1, 3]])
+    cols = np.searchsorted(xs, boxes[:, 0])
+    rows = np.searchsorted(ys, boxes[:, 1])
+    colspans = np.searchsorted(xs, boxes[:, 2]) - cols
+    rowspans = np.searchsorted(ys, boxes[:, 3]) - rows
+    return (
+        (int(xs[0]), int(ys[0])),
+        np.diff(xs),
+        np.diff(ys),
+        rows,
+        cols,
+        rowspans,
+        colspans,
+    )
+
+
+class LineArray:
+    """线段数组，同一数组内线宽和颜色相同"""
+
+    __slots__ = ("segments", "width", "fill")
+
+    def __init__(self, segments=None, width=1, fill=(0, 0, 0, 255)):
+        if segments is None:
+            segments = np.zeros((0, 4), np.int32)
+        self.segments = np.asarray(segments, np.int32).reshape(-1, 4)
+        self.width = width
+        self.fill = fill
+
+    def __len__(self):
+        return len(self.segments)
+
+    def move(self, dx, dy, index=None):
+        index = slice(None) if index is None else index
+        self.segments[index] += np.array((dx, dy, dx, dy), np.int32)
+
+    def render(self, drawer):
+        for x_0, y_0, x_1, y_1 in self.segments.tolist():
+            drawer.line(((x_0, y_0), (x_1, y_1)), fill=self.fill, width=self.width)
+
+
+class TextArray:
+    """同一字体的文字数组"""
+
+    __slots__ = ("texts", "xy", "anchors", "offsets", "font", "fill", "_measured")
+
+    def __init__(self, texts, xy, anchors, font, fill=(0, 0, 0, 255)):
+        """
+        :param texts: list[str]
+        :param xy: (N,2) 锚点坐标
+        :param anchors: str 或 list[str] 锚点类型
+        :param font: FreeTypeFont
+        :param fill: 文字颜色
+        """
+        self.texts = list(texts)
+        self.xy = np.asarray(xy, np.int32).reshape(-1, 2)
+        if isinstance(anchors, str):
+            anchors = [anchors] * len(self.texts)
+        self.anchors = list(anchors)
+        self.font = font
+        self.fill = fill
+        self._measured = {}  # (文字, 锚点) -> 相对锚点的文字框
+        self.offsets = self._measure()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _measure(self):
+        measured = self._measured
+        offsets = np.empty((len(self.texts), 4), np.int32)
+        for i, key in enumerate(zip(self.texts, self.anchors)):
+            box = measured.get(key)
+            if box is None:
+                box = self.font.getbbox(key[0], anchor=key[1])
+                measured[key] = box
+            offsets[i] = box
+        return offsets
+
+    @property
+    def boxes(self):
+        """
+        文字框
+        :return: BoxArray
+        """
+        return BoxArray(self.offsets + np.tile(self.xy, 2))
+
+    def move(self, dx, dy, index=None):
+        index = slice(None) if index is None else index
+        self.xy[index] += np.array((dx, dy), np.int32)
+
+    def align_to(self, cells, owner, align, paddings=0):
+        """
+        按单元格重新对齐
+        :param cells: BoxArray 单元格
+        :param owner: (N,) 每个文字所属单元格的序号
+        :param align: 两个字母的对齐方式，如 lm，或与文字一一对应的列表
+        :param paddings: 内边距
+        :return: None
+        """
+        owned = BoxArray(cells.boxes[np.asarray(owner)])
+        self.xy = owned.anchors(align, paddings)
+        anchors = [align] * len(self.texts) if isinstance(align, str) else align
+        if list(anchors) != self.anchors:
+            self.anchors = list(anchors)
+            self.offsets = self._measure()
+
+    def render(self, drawer):
+        font, fill = self.font, self.fill
+        for (x, y), text, anchor in zip(self.xy.tolist(), self.texts, self.anchors):
+            drawer.text((x, y), text, fill, font, anchor)
+
+
+class TableArrays:
+    """数组形式的表格图层，渲染和标注接口与 ImageData 相同"""
+
+    bands = 1  # 渲染的条带数，None 为 CPU 核数
+
+    def __init__(self, background, cells, texts, lines):
+        """
+        :param background: 背景图
+        :param cells: BoxArray 单元格
+        :param texts: TextArray 文字
+        :param lines: LineArray 表格线
+        """
+        self.background = background
+        self.cells = cells
+        self.texts = texts
+        self.lines = lines
+        self.size = background.size
+
+    @property
+    def object_count(self):
+        """图元数量，与 ImageData 的对象数对比用"""
+        return len(self.cells) + len(self.texts) + len(self.lines)
+
+    @property
+    def image(self):
+        if self.bands != 1:
+            return render_bands(
+                [self.lines, self.texts], self.size, self.bands, self.background
+            )
+        image = self.background.copy()
+        drawer = ImageDraw.Draw(image)
+        self.lines.render(drawer)
+        self.texts.render(drawer)
+        return image
+
+    @property
+    def label(self):
+        """与 ImageData.asdict 相同格式的标签"""
+        labels = ["cell@"] * len(self.cells)
+        labels.extend(f"text@{text}" for text in self.texts.texts)
+        return labels
+
+    @property
+    def points(self):
+        """
+        与 label 一一对应的角点
+        :return: (N,4,2) 数组
+        """
+        return np.concatenate([self.cells.points(), self.texts.boxes.points()])
+
+    @classmethod
+    def from_cells(
+        cls, background, boxes, texts, font, fill, bdcolor, line_width, padding
+    ):
+        """
+        :param boxes: list[box] 单元格
+        :param texts: list[tuple[str,int,str,int]] 文字、所属单元格、对齐方式、纵向偏移
+        :param font: FreeTypeFont
+        :param fill: 文字颜色
+        :param bdcolor: 线的颜色
+        :param line_width: 线宽
+        :param padding: 文字到单元格边框的距离
+        :return: TableArrays
+        """
+        cells = BoxArray(boxes)
+        strings = [t[0] for t in texts]
+        anchors = [t[2] for t in texts]
+        text_array = TextArray(strings, np.zeros((len(texts), 2)), anchors, font, fill)
+        if texts:
+            text_array.align_to(cells, [t[1] for t in texts], anchors, padding)
+            text_array.xy[:, 1] += np.array([t[3] for t in texts], np.int32)
+        lines = cells.border_lines()
+        lines.width, lines.fill = line_width, bdcolor
+        return cls(background, cells, text_array, lines)
+
+    def asdict(self):
+        return {
+            "image": self.image,
+            "label": self.label,
+            "point": self.points.reshape(-1, 2).tolist(),
+        }
+
+    def show(self):
+        self.image.show()
+
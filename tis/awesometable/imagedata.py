@@ -9,9 +9,13 @@ from copy import deepcopy
 from functools import lru_cache
 from typing import List
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from pyrect import Rect
 
+from awesometable.banded import render_bands
+from awesometable.boxarray import BoxArray, fit_sizes, grid_of, solve_grid
+
 
 # a = list()
 
@@ -82,10 +86,22 @@ class Element(Rect):
         :return:
         :rtype:
         """
+        if self.deferred():
+            return
         self.update_lines()
         if self.parent:
             self.parent.update()
 
+    def deferred(self):
+        """所在的表格处于延迟排版状态时只记下有修改，等 layout 时统一更新"""
+        node = self
+        while node is not None:
+            if node.__dict__.get("_defer"):
+                node._dirty = True
+                return True
+            node = getattr(node, "parent", None)
+        return False
+
     # ------------- 以下是几何属性 -------
     def update_lines(self, oldbox=None, newbox=None):
         """更新线和重置线是不一样的"""
@@ -254,6 +270,8 @@ class Box(Element):
                 one.parent = self
 
     def update(self, oldbox=None, newbox=None):
+        if self.deferred():
+            return
         self.update_data()  # 里面的方法不会反向传播
         for c in self.data:
             c.update_lines()
@@ -995,6 +1013,98 @@ class Table(Col):
 
         super().__init__(initlist, *args, **kwargs)
 
+    @property
+    def cells(self):
+        """按行遍历所有单元格"""
+        for row in self.data:
+            yield from row
+
+    def defer(self):
+        """
+        开始延迟排版，记下当前的网格结构，之后的移动、改尺寸不再逐个对象级联更新，
+        直到调用 layout 或渲染
+        :return: self
+        """
+        self._grid = self._grid_of(list(self.cells))
+        self._defer = True
+        return self
+
+    def flush(self):
+        """有延迟的修改时排版，排版后继续延迟"""
+        if self.__dict__.get("_dirty"):
+            self.layout()
+            self.defer()
+
+    @staticmethod
+    def _grid_of(cells):
+        boxes = np.array([(c.left, c.top, c.right, c.bottom) for c in cells])
+        return [id(c) for c in cells], grid_of(boxes)
+
+    def layout(self, widths=None, heights=None):
+        """
+        一次算出所有单元格的矩形、边线和文字锚点
+        网格结构取 defer 时的，行高列宽取行列内单元格的最大尺寸，
+        修改过的单元格会撑开整行整列并推动后面的行列
+        :param widths: 列宽，默认由单元格尺寸决定
+        :param heights: 行高，默认由单元格尺寸决定
+        :return: self
+        """
+        cells = list(self.cells)
+        snapshot = self.__dict__.pop("_grid", None)
+        self._defer = False
+        self._dirty = False
+        if not cells:
+            return self
+        if snapshot is None or snapshot[0] != [id(c) for c in cells]:
+            snapshot = self._grid_of(cells)  # 结构变了就按当前的单元格重建网格
+        origin, grid_w, grid_h, rows, cols, rowspans, colspans = snapshot[1]
+        if widths is None:
+            need = [c.width for c in cells]
+            widths = fit_sizes(len(grid_w), cols, colspans, need)
+        if heights is None:
+            need = [c.height for c in cells]
+            heights = fit_sizes(len(grid_h), rows, rowspans, need)
+        left, top = min(c.left for c in cells), min(c.top for c in cells)
+        grid = solve_grid(widths, heights, rows, cols, rowspans, colspans, left, top)
+        for cell, (left, top, right, bottom) in zip(cells, grid.boxes.tolist()):
+            if not cell.align:  # 不对齐的单元格，文字跟着单元格平移
+                self._shift_texts(cell, left - cell.left, top - cell.top)
+            cell._left, cell._top = left, top
+            cell._width, cell._height = right - left, bottom - top
+            cell.update_lines()
+
+        aligned = [i for i, cell in enumerate(cells) if cell.align]
+        if aligned:
+            anchors = BoxArray(grid.boxes[aligned]).anchors(
+                [cells[i].align for i in aligned], [cells[i].paddings for i in aligned]
+            )
+            for i, xy in zip(aligned, anchors.tolist()):
+                for text in cells[i]:
+                    text._xy = tuple(xy)
+                    text._anchor = cells[i].align
+                    text.update_lines()
+
+        for row in self.data:
+            row.update_row()
+            row.update_lines()
+        left, top, right, bottom = grid.bounds
+        self._left, self._top = left, top
+        self._width, self._height = right - left, bottom - top
+        self.update_lines()
+        return self
+
+    @staticmethod
+    def _shift_texts(cell, dx, dy):
+        """平移单元格内的文字，包括 cell.texts 中不属于子元素的文字"""
+        if not dx and not dy:
+            return
+        texts = {id(text): text for text in cell}
+        texts.update((id(text), text) for text in getattr(cell, "texts", ()))
+        for text in texts.values():  # 平移不改变文字框大小，不再重新测量
+            text._xy = text.xy[0] + dx, text.xy[1] + dy
+            text._left, text._top = text._left + dx, text._top + dy
+            Element.update_lines(text)
+
     @staticmethod
     def from_cells(cells):
         d = defaultdict(list)
@@ -1085,6 +1195,7 @@ class Table(Col):
 
     @property
     def label(self):
+        self.flush()
         labels = []
         for row in self.data:
             for cell in row:
@@ -1129,13 +1240,16 @@ class ImageInfo(Rect):
 class Layer(list):
     """图层容器"""
 
-    def __init__(self, name="texts", index=0, size=None):
+    def __init__(self, name="texts", index=0, size=None, bands=1):
         super().__init__()
         self.index = index
         self.name = name
         self.size = size
+        self.bands = bands  # 大于 1 或为 None 时按横条带并行光栅化
 
     def render(self):
+        if self.bands != 1:
+            return render_bands(self, self.size, self.bands)
         im = Image.new("RGBA", self.size, (0, 0, 0, 0))
         drawer = ImageDraw.Draw(im)
         for obj in self:
@@ -1144,6 +1258,8 @@ class Layer(list):
 
 
 class ImageData:
+    bands = 1  # 文字层和线层的条带数，None 为 CPU 核数
+
     def __init__(
         self,
         background: Image,
@@ -1167,8 +1283,9 @@ class ImageData:
 
     @property
     def text_layer(self):
-        layer = Layer("text", 1, self.size)
+        layer = Layer("text", 1, self.size, self.bands)
         for table in self.tables:
+            table.flush()
             for cell in table.cells:
                 for text in cell.texts:
                     layer.append(text)
@@ -1177,8 +1294,9 @@ class ImageData:
 
     @property
     def line_layer(self):
-        layer = Layer("line", 2, self.size)
+        layer = Layer("line", 2, self.size, self.bands)
         for table in self.tables:
+            table.flush()
             for cell in table.cells:
                 for line in cell.lines:
                     layer.append(line)
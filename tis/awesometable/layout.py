@@ -13,6 +13,7 @@ from awesometable.awesometable import AwesomeTable
 from awesometable.fontwrap import put_text_in_box, put_text_in_box_without_break_word
 from awesometable.table2image import Text, table2image
 from postprocessor.convert import as_image, p2c
+from postprocessor.label import Labels
 
 
 def _modify_text(text, pos):
@@ -153,38 +154,7 @@ class HorLayout(AbstractTable):
         return self.table.get_string()
 
     def get_image(self):
-        cols = []
-        out = {}
-        for lot, wid in zip(self.layouts, self._widths):
-            lot.table_width = wid
-            imgc = lot.get_image()
-            cols.append(imgc)
-        # 计算背景尺寸
-        hei = max(col["image"].shape[0] for col in cols)
-        wid = sum(col["image"].shape[1] for col in cols) + sum(self._gaps)
-        img = np.ones((hei, wid, 3), np.uint8) * 255
-        ptx = 0
-        pty = 0
-        gaps = self._gaps + [0]
-        for data, gap in zip(cols, gaps):
-            hei, wid = data["image"].shape[:2]
-            img[pty : pty + hei, ptx : ptx + wid] = data["image"]
-            data["points"] = (np.array(data["points"]) + (ptx, pty)).tolist()
-            for text in data["text"]:
-                _modify_text(text, (ptx, pty))
-            for line in data["line"]:
-                _modify_line(line, (ptx, pty))
-
-            if not out:
-                out = data
-            else:
-                out["image"] = img
-                out["label"].extend(data["label"])
-                out["points"].extend(data["points"])
-                out["text"].extend(data["text"])
-                out["line"].extend(data["line"])
-            ptx += wid + gap
-        return out
+        return render_layout(self)
 
 
 class VerLayout(AbstractTable):
@@ -238,37 +208,66 @@ class VerLayout(AbstractTable):
         return self.table.get_string()
 
     def get_image(self):
-        rows = []
-        out = {}
-        for lot, wid in zip(self.layouts, self._widths):
-            lot.table_width = wid
-            imgc = lot.get_image()
-            rows.append(imgc)
-
-        hei = sum(row["image"].shape[0] for row in rows) + sum(self._gaps)
-        wid = max(row["image"].shape[1] for row in rows)
-        img = np.ones((hei, wid, 3), np.uint8) * 255
-        ptx = 0
-        pty = 0
-        gaps = self._gaps + [0]
-        for data, gap in zip(rows, gaps):
-            hei, wid = data["image"].shape[:2]
-            img[pty : pty + hei, ptx : ptx + wid] = data["image"]
-            data["points"] = (np.array(data["points"]) + (ptx, pty)).tolist()
-            for text in data["text"]:
-                _modify_text(text, (ptx, pty))
-            for line in data["line"]:
-                _modify_line(line, (ptx, pty))
-            if not out:
-                out = data
-            else:
-                out["image"] = img
-                out["label"].extend(data["label"])
-                out["points"].extend(data["points"])
-                out["text"].extend(data["text"])
-                out["line"].extend(data["line"])
-            pty += hei + gap
-        return out
+        return render_layout(self)
+
+
+def measure_layout(node, pos=(0, 0), leaves=None):
+    """
+    第一遍：测量布局树
+    布局节点自上而下分配宽度，叶子只渲染一次以得到尺寸，并记录其在页面上的绝对偏移
+    :param node: HorLayout|VerLayout|叶子元素
+    :param pos: 节点左上角在页面上的坐标
+    :param leaves: 收集 (叶子数据, 偏移) 的列表
+    :return: tuple[tuple[int,int],list] 节点尺寸和叶子列表
+    """
+    if leaves is None:
+        leaves = []
+    if isinstance(node, TableBlock):
+        node = node.parse_layout()
+    if not isinstance(node, (HorLayout, VerLayout)):
+        data = node.get_image()
+        hei, wid = data["image"].shape[:2]
+        leaves.append((data, pos))
+        return (wid, hei), leaves
+
+    horizontal = isinstance(node, HorLayout)
+    ptx, pty = pos
+    width = height = 0
+    for lot, wid, gap in zip(node.layouts, node._widths, node._gaps + [0]):
+        lot.table_width = wid
+        (child_w, child_h), _ = measure_layout(lot, (ptx, pty), leaves)
+        if horizontal:
+            ptx += child_w + gap
+            width += child_w + gap
+            height = max(height, child_h)
+        else:
+            pty += child_h + gap
+            height += child_h + gap
+            width = max(width, child_w)
+    return (width, height), leaves
+
+
+def render_layout(node):
+    """
+    第二遍：将所有叶子一次性写入预先分配的整页画布，标注只在最后拼接一次
+    :param node: HorLayout|VerLayout
+    :return: dict 标注字典
+    """
+    (width, height), leaves = measure_layout(node)
+    page = np.full((height, width, 3), 255, np.uint8)
+    parts, texts, lines = [], [], []
+    for data, (ptx, pty) in leaves:
+        hei, wid = data["image"].shape[:2]
+        page[pty : pty + hei, ptx : ptx + wid] = data["image"]
+        parts.append(Labels.of(data))
+        for text in data["text"]:
+            _modify_text(text, (ptx, pty))
+        for line in data["line"]:
+            _modify_line(line, (ptx, pty))
+        texts.extend(data["text"])
+        lines.extend(data["line"])
+    labels = Labels.concat(parts, [offset for _, offset in leaves])
+    return labels.attach({"image": page, "text": texts, "line": lines})
 
 
 class FlexTable(AwesomeTable):
@@ -445,20 +444,17 @@ class TextBlock(AbstractTable):
                 _modify_text(text, (self.padding, self.padding))
             img = back
 
-        points = []
-        for box in boxes:
-            points.append([box[0] + self.padding, box[1] + self.padding])
-            points.append([box[2] + self.padding, box[1] + self.padding])
-            points.append([box[2] + self.padding, box[3] + self.padding])
-            points.append([box[0] + self.padding, box[3] + self.padding])
-
-        return {
+        labels = Labels.from_boxes(
+            boxes,
+            ["text@" + l for l in txt.splitlines()],
+            (self.padding, self.padding),
+        )
+        data = {
             "image": cv2.cvtColor(np.asarray(img, np.uint8), cv2.COLOR_RGB2BGR),
-            "points": points,
-            "label": ["text@" + l for l in txt.splitlines()],
             "text": texts,
             "line": [],
         }
+        return labels.attach(data)
 
 
 class Cell(TextBlock):
@@ -534,18 +530,13 @@ class ImageBlock:
         self._height = val
 
     def get_image(self):
-        return {
+        data = {
             "image": p2c(self.image.resize((self._width, self._height))),
-            "points": [
-                [0, 0],
-                [self._width, 0],
-                [self._width, self.height],
-                [0, self._height],
-            ],
-            "label": ["image@"],
             "text": [],
             "line": [],
         }
+        box = 0, 0, self._width, self._height
+        return Labels.from_boxes([box], ["image@"]).attach(data)
 
     def __str__(self):
         return f"<ImageBlock>{id(self)}-{self._width}x{self._height}"
@@ -11,10 +11,14 @@ import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from postprocessor.label import Labels
+
 from .awesometable import (
     H_SYMBOLS,
     V_LINE_PATTERN,
     count_padding,
+    iter_lines,
+    paginate_lines,
     replace_chinese_to_dunder,
     str_block_width,
 )
@@ -117,7 +121,7 @@ def table2image(
 ):
     """
     将 awesometable 转化为可渲染数据字典
-    :param table: AwesomeTable|str
+    :param table: AwesomeTable|str|list[str] 表格或分页得到的字符行
     :param font_size: int
     :param font_path: str
     :param offset: int 字数偏移
@@ -133,7 +137,10 @@ def table2image(
     line_height = kwargs.get("line_height", font_size + line_pad)  # 行高
     align = kwargs.get("align", "lr")
 
-    lines = str(table).splitlines()
+    if isinstance(table, list):
+        lines = table
+    else:
+        lines = str(table).splitlines()
     width = (len(lines[0]) + 1) * char_width + char_width * offset * 2  # 图片宽度
     height = len(lines) * line_height  # 图片高度
 
@@ -401,18 +408,29 @@ def table2image(
 
     _draw_cells(cell_set, line_list, kwargs)
 
-    cell_list, label, points = _combine_boxes(text_list, table_list, cell_set)
+    cell_list, labels = _combine_boxes(text_list, table_list, cell_set)
 
     render_image(draw, text_list, line_list)
 
-    return {
+    data = {
         "image": cv2.cvtColor(np.array(background, np.uint8), cv2.COLOR_RGB2BGR),
         "boxes": cell_list,
-        "label": label,
-        "points": points,
         "text": text_list,
         "line": line_list,
     }
+    return labels.attach(data)
+
+
+def table2images(table, lines_per_page=40, **kwargs):
+    """
+    分页渲染长表格，逐页生成字符行并渲染，不构造整张表的字符串
+    :param table: AwesomeTable|str
+    :param lines_per_page: int 每页数据行数
+    :param kwargs: 见 table2image
+    :return: yield dict 每页的标注字典
+    """
+    for page in paginate_lines(iter_lines(table), lines_per_page):
+        yield table2image(page, **kwargs)
 
 
 def _set_background(size, pos, kwargs):
@@ -531,17 +549,7 @@ def _combine_boxes(text_list, table_boxes, cell_set):
     )
     cell_list = [tb[0] for tb in text_boxes]
     label = [tb[1] for tb in text_boxes]
-    points = []
-    for cell in cell_list:
-        points.extend(
-            [
-                [cell[0], cell[1]],
-                [cell[2], cell[1]],
-                [cell[2], cell[3]],
-                [cell[0], cell[3]],
-            ]
-        )
-    return cell_list, label, points
+    return cell_list, Labels.from_boxes(cell_list, label)
 
 
 def render_image(draw, text_list, line_list):
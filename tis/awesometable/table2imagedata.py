@@ -1,5 +1,6 @@
 """
 将 PrettyTable表格转换ImageData
+结构化表格 TableModel/Stack 直接排版，不经过字符串解析
 """
 import re
 from collections import defaultdict
@@ -21,6 +22,7 @@ from awesometable.imagedata import (
     load_font,
     textbbox,
 )
+from awesometable.tablemodel import Stack, TableModel, render_model
 
 
 def table2imagedata(
@@ -63,6 +65,21 @@ def table2imagedata(
     背景层、表格层，文字层
     """
 
+    if isinstance(table, (TableModel, Stack)):
+        return render_model(
+            table,
+            xy,
+            font_size,
+            bgcolor,
+            background,
+            font_path,
+            line_pad,
+            line_height,
+            fgcolor,
+            bdcolor,
+            line_width,
+        )
+
     assert font_size % 4 == 0
     lines = str(table).splitlines()
     char_width = font_size // 2
@@ -0,0 +1,462 @@
+"""
+结构化表格模型
+表格由行、单元格、跨行跨列和列宽描述，按字体的像素宽度排版后直接生成
+ImageData 的 Cell/Table，不再经过制表符字符串和正则解析，
+也就不需要 replace_chinese_to_dunder 之类的中文宽度修正。
+字符串形式只用于调试。
+"""
+import numpy as np
+from PIL import Image
+
+from awesometable.awesometable import AwesomeTable, hstack, vstack
+from awesometable.boxarray import TableArrays, fit_sizes, solve_grid
+from awesometable.imagedata import Cell, ImageData, Table, draw_text, load_font
+
+# AwesomeTable 的对齐方式到文字锚点横向部分的映射
+ALIGN_ANCHOR = {"l": "l", "c": "m", "m": "m", "r": "r"}
+
+
+class ModelCell:
+    """单元格，row/col 是左上角所在的行列"""
+
+    __slots__ = ("text", "row", "col", "rowspan", "colspan", "align")
+
+    def __init__(self, text, row, col, rowspan=1, colspan=1, align="l"):
+        self.text = "" if text is None else str(text)
+        self.row = row
+        self.col = col
+        self.rowspan = rowspan
+        self.colspan = colspan
+        self.align = align
+
+    @property
+    def lines(self):
+        return self.text.split("\n")
+
+    def __repr__(self):
+        return "ModelCell(%r,%s,%s,%s,%s)" % (
+            self.text,
+            self.row,
+            self.col,
+            self.rowspan,
+            self.colspan,
+        )
+
+
+def _spread(sizes, start, span, need):
+    """跨行跨列的单元格放不下时，把差额平分到所跨的行列上"""
+    have = sum(sizes[start : start + span])
+    if need <= have:
+        return
+    extra, rest = divmod(need - have, span)
+    for i in range(span):
+        sizes[start + i] += extra + (i < rest)
+
+
+def _stretch(sizes, target, align="t"):
+    """
+    把行高或列宽拉伸到 target
+    :param sizes: list[int]
+    :param target: 目标总长
+    :param align: t 加在最后一格，b 加在第一格，其余平分
+    :return: list[int]
+    """
+    sizes = list(sizes)
+    extra = target - sum(sizes)
+    if extra <= 0 or not sizes:
+        return sizes
+    if align in ("t", "l"):
+        sizes[-1] += extra
+    elif align in ("b", "r"):
+        sizes[0] += extra
+    else:
+        _spread(sizes, 0, len(sizes), target)
+    return sizes
+
+
+class TableModel:
+    """结构化表格"""
+
+    def __init__(self, rows=None, widths=None, align="l"):
+        """
+        :param rows: list[list] 每行的单元格内容
+        :param widths: list[int] 各列的最小像素宽度
+        :param align: 默认对齐方式 l|c|r
+        """
+        self.cells = []
+        self.widths = widths
+        self.align = align
+        self._grid = {}  # (行, 列) -> 覆盖该位置的单元格
+        self.n_rows = 0
+        self.n_cols = 0
+        for row in rows or []:
+            self.add_row(row)
+
+    def __len__(self):
+        return self.n_rows
+
+    def _place(self, cell):
+        for r in range(cell.row, cell.row + cell.rowspan):
+            for c in range(cell.col, cell.col + cell.colspan):
+                self._grid[(r, c)] = cell
+        self.n_rows = max(self.n_rows, cell.row + cell.rowspan)
+        self.n_cols = max(self.n_cols, cell.col + cell.colspan)
+
+    def add_cell(self, text, row, col, rowspan=1, colspan=1, align=None):
+        """
+        添加单元格，所占位置必须空闲
+        :return: ModelCell
+        """
+        for r in range(row, row + rowspan):
+            for c in range(col, col + colspan):
+                if (r, c) in self._grid:
+                    raise ValueError(f"cell ({r},{c}) is occupied")
+        cell = ModelCell(text, row, col, rowspan, colspan, align or self.align)
+        self.cells.append(cell)
+        self._place(cell)
+        return cell
+
+    def add_row(self, values, align=None):
+        """
+        添加一行，跳过被上方跨行单元格占据的位置
+        :param values: list 单元格内容
+        :param align: str|list 对齐方式
+        :return: int 行号
+        """
+        row = self.n_rows
+        col = 0
+        for i, value in enumerate(values):
+            while (row, col) in self._grid:
+                col += 1
+            cell_align = align[i] if isinstance(align, (list, tuple)) else align
+            self.add_cell(value, row, col, align=cell_align)
+            col += 1
+        return row
+
+    def cell(self, row, col):
+        """
+        覆盖 (row, col) 的单元格
+        :return: ModelCell|None
+        """
+        return self._grid.get((row, col))
+
+    def merge(self, row, col, rowspan=1, colspan=1, text=None):
+        """
+        合并单元格，被合并的单元格删除，内容保留左上角的
+        :param text: 合并后的内容，默认取左上角单元格的内容
+        :return: ModelCell
+        """
+        first = self._grid.get((row, col))
+        covered = set()
+        for r in range(row, row + rowspan):
+            for c in range(col, col + colspan):
+                cell = self._grid.pop((r, c), None)
+                if cell is not None:
+                    covered.add(id(cell))
+        self.cells = [c for c in self.cells if id(c) not in covered]
+        if text is None:
+            text = first.text if first is not None else ""
+        align = first.align if first is not None else self.align
+        cell = ModelCell(text, row, col, rowspan, colspan, align)
+        self.cells.append(cell)
+        self._place(cell)
+        return cell
+
+    def measure(self, font, padding, line_height):
+        """
+        按像素计算列宽和行高
+        :param font: FreeTypeFont
+        :param padding: 文字到单元格边框的距离
+        :param line_height: 行高
+        :return: tuple[list[int],list[int]]
+        """
+        if not self.cells:
+            return [0] * self.n_cols, [0] * self.n_rows
+        rows, cols, rowspans, colspans = self.spans()
+        need_w = np.array(
+            [max(int(font.getlength(line)) for line in c.lines) for c in self.cells]
+        )
+        need_w += 2 * padding
+        need_h = np.array([len(c.lines) for c in self.cells]) * line_height
+        widths = fit_sizes(self.n_cols, cols, colspans, need_w, self.widths)
+        heights = fit_sizes(self.n_rows, rows, rowspans, need_h)
+        return widths, heights
+
+    def spans(self):
+        """
+        单元格位置和跨度，与 self.cells 一一对应
+        :return: tuple[np.ndarray] 行、列、跨行数、跨列数
+        """
+        spans = np.array(
+            [(c.row, c.col, c.rowspan, c.colspan) for c in self.cells], np.int32
+        ).reshape(-1, 4)
+        return tuple(spans.T)
+
+    def size(self, font, padding, line_height):
+        widths, heights = self.measure(font, padding, line_height)
+        return sum(widths), sum(heights)
+
+    def layout(self, x, y, font, padding, line_height, size=None, valign="t"):
+        """
+        排版
+        :param x: 左上角
+        :param y: 左上角
+        :param size: 拉伸到的 (宽, 高)，None 表示自然大小
+        :param valign: 高度被拉伸时多出来的高度加在哪里 t|m|b
+        :return: list[list[tuple[ModelCell,tuple]]] 每张表格的单元格和像素框
+        """
+        widths, heights = self.measure(font, padding, line_height)
+        if size is not None:
+            widths = _stretch(widths, size[0], "m")
+            heights = _stretch(heights, size[1], valign)
+        rows, cols, rowspans, colspans = self.spans()
+        grid = solve_grid(widths, heights, rows, cols, rowspans, colspans, x, y)
+        boxes = [
+            (self.cells[i], tuple(grid.boxes[i].tolist()))
+            for i in np.lexsort((cols, rows))
+        ]
+        return [boxes]
+
+    def to_table(self):
+        """
+        转为 AwesomeTable，跨行跨列的单元格只在左上角写内容
+        :return: AwesomeTable
+        """
+        rows = [[""] * self.n_cols for _ in range(self.n_rows)]
+        for cell in self.cells:
+            rows[cell.row][cell.col] = cell.text
+        table = AwesomeTable()
+        table.header = False
+        table.add_rows(rows)
+        return table
+
+    def to_string(self):
+        """调试用的字符串形式"""
+        return self.to_table().get_string()
+
+    def __str__(self):
+        return self.to_string()
+
+
+class Stack:
+    """横向或纵向拼接的表格，对应 awesometable 的 hstack/vstack"""
+
+    def __init__(self, children, axis="h", align=None, space=0):
+        """
+        :param children: list[TableModel|Stack]
+        :param axis: h 横向 v 纵向
+        :param align: 横向拼接时 t|m|b，纵向拼接时 l|m|r
+        :param space: 子表格之间的像素间距
+        """
+        self.children = list(children)
+        self.axis = axis
+        self.align = align or ("t" if axis == "h" else "m")
+        self.space = space
+
+    def size(self, font, padding, line_height):
+        sizes = [c.size(font, padding, line_height) for c in self.children]
+        gaps = self.space * (len(sizes) - 1)
+        if self.axis == "h":
+            return sum(s[0] for s in sizes) + gaps, max(s[1] for s in sizes)
+        return max(s[0] for s in sizes), sum(s[1] for s in sizes) + gaps
+
+    def layout(self, x, y, font, padding, line_height, size=None, valign="t"):
+        own = self.size(font, padding, line_height)
+        width, height = size or own
+        tables = []
+        for child in self.children:
+            child_w, child_h = child.size(font, padding, line_height)
+            if self.axis == "h":
+                # 最后一个子表格吃掉拉伸多出来的宽度
+                if child is self.children[-1]:
+                    child_w += width - own[0]
+                tables.extend(
+                    child.layout(
+                        x, y, font, padding, line_height, (child_w, height), self.align
+                    )
+                )
+                x += child_w + self.space
+            else:
+                if child is self.children[-1]:
+                    child_h += height - own[1]
+                tables.extend(
+                    child.layout(
+                        x, y, font, padding, line_height, (width, child_h), valign
+                    )
+                )
+                y += child_h + self.space
+        return tables
+
+    def to_string(self):
+        """调试用的字符串形式"""
+        strings = [c.to_string() for c in self.children]
+        if self.axis == "h":
+            return hstack(strings, align=self.align)
+        return vstack(strings, align=self.align)
+
+    def __str__(self):
+        return self.to_string()
+
+
+def from_awesometable(table):
+    """
+    AwesomeTable 转为结构化表格，标题按 title_pos 变成跨行或跨列的单元格
+    :param table: AwesomeTable
+    :return: TableModel
+    """
+    fields = table.field_names
+    aligns = [ALIGN_ANCHOR.get(table.align.get(f, "c"), "m") for f in fields]
+    rows = ([fields] if table.header else []) + [list(r) for r in table._rows]
+    title = table.title
+    pos = table.title_pos if title else None
+    n_cols = max((len(r) for r in rows), default=0)
+
+    model = TableModel()
+    offset = 1 if pos == "l" else 0
+    if pos == "t":
+        model.add_cell(title, 0, 0, colspan=max(n_cols, 1), align="m")
+    top = 1 if pos == "t" else 0
+    for rno, row in enumerate(rows):
+        for col, value in enumerate(row):
+            model.add_cell(value, rno + top, col + offset, align=aligns[col])
+    if pos == "b":
+        model.add_cell(title, model.n_rows, 0, colspan=max(n_cols, 1), align="m")
+    elif pos in ("l", "r"):
+        col = 0 if pos == "l" else n_cols
+        model.add_cell(title, 0, col, rowspan=max(len(rows), 1), align="m")
+    return model
+
+
+def render_model(
+    model,
+    xy=None,
+    font_size=20,
+    bgcolor="white",
+    background=None,
+    font_path="simfang.ttf",
+    line_pad=0,
+    line_height=None,
+    fgcolor="black",
+    bdcolor="black",
+    line_width=2,
+    padding=None,
+):
+    """
+    结构化表格直接渲染为 ImageData，参数与 table2imagedata 一致
+    :param model: TableModel|Stack
+    :param padding: 文字到竖线的距离，默认半个字宽
+    :return: ImageData
+    """
+    if line_height is None:
+        line_height = font_size + line_pad
+    if padding is None:
+        padding = font_size // 2
+    x0, y0 = xy or (font_size // 2, font_size // 2)
+    font = load_font(font_path, font_size)
+    width, height = model.size(font, padding, line_height)
+    if background is None:
+        background = Image.new("RGB", (width + 2 * x0, height + 2 * y0), bgcolor)
+
+    tables = []
+    for boxes in model.layout(x0, y0, font, padding, line_height):
+        cells = []
+        for mcell, box in boxes:
+            cell = Cell(
+                None,
+                None,
+                padding,
+                box[0],
+                box[1],
+                box[2] - box[0],
+                box[3] - box[1],
+                outline=bdcolor,
+                line_width=line_width,
+            )
+            cell.texts = _cell_texts(
+                mcell, box, padding, line_height, font_path, font_size, fgcolor
+            )
+            cells.append(cell)
+        if cells:
+            table = Table(cells)
+            # Table 会把同一行的单元格拉成一样高，跨行单元格需要恢复原来的框
+            for cell, (_, box) in zip(cells, boxes):
+                cell._left, cell._top = box[0], box[1]
+                cell._width, cell._height = box[2] - box[0], box[3] - box[1]
+                cell.update_lines()
+            # 之后的移动、改尺寸只标记修改，渲染或取标注时一次排版
+            tables.append(table.defer())
+    return ImageData(background, texts=[], lines=[], tables=tables, images=[])
+
+
+def render_arrays(
+    model,
+    xy=None,
+    font_size=20,
+    bgcolor="white",
+    background=None,
+    font_path="simfang.ttf",
+    line_pad=0,
+    line_height=None,
+    fgcolor="black",
+    bdcolor="black",
+    line_width=2,
+    padding=None,
+):
+    """
+    结构化表格渲染为数组图层，不创建 Cell/Text 对象，只读的大表格使用
+    参数与 render_model 一致
+    :return: TableArrays
+    """
+    if line_height is None:
+        line_height = font_size + line_pad
+    if padding is None:
+        padding = font_size // 2
+    x0, y0 = xy or (font_size // 2, font_size // 2)
+    font = load_font(font_path, font_size)
+    width, height = model.size(font, padding, line_height)
+    if background is None:
+        background = Image.new("RGB", (width + 2 * x0, height + 2 * y0), bgcolor)
+
+    boxes, texts = [], []
+    for table in model.layout(x0, y0, font, padding, line_height):
+        for mcell, box in table:
+            lines = mcell.lines
+            anchor = ALIGN_ANCHOR.get(mcell.align, "l") + "m"
+            shift = (1 - len(lines)) * line_height // 2
+            for lno, line in enumerate(lines):
+                if line.strip():
+                    texts.append(
+                        (line.strip(), len(boxes), anchor, shift + lno * line_height)
+                    )
+            boxes.append(box)
+    return TableArrays.from_cells(
+        background, boxes, texts, font, fgcolor, bdcolor, line_width, padding
+    )
+
+
+def _cell_texts(mcell, box, padding, line_height, font_path, font_size, fill):
+    """单元格内的多行文字整体垂直居中"""
+    lines = mcell.lines
+    horizontal = ALIGN_ANCHOR.get(mcell.align, "l")
+    if horizontal == "l":
+        x = box[0] + padding
+    elif horizontal == "r":
+        x = box[2] - padding
+    else:
+        x = (box[0] + box[2]) // 2
+    y = (box[1] + box[3] - len(lines) * line_height + line_height) // 2
+    texts = []
+    for line in lines:
+        if line.strip():
+            texts.append(
+                draw_text(
+                    (x, y),
+                    line.strip(),
+                    font_path,
+                    font_size,
+                    fill=fill,
+                    anchor=horizontal + "m",
+                )
+            )
+        y += line_height
+    return texts
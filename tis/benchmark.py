@@ -0,0 +1,526 @@
+"""
+基准测试
+对所有生成模式在固定随机种子、固定样本数下逐样本计时，
+统计吞吐量、单样本延迟 p50/p95，计时结束后再单独统计峰值内存，结果保存为 json，并可与基线文件比较。
+人像、logo、卡面、背景图等外部资源由按固定种子生成的本地夹具图片替换，可离线运行。
+字体和模板体积大且有版权限制，没有随仓库附带夹具，仍从本机的 static 目录和系统字体读取；
+结果中记录 static/fonts 和 static/templates 的指纹，与基线不一致时提示结果不可比。
+
+命令：python tis/benchmark.py -m bankcard passport -n 20 -o bench.json -c baseline.json
+表格图元：python tis/benchmark.py --table-rows 500 --font simfang.ttf
+"""
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(PROJECT_DIR)
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from _appdir import OUTPUT_DIR, STATIC_DIR
+from multifaker import LANG_CODES
+
+BENCH_DIR = os.path.join(OUTPUT_DIR, "benchmark")
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+# 非注册表模式及其支持的语种
+SPECIAL_MODES = {
+    "arctext": ("zh_CN",),
+    "financial_statement": ("zh_CN", "en"),
+    "layout": ("en",),
+    "bankflow": ("zh_CN",),
+}
+
+MEMORY_SAMPLES = 3  # 统计峰值内存的样本数
+# 没有夹具替换、会影响结果的本机资源
+LOCAL_ASSET_DIRS = (
+    os.path.join(STATIC_DIR, "fonts"),
+    os.path.join(STATIC_DIR, "templates"),
+)
+
+Case = namedtuple("Case", "mode lang")
+
+
+def seed_everything(seed):
+    """
+    固定所有随机源
+    :param seed: 随机种子
+    :return: None
+    """
+    from faker import Faker as _Faker
+
+    random.seed(seed)
+    np.random.seed(seed)
+    _Faker.seed(seed)
+
+
+def make_fixtures(fixture_dir=FIXTURE_DIR, seed=0):
+    """
+    生成确定性的本地夹具图片，已存在则跳过
+    :param fixture_dir: 夹具目录
+    :param seed: 随机种子
+    :return: 夹具目录
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    specs = {
+        "person.png": ((512, 512), "RGB"),
+        "logo.png": ((256, 256), "RGBA"),
+        "card.png": ((1012, 638), "RGB"),
+        "background.jpg": ((1024, 768), "RGB"),
+    }
+    for name, (size, mode) in specs.items():
+        path = os.path.join(fixture_dir, name)
+        if os.path.exists(path):
+            continue
+        w, h = size
+        ramp = np.linspace(0, 1, w, dtype=np.float32)[None, :, None]
+        base = rng.randint(64, 192, size=(1, 1, 3)).astype(np.float32)
+        arr = np.clip(base + ramp * 63, 0, 255).repeat(h, 0).astype(np.uint8)
+        img = Image.fromarray(arr, "RGB").convert(mode)
+        draw = ImageDraw.Draw(img)
+        if name == "person.png":
+            draw.ellipse((w // 4, h // 6, w * 3 // 4, h * 3 // 4), fill=(224, 188, 160))
+            draw.rectangle((w // 6, h * 3 // 4, w * 5 // 6, h), fill=(48, 64, 96))
+        elif name == "logo.png":
+            img.putalpha(0)
+            draw = ImageDraw.Draw(img)
+            draw.ellipse((8, 8, w - 8, h - 8), fill=(200, 32, 32, 255))
+        img.save(path)
+    return fixture_dir
+
+
+def asset_fingerprint(dirs=LOCAL_ASSET_DIRS):
+    """
+    本机字体和模板的指纹，按相对路径和文件大小计算，与修改时间无关
+    :param dirs: 目录列表
+    :return: str
+    """
+    digest = hashlib.md5()
+    for directory in dirs:
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, STATIC_DIR)
+                digest.update(f"{rel}:{os.path.getsize(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OfflineAssets:
+    """
+    用本地夹具替换联网获取资源的函数，作为上下文管理器使用
+    退出时恢复原函数
+    """
+
+    def __init__(self, fixture_dir=FIXTURE_DIR):
+        self.fixture_dir = make_fixtures(fixture_dir)
+        self._saved = []
+
+    def _open(self, name):
+        return Image.open(os.path.join(self.fixture_dir, name))
+
+    def person(self, *args):
+        return self._open("person.png").copy()
+
+    def logo(self, letter=None):
+        return self._open("logo.png").copy()
+
+    def image(self, w, h):
+        return self._open("background.jpg").resize((w, h))
+
+    def card_image(self, url, cache_dir=None, headers=None):
+        """有缓存时读缓存，否则返回夹具卡面"""
+        from tasks.multilang.bankcard import bankcard_designer
+
+        if cache_dir is None:
+            cache_dir = os.path.join(bankcard_designer.default_cachedir, "image")
+        path = os.path.join(cache_dir, url.rsplit("/", 1)[1])
+        if os.path.exists(path):
+            return Image.open(path)
+        return self._open("card.png").copy()
+
+    def _targets(self):
+        return [
+            ("tasks.multilang.htmltemplate", "rand_person", self.person),
+            ("tasks.multilang.factory", "rand_logo", self.logo),
+            (
+                "tasks.multilang.bankcard.bankcard_designer",
+                "open_image",
+                self.card_image,
+            ),
+            ("utils.picsum", "rand_person", self.person),
+            ("utils.picsum", "rand_logo", self.logo),
+            ("utils.picsum", "rand_image", self.image),
+            ("tis.utils.picsum", "rand_person", self.person),
+            ("tis.utils.picsum", "rand_logo", self.logo),
+            ("tis.utils.picsum", "rand_image", self.image),
+            ("provider", "rand_image", self.image),
+        ]
+
+    def patch(self):
+        """替换已导入模块中的联网函数，可重复调用以覆盖后导入的模块"""
+        patched = {(id(obj), attr) for obj, attr, _ in self._saved}
+        for module_name, attr, func in self._targets():
+            module = sys.modules.get(module_name)
+            if module is None or not hasattr(module, attr):
+                continue
+            if (id(module), attr) not in patched:
+                self._saved.append((module, attr, getattr(module, attr)))
+                setattr(module, attr, func)
+
+    def __enter__(self):
+        self.patch()
+        from multifaker.providers.lorem import Provider
+
+        self._saved.append((Provider, "person", Provider.person))
+        Provider.person = lambda provider: self.person()
+        return self
+
+    def __exit__(self, *exc):
+        while self._saved:
+            obj, attr, value = self._saved.pop()
+            setattr(obj, attr, value)
+        return False
+
+
+def collect_cases(modes=None, langs=None):
+    """
+    列出待测的模式与语种组合
+    :param modes: 模式列表，None 表示全部
+    :param langs: 语种列表，None 表示该模式支持的全部语种
+    :return: list[Case]
+    """
+    from register import IMAGE_GENERATOR_REGISTRY
+
+    all_modes = sorted(list(IMAGE_GENERATOR_REGISTRY.keys()) + list(SPECIAL_MODES))
+    cases = []
+    for mode in modes or all_modes:
+        if mode not in all_modes:
+            raise KeyError(f"Unknown mode '{mode}', one of {'|'.join(all_modes)}")
+        supported = SPECIAL_MODES.get(mode, LANG_CODES)
+        for lang in supported:
+            if langs is None or lang in langs:
+                cases.append(Case(mode, lang))
+    return cases
+
+
+def _sample_runner(case, output_dir):
+    """
+    构建单样本运行函数，构建开销不计入样本延迟
+    :param case: 模式与语种
+    :param output_dir: 输出目录
+    :return: callable
+    """
+    mode, lang = case
+    if mode == "arctext":
+        import faker
+
+        from tasks.arc_text.label import save_data
+
+        sys.path.append(os.path.join(BASE_DIR, "tasks"))
+        sys.path.append(os.path.join(BASE_DIR, "tasks", "arc_text"))
+        engine = faker.Faker(providers=["provider"])
+        return lambda: save_data(engine.image(), output_dir)
+
+    if mode in ("financial_statement", "layout"):
+        from tasks.financial_statement.fs_factory import FSFactory
+
+        factory = FSFactory("all" if mode == "financial_statement" else "sp", 1, lang)
+        factory.output_dir = output_dir
+        return factory.run
+
+    if mode == "bankflow":
+        from tasks.general_table.factory import BackTableFactory
+
+        factory = BackTableFactory(1)
+        factory.output_dir = output_dir
+        return factory.run
+
+    from multifaker import Faker
+    from postprocessor.label import save_and_log
+    from register import IMAGE_GENERATOR_REGISTRY
+
+    generator = IMAGE_GENERATOR_REGISTRY.get(mode)(mode)
+    engine = Faker(lang)
+    counter = iter(range(sys.maxsize))
+
+    def run():
+        fname = f"{mode}_{lang}_{next(counter):08}"
+        image_data = generator.run(
+            engine, lang=lang, fname=fname, product_dir=output_dir
+        )
+        save_and_log(image_data, fname, output_dir)
+
+    return run
+
+
+def peak_memory(run, samples=MEMORY_SAMPLES):
+    """
+    单独运行若干样本统计峰值内存，tracemalloc 会拖慢计时，不与计时同时进行
+    :param run: 单样本运行函数
+    :param samples: 样本数
+    :return: int 字节
+    """
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_case(
+    case, samples=10, seed=0, warmup=1, output_dir=BENCH_DIR, assets=None
+):
+    """
+    对单个组合进行基准测试
+    :param case: 模式与语种
+    :param samples: 计时样本数
+    :param seed: 随机种子
+    :param warmup: 预热样本数，不计时
+    :param output_dir: 输出目录
+    :param assets: OfflineAssets 实例
+    :return: dict
+    """
+    product_dir = os.path.join(output_dir, case.mode, case.lang)
+    os.makedirs(product_dir, exist_ok=True)
+    seed_everything(seed)
+
+    start = time.perf_counter()
+    run = _sample_runner(case, product_dir)
+    setup = time.perf_counter() - start
+    if assets is not None:
+        assets.patch()
+
+    for _ in range(warmup):
+        run()
+
+    latencies = []
+    total = time.perf_counter()
+    for _ in range(samples):
+        tick = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - tick)
+    total = time.perf_counter() - total
+    peak = peak_memory(run, min(samples, MEMORY_SAMPLES))
+
+    return {
+        "mode": case.mode,
+        "lang": case.lang,
+        "samples": samples,
+        "setup_s": round(setup, 4),
+        "throughput": round(samples / total, 4) if total else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run_benchmark(
+    modes=None, langs=None, samples=10, seed=0, warmup=1, fixture_dir=FIXTURE_DIR
+):
+    """
+    运行基准测试，单个组合出错时记录错误并继续
+    :param modes: 模式列表
+    :param langs: 语种列表
+    :param samples: 每个组合的样本数
+    :param seed: 随机种子
+    :param warmup: 预热样本数
+    :param fixture_dir: 夹具目录
+    :return: dict
+    """
+    os.chdir(BASE_DIR)  # 各工厂按相对路径读取 config
+    import tasks.multilang.factory  # noqa 注册生成器
+
+    cases = collect_cases(modes, langs)
+    results = {}
+    with OfflineAssets(fixture_dir) as assets:
+        for case in cases:
+            key = f"{case.mode}/{case.lang}"
+            try:
+                results[key] = bench_case(
+                    case, samples, seed, warmup, BENCH_DIR, assets
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                results[key] = {
+                    "mode": case.mode,
+                    "lang": case.lang,
+                    "error": repr(exc),
+                }
+            print(key, results[key])
+    return {
+        "meta": {
+            "seed": seed,
+            "samples": samples,
+            "warmup": warmup,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "assets": asset_fingerprint(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    与基线比较，吞吐量下降或 p95 上升超过容差即视为回退
+    :param report: 本次结果
+    :param baseline: 基线结果
+    :param tolerance: 容差比例
+    :return: list[str] 回退说明
+    """
+    regressions = []
+    for key, cur in report["results"].items():
+        old = baseline["results"].get(key)
+        if not old or "error" in old:
+            continue
+        if "error" in cur:
+            regressions.append(f"{key}: {cur['error']}")
+            continue
+        if cur["throughput"] < old["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {old['throughput']} -> {cur['throughput']}"
+            )
+        if cur["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {old['p95_ms']}ms -> {cur['p95_ms']}ms")
+    return regressions
+
+
+def bank_table_model(rows=500, seed=0):
+    """
+    固定内容的银行流水表格
+    :param rows: 数据行数
+    :param seed: 随机种子
+    :return: TableModel
+    """
+    from awesometable.tablemodel import TableModel
+
+    rng = random.Random(seed)
+    model = TableModel(align="r")
+    model.add_row(["交易日期", "摘要", "收入", "支出", "余额", "对方户名"], "m")
+    balance = 100000.0
+    for i in range(rows):
+        amount = round(rng.uniform(1, 5000), 2)
+        income = rng.random() < 0.4
+        balance += amount if income else -amount
+        model.add_row(
+            [
+                f"2021-{i % 12 + 1:02}-{i % 28 + 1:02}",
+                rng.choice(["转账", "消费", "工资", "利息", "取现"]),
+                f"{amount:.2f}" if income else "",
+                "" if income else f"{amount:.2f}",
+                f"{balance:.2f}",
+                rng.choice(["张三", "李四", "王五", "赵六"]),
+            ],
+            ["m", "m", "r", "r", "r", "l"],
+        )
+    return model
+
+
+def _count_elements():
+    from awesometable.imagedata import Element, Line
+
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, (Element, Line)))
+
+
+def bench_table_geometry(rows=500, font_path="simfang.ttf", repeat=3):
+    """
+    对比大表格在 ImageData 对象和数组图元两种形式下的对象数和耗时
+    :param rows: 数据行数
+    :param font_path: 字体
+    :param repeat: 重复次数，取最短时间
+    :return: dict
+    """
+    from awesometable.tablemodel import render_arrays, render_model
+
+    model = bank_table_model(rows)
+    results = {}
+    for name, render in (("objects", render_model), ("arrays", render_arrays)):
+        timing = {"build": [], "move": [], "render": []}
+        for _ in range(repeat):
+            gc.collect()
+            before = _count_elements() if name == "objects" else 0
+            tick = time.perf_counter()
+            data = render(model, font_path=font_path)
+            timing["build"].append(time.perf_counter() - tick)
+            if name == "objects":
+                count = _count_elements() - before
+            else:
+                count = data.object_count
+
+            tick = time.perf_counter()
+            if name == "objects":
+                for table in data.tables:
+                    table.move(5, 5)
+            else:
+                data.cells.move(5, 5)
+                data.texts.move(5, 5)
+                data.lines.move(5, 5)
+            timing["move"].append(time.perf_counter() - tick)
+
+            tick = time.perf_counter()
+            data.image  # pylint: disable=pointless-statement
+            timing["render"].append(time.perf_counter() - tick)
+            del data
+        results[name] = {"objects": count}
+        for key, values in timing.items():
+            results[name][key + "_ms"] = round(min(values) * 1000, 2)
+    return {"rows": rows, "results": results}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="benchmark every generator mode")
+    parser.add_argument("-m", "--modes", nargs="*", default=None, help="模式，默认全部")
+    parser.add_argument("-l", "--langs", nargs="*", default=None, help="语种，默认全部")
+    parser.add_argument("-n", "--samples", type=int, default=10, help="每个组合的样本数")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("-w", "--warmup", type=int, default=1, help="预热样本数")
+    parser.add_argument("-f", "--fixtures", default=FIXTURE_DIR, help="夹具目录")
+    parser.add_argument(
+        "-o", "--output", default=os.path.join(BENCH_DIR, "benchmark.json")
+    )
+    parser.add_argument("-c", "--compare", default=None, help="基线 json 文件")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1, help="回退容差")
+    parser.add_argument("--table-rows", type=int, default=0, help="表格图元基准的行数")
+    parser.add_argument("--font", default="simfang.ttf", help="表格图元基准的字体")
+    args = parser.parse_args(argv)
+
+    if args.table_rows:
+        print(json.dumps(bench_table_geometry(args.table_rows, args.font), indent=2))
+        return 0
+
+    report = run_benchmark(
+        args.modes, args.langs, args.samples, args.seed, args.warmup, args.fixtures
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["meta"].get("assets") != report["meta"]["assets"]:
+            print("WARNING fonts/templates differ from the baseline machine")
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
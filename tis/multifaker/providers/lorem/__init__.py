@@ -1,12 +1,14 @@
-import io
 import os
 import random
 from string import ascii_letters, digits, punctuation
 
-import requests
-from PIL import Image
 from faker.providers.lorem import Provider as BaseProvider
 from _appdir import STATIC_DIR
+from tis.utils.assets import LocalAssetProvider
+from tis.utils.fontcatalog import LOCALE_SCRIPTS, get_catalog
+from tis.utils.picsum import rand_person
+from .width_index import get_width_index
+
 
 def _date_like(d):
     if d in "0129":
@@ -84,6 +86,7 @@ class Provider(BaseProvider):
         "timesi",
     ]
 
+    font_dir = r"C:\Windows\Fonts"
     sign_font = os.path.join(STATIC_DIR,"fonts\Sudestada.ttf")  # todo fix path
     base_images_dir = r"E:\00IT\P\uniform\multispider\images"
     image_list = []
@@ -100,41 +103,28 @@ class Provider(BaseProvider):
         word = self.random_element(self.word_map.get(key))
         return word
 
-    def sentence_fontlike(self, font, length):
-        """构造相同长度的句子"""
-        # keys = list(self.word_map.keys())
-        # keys.sort(reverse=True)
+    @property
+    def locale_name(self):
+        """词表所属语种，即 provider 所在包名"""
+        return type(self).__module__.rsplit(".", 1)[-1]
 
-        size = font.size
+    def sentence_fontlike(self, font, length):
+        """构造相同长度的句子
 
-        if length < size:
+        按 (语种, 字体, 字号) 的单词宽度索引二分选词，循环中不再测量文字宽度
+        只有没有任何单词放得下时才截断单词
+        """
+        if length < font.size:
             return ""
-        # self.word_map(key)
-        # 随机选个单词
-        word = self.words(1)[0]  # self.word_fontlike(font, length)
-        # print(word)
-        # return word
-        if length - size * 2 <= font.getlength(word) <= length:
-            return word
+        index = get_width_index(self.locale_name, self.word_list, font)
+        sentence = index.sentence(length, font.size)
+        if sentence:
+            return sentence
 
-        if font.getlength(word) > length - size:
-            while font.getlength(word) > length:
-                # print('-')
-                word = word[:-1]
-                if not word:
-                    return ""
-            # print(word)
-            return word
-
-        if font.getlength(word) < length - 2 * size:
-            # word = self.words(1)[0]
-
-            return (
-                word
-                + " "
-                + self.sentence_fontlike(font, length - font.getlength(word + " "))
-            )
-        # return ''
+        word = self.words(1)[0]
+        while font.getlength(word) > length:
+            word = word[:-1]
+        return word
 
     def wordlike(self, word, exact=True):
         """选择相似长度的词"""
@@ -223,15 +213,51 @@ class Provider(BaseProvider):
         # return [word.strip() for word in
         #         self.random_choices(word_list, length=nb)]
 
+    def font_pool(self, mode=None):
+        """
+        字体目录中覆盖本语种文字的字体，优先取 font_list 中的字体，按 mode 缓存
+        :param mode: n 常规 b 粗体 i 斜体 None 任意
+        :return: list[str]
+        """
+        pools = type(self).__dict__.get("_font_pools")
+        if pools is None:
+            pools = {}
+            type(self)._font_pools = pools
+        if mode in pools:
+            return pools[mode]
+
+        catalog = get_catalog(self.font_dir)
+        modes = ("i", "bi") if mode == "i" else (mode,)
+        pool = None
+        for script in LOCALE_SCRIPTS.get(self.locale_name, ("latin",)):
+            paths = set()
+            for one in modes:
+                paths.update(catalog.query(script, one))
+            pool = paths if pool is None else pool & paths
+        names = {name.lower() for name in self.font_list}
+        listed = [
+            p for p in pool if os.path.splitext(os.path.basename(p))[0].lower() in names
+        ]
+        pools[mode] = sorted(listed or pool)
+        return pools[mode]
+
     def font(self, mode=None):
         """
         各个语言可用字体
-        :param mode: sign 手写 b 粗体 i 斜体
+        字体目录可用时从覆盖本语种文字的字体中选择，否则按 font_list 拼接路径
+        :param mode: sign 手写 n 常规 b 粗体 i 斜体
         :return: path
         """
         if mode == "sign":
             return self.sign_font
 
+        key = mode.lower() if mode else None
+        pool = self.font_pool(key if key in ("n", "b", "i") else None)
+        if not pool and mode:
+            pool = self.font_pool()
+        if pool:
+            return self.random_element(pool)
+
         if mode == "n":
             normal_fonts = [f for f in self.font_list if not f[-1] in "bi"]
             if normal_fonts:
@@ -257,28 +283,20 @@ class Provider(BaseProvider):
 
     def image(self, width=None, height=None):
         """
-        返回各个语言的图片
+        返回各个语言的图片，图片解码一次后常驻内存
         :param width: 宽
         :param height: 高
         :return: Image
         """
-        path = self.random_element(self.image_list)
-        img = Image.open(path)
-        if not width or not height:
-            return img
-        return img.resize((width, height))
+        assets = type(self).__dict__.get("_image_assets")
+        if assets is None:
+            assets = LocalAssetProvider(files=self.image_list, preload=False)
+            type(self)._image_assets = assets
+        return assets(width, height)
 
     def person(self):
-        headers = {
-            "Connection": "keep-alive",
-            "Cache-Control": "max-age=0",
-            "Upgrade-Insecure-Requests": "1",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.119 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        }
-        response = requests.get(
-            "https://thispersondoesnotexist.com/image", headers=headers
-        )
-        return Image.open(io.BytesIO(response.content))
+        """
+        返回人像图片，来自本地素材或后台预取
+        :return: Image
+        """
+        return rand_person()
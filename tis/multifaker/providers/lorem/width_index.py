@@ -0,0 +1,175 @@
+"""
+单词宽度索引
+对每个 (语种, 字体, 字号) 预先计算词表中每个单词的像素宽度并排序，
+按目标宽度构造句子时只需二分查找，无需在循环中反复调用 font.getlength。
+索引持久化在 CACHE_DIR/word_width 下，多个进程共用，先写临时文件再改名。
+"""
+import hashlib
+import os
+import random
+import tempfile
+import zipfile
+from bisect import bisect_right
+
+import numpy as np
+
+from _appdir import CACHE_DIR
+
+WORD_WIDTH_DIR = os.path.join(CACHE_DIR, "word_width")
+
+_indexes = {}
+_digests = {}
+
+
+class WordWidthIndex:
+    """某一字体字号下按宽度升序排列的词表"""
+
+    def __init__(self, words, widths, space_width):
+        """
+        :param words: 按宽度升序排列的单词
+        :param widths: 对应的像素宽度
+        :param space_width: 空格宽度
+        """
+        self.words = words
+        self.widths = widths
+        self.space_width = space_width
+        self._widths = widths.tolist()  # bisect 在 list 上比 ndarray 更快
+
+    @classmethod
+    def build(cls, word_list, font):
+        """
+        计算词表宽度并排序
+        :param word_list: 词表
+        :param font: FreeTypeFont
+        :return: WordWidthIndex
+        """
+        words = sorted({w.strip() for w in word_list if w.strip()})
+        widths = np.array([font.getlength(w) for w in words], np.float32)
+        order = np.argsort(widths, kind="stable")
+        return cls(
+            [words[i] for i in order], widths[order], float(font.getlength(" "))
+        )
+
+    def save(self, path):
+        """
+        保存索引，只存普通数组，其他进程读到的总是完整的文件
+        :param path: npz 文件路径
+        :return: None
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(
+                    file,
+                    words=np.array(self.words, dtype=str),
+                    widths=self.widths,
+                    space_width=self.space_width,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """
+        读取索引
+        :param path: npz 文件路径
+        :return: WordWidthIndex
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["words"].tolist(), data["widths"], float(data["space_width"])
+            )
+
+    def fit(self, length):
+        """
+        宽度不超过 length 的单词数量，即可选单词的区间上界
+        :param length: 像素宽度
+        :return: int
+        """
+        return bisect_right(self._widths, length)
+
+    def word(self, length):
+        """
+        随机选一个宽度不超过 length 的单词
+        :param length: 像素宽度
+        :return: str
+        """
+        hi = self.fit(length)
+        if not hi:
+            return ""
+        return self.words[random.randrange(hi)]
+
+    def sentence(self, length, size):
+        """
+        构造宽度接近 length 的句子，最后一个单词落在 [length - 2*size, length] 内即结束
+        :param length: 目标像素宽度
+        :param size: 字号
+        :return: str
+        """
+        out = []
+        remain = length
+        while remain >= size:
+            hi = self.fit(remain)
+            if not hi:
+                break
+            idx = random.randrange(hi)
+            out.append(self.words[idx])
+            if self._widths[idx] >= remain - 2 * size:
+                break
+            remain -= self._widths[idx] + self.space_width
+        return " ".join(out)
+
+
+def index_path(locale, font, digest=""):
+    """
+    索引文件路径，按语种、字体文件名、字号和词表摘要区分
+    :param locale: 语种
+    :param font: FreeTypeFont
+    :param digest: 词表摘要
+    :return: str
+    """
+    name = os.path.splitext(os.path.basename(font.path))[0]
+    return os.path.join(WORD_WIDTH_DIR, locale, f"{name}_{font.size}{digest}.npz")
+
+
+def word_digest(word_list):
+    """
+    词表摘要，同一个词表对象长度不变时只计算一次
+    :param word_list: 词表
+    :return: str
+    """
+    cached = _digests.get(id(word_list))
+    if cached is not None and cached[0] is word_list and cached[1] == len(word_list):
+        return cached[2]
+    digest = hashlib.md5("".join(word_list).encode("utf-8")).hexdigest()[:8]
+    _digests[id(word_list)] = word_list, len(word_list), digest
+    return digest
+
+
+def get_width_index(locale, word_list, font):
+    """
+    获取单词宽度索引，依次查找内存、磁盘，都没有时构建并保存
+    词表变化时摘要不同，自动重建
+    :param locale: 语种
+    :param word_list: 词表
+    :param font: FreeTypeFont
+    :return: WordWidthIndex
+    """
+    digest = word_digest(word_list)
+    key = (locale, font.path, font.size, digest)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    path = index_path(locale, font, "_" + digest)
+    try:
+        index = WordWidthIndex.load(path)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):  # 没有或旧格式
+        index = WordWidthIndex.build(word_list, font)
+        index.save(path)
+    _indexes[key] = index
+    return index
@@ -5,6 +5,93 @@ import cv2
 import numpy as np
 
 from postprocessor.convert import as_array, as_image, c2p, p2c
+from postprocessor.label import Labels
+
+
+def solid_color(background):
+    """
+    纯色背景的颜色
+    :param background: 背景图 np.ndarray/PIL.Image
+    :return: tuple|None BGR 颜色，不是纯色时返回 None
+    """
+    if isinstance(background, str):
+        return None
+    if isinstance(background, np.ndarray):
+        if background.ndim == 2:
+            if background.min() != background.max():
+                return None
+            return (int(background.flat[0]),) * 3
+        pixels = background.reshape(-1, background.shape[2])
+        if not (pixels == pixels[0]).all():
+            return None
+        first = pixels[0]
+        if len(first) == 1:
+            return (int(first[0]),) * 3
+        return tuple(int(v) for v in first[:3])
+    extrema = background.getextrema()
+    if background.mode in ("L", "1"):
+        extrema = (extrema,)
+    if any(low != high for low, high in extrema):
+        return None
+    if len(extrema) < 3:
+        return (extrema[0][0],) * 3
+    return extrema[2][0], extrema[1][0], extrema[0][0]
+
+
+def flatten(image, background=(255, 255, 255), mask=None):
+    """
+    按蒙版或 alpha 通道把图像平铺到纯色或同尺寸的背景上，numpy 直接计算，
+    图像是不透明的三通道数组时原地修改
+    :param image: 原图
+    :param background: BGR 颜色或与原图同尺寸的背景图
+    :param mask: 蒙版，0 处显示背景
+    :return: np.ndarray BGR
+    """
+    img = as_array(image)
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[2] == 4:
+        if mask is None:
+            mask = img[..., 3]
+        img = np.ascontiguousarray(img[..., :3])
+    if mask is None:
+        return img
+
+    mask = as_array(mask)
+    if mask.ndim == 3:
+        mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
+    if isinstance(background, tuple):
+        back = np.array(background, np.uint8)
+    else:
+        back = as_array(background)[..., :3]
+
+    hidden = mask == 0
+    partial_alpha = np.count_nonzero(mask) - np.count_nonzero(mask == 255)
+    if not img.flags.writeable:
+        img = img.copy()
+    if not partial_alpha:
+        if not hidden.any():
+            return img
+        img[hidden] = back if back.ndim == 1 else back[hidden]
+        return img
+    alpha = mask.astype(np.uint16)[..., None]
+    blend = img * alpha + back * (255 - alpha) + 127
+    img[:] = blend // 255
+    return img
+
+
+def flatten_on(color=(255, 255, 255)):
+    """
+    平铺到纯色背景的处理器，不改变尺寸和标注
+    :param color: BGR 颜色
+    :return: function 处理标注字典
+    """
+
+    def _flatten(data):
+        data["image"] = flatten(data["image"], tuple(color), data.get("mask", None))
+        return data
+
+    return _flatten
 
 
 def add_background(image, background, offset=0, mask=None):
@@ -16,8 +103,18 @@ def add_background(image, background, offset=0, mask=None):
     :param mask: 蒙版
     :return: np.ndarray
     """
-    # print(image)
-    # assert image.mode == 'RGBA'
+    color = solid_color(background)
+    if color is not None:
+        out = flatten(image, color, mask)
+        if offset:
+            out = cv2.copyMakeBorder(
+                out, offset, offset, offset, offset, cv2.BORDER_CONSTANT, value=color
+            )
+        return out
+    if not offset and isinstance(background, np.ndarray):
+        image = as_array(image)
+        if background.shape[:2] == image.shape[:2]:
+            return flatten(image, background, mask)
     img = as_image(image)
     width, height = img.size
     height += offset * 2
@@ -42,7 +139,7 @@ def add_background_data(data, background, offset):
     assert isinstance(data, dict)
     mask = data.get("mask", None)
     data["image"] = add_background(data["image"], background, offset, mask=mask)
-    data["points"] = np.array(data["points"]) + offset
+    Labels.of(data).translate(offset)
     return data
 
 
@@ -57,7 +154,7 @@ def add_to_paper(data, paper):
     pos = paper.pad[0], paper.pad[1]
     img.paste(c2p(data["image"]), pos)
     data["image"] = p2c(img)
-    data["points"] = np.array(data["points"]) + np.array(pos)
+    Labels.of(data).translate(pos)
     return data
 
 
@@ -1,6 +1,8 @@
 """Bezier, a module for creating Bezier curves.
 """
 
+from math import comb
+
 import numpy as np
 
 
@@ -64,8 +66,20 @@ def curve(t_values, pts):
         raise TypeError(
             "`t_values` Must be an iterable of integers or floats, of length greater than 0 ."
         )
-    curs = np.array([[0.0] * len(pts[0])])
-    for i in t_values:
-        curs = np.append(curs, [point(i, pts)], axis=0)
-    curs = np.delete(curs, 0, 0)
-    return curs
+    return bernstein(t_values, pts)
+
+
+def bernstein(t_values, pts):
+    """
+    Evaluates the curve at once with the Bernstein polynomial basis.
+    :param t_values: array-like of floats; a parameterization.
+    :param pts: array-like of shape (n + 1, dim); control points.
+    :return: numpy array of shape (len(t_values), dim); points.
+    """
+    pts = np.asarray(pts, np.float64)
+    t_values = np.asarray(t_values, np.float64)[:, None]
+    degree = len(pts) - 1
+    orders = np.arange(degree + 1)
+    coeffs = np.array([comb(degree, i) for i in orders], np.float64)
+    basis = coeffs * t_values**orders * (1 - t_values) ** (degree - orders)
+    return basis @ pts
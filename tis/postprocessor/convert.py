@@ -1,7 +1,7 @@
 """
 本模块保存常用的数据格式转换函数
 """
-from functools import wraps
+from functools import partial, wraps
 
 import cv2
 import numpy as np
@@ -20,6 +20,10 @@ def p2c(image):
         return image
     if image.mode == "RGBA":
         return cv2.cvtColor(np.asarray(image, np.uint8), cv2.COLOR_RGBA2BGRA)
+    if image.mode == "L":
+        return np.array(image, np.uint8)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
     return cv2.cvtColor(np.asarray(image, np.uint8), cv2.COLOR_RGB2BGR)
 
 
@@ -46,12 +50,136 @@ def c2p(image):
     return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA))
 
 
+def layout_of(img):
+    """
+    图像当前的存储格式
+    :param img: np.ndarray/PIL.Image/ImageBuffer
+    :return: str PIL.Image 为 RGB|RGBA|L 等 mode，np.ndarray 为 BGR|BGRA|GRAY
+    """
+    if isinstance(img, ImageBuffer):
+        return img.layout
+    if isinstance(img, np.ndarray):
+        if img.ndim == 2:
+            return "GRAY"
+        return "BGRA" if img.shape[2] == 4 else "BGR"
+    return img.mode
+
+
+class ImageBuffer:
+    """
+    记录当前格式的图像容器
+    图像以原格式保存，只有在需要另一种格式时才转换一次，
+    转换结果缓存到图像被替换为止。
+    放在标注字典的 image 中时，processor 只替换容器里的图像，容器随字典在处理链中传递
+    """
+
+    def __init__(self, image):
+        """
+        :param image: np.ndarray/PIL.Image/ImageBuffer
+        """
+        self._image = None
+        self._other = None
+        self.conversions = 0
+        self.image = image
+
+    @property
+    def image(self):
+        """当前图像，不做任何转换"""
+        return self._image
+
+    @image.setter
+    def image(self, value):
+        if isinstance(value, ImageBuffer):
+            value = value.image
+        self._image = value
+        self._other = None
+
+    @property
+    def layout(self):
+        return layout_of(self._image)
+
+    @property
+    def is_array(self):
+        return isinstance(self._image, np.ndarray)
+
+    @property
+    def size(self):
+        """
+        :return: tuple[int,int] 宽高
+        """
+        if self.is_array:
+            return self._image.shape[1], self._image.shape[0]
+        return self._image.size
+
+    def array(self):
+        """
+        np.ndarray 格式，BGR 或 BGRA 顺序
+        :return: np.ndarray
+        """
+        if self.is_array:
+            return self._image
+        if self._other is None:
+            self._other = p2c(self._image)
+            self.conversions += 1
+        return self._other
+
+    def pil(self):
+        """
+        PIL.Image 格式
+        :return: PIL.Image
+        """
+        if not self.is_array:
+            return self._image
+        if self._other is None:
+            self._other = c2p(self._image)
+            self.conversions += 1
+        return self._other
+
+    def rgb(self):
+        """
+        RGB 顺序的数组，BGR 数组返回反转通道的视图，不复制数据
+        :return: np.ndarray 只读使用
+        """
+        if not self.is_array:
+            return np.asarray(self._image)
+        if self._image.ndim == 3 and self._image.shape[2] == 3:
+            return self._image[..., ::-1]
+        if self._image.ndim == 3:
+            return cv2.cvtColor(self._image, cv2.COLOR_BGRA2RGBA)
+        return self._image
+
+    def get(self, kind=None):
+        """
+        按需要的格式取图像
+        :param kind: "cv" 为 np.ndarray，"pil" 为 PIL.Image，None 保持原格式
+        :return: np.ndarray|PIL.Image
+        """
+        if kind == "cv":
+            return self.array()
+        if kind == "pil":
+            return self.pil()
+        return self._image
+
+
+def unwrap(img):
+    """
+    取出容器中的图像，不做任何转换
+    :param img: np.ndarray/PIL.Image/ImageBuffer
+    :return: np.ndarray|PIL.Image
+    """
+    if isinstance(img, ImageBuffer):
+        return img.image
+    return img
+
+
 def as_image(img):
     """
     convert everything to PIL.Image
-    :param img: path/np.ndarray/PIL.Image
+    :param img: path/np.ndarray/PIL.Image/ImageBuffer
     :return: PIL.Image
     """
+    if isinstance(img, ImageBuffer):
+        return img.pil()
     if isinstance(img, str):
         return Image.open(img)
     if isinstance(img, np.ndarray):
@@ -62,9 +190,11 @@ def as_image(img):
 def as_array(img):
     """
     convert everything to np.ndarray
-    :param img: path/np.ndarray/PIL.Image
+    :param img: path/np.ndarray/PIL.Image/ImageBuffer
     :return: np.ndarray
     """
+    if isinstance(img, ImageBuffer):
+        return img.array()
     if isinstance(img, str):
         return cv2.imread(img, cv2.IMREAD_UNCHANGED)
     if isinstance(img, Image.Image):
@@ -72,42 +202,44 @@ def as_array(img):
     return img
 
 
-def processor(func):
+def processor(func=None, layout=None):
     """
     将处理器函数包装成可以处理字典的,以及任何输入图像的输入转换
+    声明了 layout 的处理器只在输入格式不同时转换一次，输出保持处理器返回的格式，
+    连续的同格式处理器之间不再来回转换
 
-    :param func: The function to be decorated
-    """
-    """
-    
     :param func: 被装饰函数
+    :param layout: 处理器需要的格式 "cv" 为 np.ndarray，"pil" 为 PIL.Image，
+        None 时先按原格式调用，出错再转换
     :return: 装饰器
     """
+    if func is None:
+        return partial(processor, layout=layout)
+
+    def call(img, args, kwargs):
+        buffer = img if isinstance(img, ImageBuffer) else ImageBuffer(img)
+        if layout is not None:
+            return func(buffer.get(layout), *args, **kwargs)
+        try:
+            return func(buffer.image, *args, **kwargs)  # 尝试直接处理图片
+        except (AttributeError, TypeError, ValueError, cv2.error):
+            other = buffer.pil() if buffer.is_array else buffer.array()
+            return func(other, *args, **kwargs)  # 若类型错误尝试转换类型
 
     @wraps(func)
     def wrap(img, *args, **kwargs):
-        if isinstance(img, dict):  # 如果是字典，先尝试处理字典
-            try:
-                return func(img, *args, **kwargs)
-            except:
-                pass
-
-            try:
-                img["image"] = func(img["image"], *args, **kwargs)  # 然后处理图片
-            except:
-                if isinstance(img, Image.Image):
-                    img["image"] = func(
-                        p2c(img["image"]), *args, **kwargs
-                    )  # 若类型错误尝试转换类型
-                else:
-                    img["image"] = func(c2p(img["image"]), *args, **kwargs)
+        if isinstance(img, dict):
+            if layout is None:
+                try:  # 未声明格式时，先尝试处理字典
+                    return func(img, *args, **kwargs)
+                except Exception:  # pylint: disable=broad-except
+                    pass
+            image = img["image"]
+            if isinstance(image, ImageBuffer):
+                image.image = call(image, args, kwargs)
+            else:
+                img["image"] = call(image, args, kwargs)
             return img
-
-        try:
-            return func(img, *args, **kwargs)  # 尝试直接处理图片
-        except:
-            if isinstance(img, Image.Image):
-                return func(p2c(img), *args, **kwargs)  # 若类型错误尝试转换类型
-            return func(c2p(img), *args, **kwargs)
+        return call(img, args, kwargs)
 
     return wrap
@@ -1,38 +1,87 @@
 """
 随机曲线生成模块
+曲线用伯恩斯坦多项式一次求出，直接用 OpenCV 抗锯齿折线画到白底上，
+画幅与线宽和原先 matplotlib 4x1 英寸、300dpi 的绘图区相当。
+StrokePool 预先渲染一批笔迹，取用时只做随机翻转。
 """
-from io import BytesIO
+import random
 
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
-from PIL import Image
+from PIL import ImageColor
 
-from postprocessor.bezier import curve as _curve
+from postprocessor.bezier import bernstein
 
+SHIFT = 4  # 折线坐标的小数位数
 
-def bezier_curve(points, color="red"):
+
+def _fit(values, length, margin=0.05):
+    """把坐标线性映射到 [0, length)，两端各留 margin 的余量"""
+    low, high = values.min(), values.max()
+    if high - low == 0:
+        low, high = low - 1, high + 1
+    span = (high - low) * (1 + 2 * margin)
+    return (values - low + (high - low) * margin) * ((length - 1) / span)
+
+
+def draw_curve(curve, size=(930, 231), color="red", thickness=6):
+    """
+    抗锯齿地画出折线，坐标自动缩放到画幅，y 轴向上
+    :param curve: (N,2) 曲线上的点
+    :param size: tuple[int,int] 画幅宽高
+    :param color: str 曲线颜色
+    :param thickness: int 线宽
+    :return: np.ndarray BGR 白底曲线图
+    """
+    width, height = size
+    xs = _fit(curve[:, 0], width)
+    ys = (height - 1) - _fit(curve[:, 1], height)
+    pts = np.round(np.stack([xs, ys], 1) * (1 << SHIFT)).astype(np.int32)
+    image = np.full((height, width, 3), 255, np.uint8)
+    bgr = ImageColor.getrgb(color)[2::-1]
+    cv2.polylines(image, [pts], False, bgr, thickness, cv2.LINE_AA, SHIFT)
+    return image
+
+
+def bezier_curve(points, color="red", size=(930, 231), thickness=6):
     """
     生成曲线图片
     :param points: list 控制点列表
     :param color: str 曲线颜色
+    :param size: tuple[int,int] 图片宽高
+    :param thickness: int 线宽
     :return: np.ndarray 曲线图片
     """
     t_points = np.arange(0, 1, 0.01)
-    points = np.array(points)
-    curve1 = _curve(t_points, points)
-    plt.rcParams["figure.figsize"] = (4.0, 1.0)
-    plt.rcParams["savefig.dpi"] = 300
-    plt.rcParams["figure.dpi"] = 300
-    plt.figure()
-    plt.plot(
-        curve1[:, 0], curve1[:, 1], color=color  # x-coordinates.  # y-coordinates.
-    )
-
-    buffer = BytesIO()
-    plt.axis("off")  # 隐藏x坐标轴
-    plt.savefig(buffer, format="png", bbox_inches="tight", pad_inches=0)
-    new_img = np.asarray(Image.open(buffer))  # new_img就是figure的数组
-    plt.close()
-    buffer.close()
-    return cv2.cvtColor(new_img, cv2.COLOR_RGB2BGR)
+    curve1 = bernstein(t_points, points)
+    return draw_curve(curve1, size, color, thickness)
+
+
+class StrokePool:
+    """预先渲染的笔迹池，取出的笔迹只读"""
+
+    def __init__(self, make, size=64):
+        """
+        :param make: 无参函数，返回一张笔迹图
+        :param size: int 笔迹数量
+        """
+        self.strokes = []
+        for _ in range(size):
+            stroke = make()
+            stroke.flags.writeable = False
+            self.strokes.append(stroke)
+
+    def __len__(self):
+        return len(self.strokes)
+
+    def sample(self):
+        """
+        随机取一张笔迹并随机翻转，返回视图不复制
+        :return: np.ndarray
+        """
+        stroke = random.choice(self.strokes)
+        if random.random() < 0.5:
+            stroke = stroke[:, ::-1]
+        if random.random() < 0.5:
+            stroke = stroke[::-1]
+        return stroke
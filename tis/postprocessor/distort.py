@@ -5,19 +5,20 @@ import cv2
 import numpy as np
 from vcam import meshGen, vcam
 
+from postprocessor.convert import as_array
 
-def distort(img, peak=1.0, period=1, direction="x"):
+
+def distort_maps(height, width, peak=1.0, period=1, direction="x"):
     """
-    将原图扭曲变换，投影到一个3维曲面上
-    :param img: 原图
+    扭曲的映射函数，相机和网格与图像同尺寸，每次新建，不常驻内存
+    :param height: int 高
+    :param width: int 宽
     :param peak: 峰值像素高度
     :param period: 周期数
     :param direction: 方向 x or y
-    :return: np.ndarray
+    :return: tuple[np.ndarray, np.ndarray] map_x, map_y
     """
-    height, width = img.shape[:2]
     cam = vcam(H=height, W=width)
-    # 创建一个与输入图像大小相同的网格
     plane = meshGen(height, width)
     # 修改Z的值，默认为1，即平面
     # 将每个3D点的Z坐标定义为Z = 10*sin(2*pi[x/w]*10)
@@ -31,8 +32,43 @@ def distort(img, peak=1.0, period=1, direction="x"):
     pts2d = cam.project(pts3d)
     # 使用投影得到的二维点集构建映射函数
     # 这里的二维点集使用三维曲面投影得到
-    map_x, map_y = cam.getMaps(pts2d)
+    return cam.getMaps(pts2d)
+
+
+def _remap(img, maps):
     # 将两个映射函数作用与图像，得到最终图像
-    output = cv2.remap(img, map_x, map_y, interpolation=cv2.INTER_LINEAR)
-    output = cv2.flip(output, 1)
-    return output
+    output = cv2.remap(img, *maps, interpolation=cv2.INTER_LINEAR)
+    return cv2.flip(output, 1)
+
+
+def distort(img, peak=1.0, period=1, direction="x"):
+    """
+    将原图扭曲变换，投影到一个3维曲面上
+    :param img: 原图
+    :param peak: 峰值像素高度
+    :param period: 周期数
+    :param direction: 方向 x or y
+    :return: np.ndarray
+    """
+    height, width = img.shape[:2]
+    return _remap(img, distort_maps(height, width, peak, period, direction))
+
+
+def distort_data(data, peak=1.0, period=1, direction="x"):
+    """
+    扭曲标注字典的图像和蒙版
+    :param data: dict 标注字典
+    :param peak: 峰值像素高度
+    :param period: 周期数
+    :param direction: 方向 x or y
+    :return: dict 标注字典
+    """
+    image = as_array(data["image"])
+    height, width = image.shape[:2]
+    if data.get("mask", None) is None:
+        data["mask"] = np.ones((height, width), np.uint8) * 255
+    # 图像和蒙版共用一次算出的映射
+    maps = distort_maps(height, width, peak, period, direction)
+    data["image"] = _remap(image, maps)
+    data["mask"] = _remap(data["mask"], maps)
+    return data
@@ -7,6 +7,207 @@ import cv2
 import numpy as np
 from PIL import Image
 
+from postprocessor.convert import as_array, unwrap
+
+
+def transform_points(points, matrix):
+    """
+    点的仿射 (2,3) 或透视 (3,3) 变换
+    :param points: (M,2) 点坐标
+    :param matrix: 变换矩阵
+    :return: np.ndarray (M,2) float64
+    """
+    points = np.asarray(points, np.float64).reshape(-1, 2)
+    matrix = np.asarray(matrix, np.float64)
+    out = points @ matrix[:2, :2].T + matrix[:2, 2]
+    if matrix.shape[0] == 3:
+        out /= (points @ matrix[2, :2] + matrix[2, 2])[:, None]
+    return out
+
+
+class Labels:
+    """
+    标注几何
+    points 是 (N,4,2) float32 数组，每个框按左上、右上、右下、左下排列；
+    keys 和 contents 是与之平行的标签类型和内容。
+    所有几何变换都原地修改 points，标注字典中的 points 是它的 (N*4,2) 视图。
+    """
+
+    def __init__(self, points=None, keys=None, contents=None):
+        """
+        :param points: (N,4,2) 数组
+        :param keys: 标签类型
+        :param contents: 标签内容，None 表示标签中没有 @
+        """
+        if points is None:
+            points = np.zeros((0, 4, 2), np.float32)
+        self.points = np.ascontiguousarray(points, np.float32).reshape(-1, 4, 2)
+        count = len(self.points)
+        self.keys = np.array(keys if keys is not None else [""] * count, object)
+        if contents is None:
+            contents = [None] * count
+        self.contents = np.empty(count, object)
+        self.contents[:] = contents
+        self._flat = self.points.reshape(-1, 2)
+
+    def __getstate__(self):
+        # _flat 是 points 的视图，序列化后不再共享内存，反序列化时重建
+        state = self.__dict__.copy()
+        del state["_flat"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._flat = self.points.reshape(-1, 2)
+
+    @staticmethod
+    def _split(label):
+        keys, contents = [], []
+        for one in label:
+            key, sep, content = str(one).partition("@")
+            keys.append(key)
+            contents.append(content if sep else None)
+        return keys, contents
+
+    @classmethod
+    def from_points(cls, points, label=()):
+        """
+        :param points: list[[x,y]] 每四个点一个框，或 (N,4,2) 数组
+        :param label: list[str] "类型@内容"
+        :return: Labels
+        """
+        if isinstance(points, Labels):
+            return points
+        keys, contents = cls._split(label)
+        return cls(np.asarray(points, np.float32), keys, contents)
+
+    @classmethod
+    def from_boxes(cls, boxes, label=(), offset=(0, 0)):
+        """
+        :param boxes: (N,4) 矩形 (left, top, right, bottom)
+        :param label: list[str] "类型@内容"
+        :param offset: 整体偏移
+        :return: Labels
+        """
+        boxes = np.asarray(boxes, np.float32).reshape(-1, 4)
+        points = boxes[:, [[0, 1], [2, 1], [2, 3], [0, 3]]] + np.float32(offset)
+        keys, contents = cls._split(label)
+        return cls(points, keys, contents)
+
+    @classmethod
+    def concat(cls, parts, offsets=None):
+        """
+        拼接多组标注
+        :param parts: list[Labels]
+        :param offsets: 每组的偏移
+        :return: Labels
+        """
+        if not parts:
+            return cls()
+        points = [part.points for part in parts]
+        if offsets is not None:
+            points = [pts + np.float32(off) for pts, off in zip(points, offsets)]
+        return cls(
+            np.concatenate(points),
+            np.concatenate([part.keys for part in parts]),
+            np.concatenate([part.contents for part in parts]),
+        )
+
+    @classmethod
+    def of(cls, data):
+        """
+        标注字典的标注几何，字典中的 points 被替换过时重新构造
+        :param data: dict 标注字典
+        :return: Labels
+        """
+        labels = data.get("labels")
+        if (
+            labels is None
+            or data.get("points") is not labels._flat
+            or not np.shares_memory(labels._flat, labels.points)
+        ):
+            labels = cls.from_points(data.get("points", []), data.get("label", []))
+            labels.attach(data)
+        return labels
+
+    def attach(self, data):
+        """
+        写回标注字典
+        :param data: dict 标注字典
+        :return: dict
+        """
+        data["labels"] = self
+        data["points"] = self._flat
+        data["label"] = self.label
+        return data
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def label(self):
+        return [
+            key if content is None else key + "@" + content
+            for key, content in zip(self.keys, self.contents)
+        ]
+
+    @property
+    def flat(self):
+        """(N*4,2) 视图"""
+        return self._flat
+
+    def bounds(self):
+        """
+        外接矩形
+        :return: (N,4) 数组
+        """
+        return np.concatenate([self.points.min(1), self.points.max(1)], 1)
+
+    def translate(self, offset):
+        self.points += np.float32(offset)
+        return self
+
+    def transform(self, matrix):
+        """
+        原地做仿射 (2,3) 或透视 (3,3) 变换
+        :param matrix: 变换矩阵
+        :return: self
+        """
+        self._flat[...] = transform_points(self._flat, matrix)
+        return self
+
+    def inside(self, width, height):
+        """
+        与画面有交集的框
+        :return: bool 数组
+        """
+        bounds = self.bounds()
+        return (
+            (bounds[:, 2] > 0)
+            & (bounds[:, 3] > 0)
+            & (bounds[:, 0] < width)
+            & (bounds[:, 1] < height)
+        )
+
+    def select(self, mask):
+        """
+        原地保留部分框
+        :param mask: bool 数组或序号
+        :return: self
+        """
+        self.points = np.ascontiguousarray(self.points[mask])
+        self.keys = self.keys[mask]
+        self.contents = self.contents[mask]
+        self._flat = self.points.reshape(-1, 2)
+        return self
+
+    def clip(self, width, height):
+        """去掉画面外的框，其余的点裁剪到画面内"""
+        self.select(self.inside(width, height))
+        np.clip(self.points[..., 0], 0, width, out=self.points[..., 0])
+        np.clip(self.points[..., 1], 0, height, out=self.points[..., 1])
+        return self
+
 
 def log_label(filename, image, label_info):
     """
@@ -16,20 +217,10 @@ def log_label(filename, image, label_info):
     :param label_info: 标注数据字典
     :return: None
     """
-    labels = label_info["label"]
-    points = label_info["points"]
+    labels = Labels.of(label_info)
+    coords = labels.points.reshape(-1, 8).astype(np.int64).tolist()
     with open(filename, "w", encoding="utf-8") as file:
-        for lno, label in enumerate(labels):
-            pts = (
-                int(points[lno * 4][0]),
-                int(points[lno * 4][1]),
-                int(points[lno * 4 + 1][0]),
-                int(points[lno * 4 + 1][1]),
-                int(points[lno * 4 + 2][0]),
-                int(points[lno * 4 + 2][1]),
-                int(points[lno * 4 + 3][0]),
-                int(points[lno * 4 + 3][1]),
-            )
+        for pts, label in zip(coords, labels.label):
             line = ";".join(map(str, [image, *pts, label]))
             file.write(line + "\n")
 
@@ -40,19 +231,9 @@ def show_label(label_info):
     :param label_info: 标注字典
     :return: 新的标注字典
     """
-    labels = label_info["label"]
-    points = label_info["points"]
-    image = label_info["image"]
-    for lno, _ in enumerate(labels):
-        pts = [
-            [int(points[lno * 4][0]), int(points[lno * 4][1])],
-            [int(points[lno * 4 + 1][0]), int(points[lno * 4 + 1][1])],
-            [int(points[lno * 4 + 2][0]), int(points[lno * 4 + 2][1])],
-            [int(points[lno * 4 + 3][0]), int(points[lno * 4 + 3][1])],
-        ]
-        pts = np.array(pts, np.int32)
-        pts = pts.reshape((-1, 1, 2))
-        cv2.polylines(image, [pts], isClosed=True, color=(0, 255, 0))
+    polygons = Labels.of(label_info).points.astype(np.int32).reshape(-1, 4, 1, 2)
+    image = as_array(label_info["image"])
+    cv2.polylines(image, list(polygons), isClosed=True, color=(0, 255, 0))
     label_info["image"] = image
     return label_info
 
@@ -65,7 +246,7 @@ def save_and_log(label_info, fname, output_dir):
     :param output_dir: 输出路径
     :return: None
     """
-    image = label_info["image"]
+    image = unwrap(label_info["image"])
     name = f"{fname}.jpg"
     if isinstance(image, Image.Image):
         if image.mode == "RGBA":
@@ -14,7 +14,7 @@ import tqdm
 from PIL import Image
 
 from postprocessor.convert import c2p, p2c
-from postprocessor.perspect import perspective_points
+from postprocessor.label import Labels
 
 __all__ = ["Mockup", "random_mockup"]
 
@@ -108,7 +108,7 @@ class Mockup:
 
     def __init__(self, fp, points=None, offset=1, crop=False):
         self.origin = Image.open(fp)
-        self.origin_points = np.array(points, np.int)
+        self.origin_points = np.array(points, np.int32)
 
         if crop:  # 可以随机裁剪增加多样性
             points = self._crop(points, offset)
@@ -171,7 +171,8 @@ class Mockup:
 
         obg.paste(out, mask=Image.fromarray(mask))
         data["image"] = cv2.cvtColor(np.asarray(obg, np.uint8), cv2.COLOR_RGBA2BGR)
-        data["points"] = perspective_points(data["points"], mat)
+        # 样机边缘外扩过，落到画面外的框去掉，其余裁剪到画面内
+        Labels.of(data).transform(mat).clip(*self.size).attach(data)
         data["mask"] = mask
         return data
 
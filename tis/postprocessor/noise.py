@@ -1,47 +1,106 @@
 """
 图像噪声生成模块
+噪声不再逐张按整幅图生成：NoiseRing 预先生成一环噪声块，
+加噪时按随机偏移、随机翻转把噪声块铺满图像，逐块在 uint8 图像上原地计算，
+只产生噪声块大小的 float32 临时数组。
 """
 import random
+from functools import lru_cache
 
 import numpy as np
 
+TILE_SIZE = 256
+TILE_COUNT = 8
 
-def pepper_noise(image, prob=0.01):
+
+class NoiseRing:
+    """噪声块环，gauss 是标准正态噪声，uniform 是 [0, 65536) 的均匀噪声"""
+
+    def __init__(self, tile=TILE_SIZE, count=TILE_COUNT, channels=4):
+        """
+        :param tile: int 噪声块边长
+        :param count: int 噪声块数量
+        :param channels: int 最多支持的通道数
+        """
+        self.tile = tile
+        self.count = count
+        shape = (count, tile, tile)
+        self.gauss = np.random.standard_normal(shape + (channels,)).astype(np.float32)
+        self.uniform = np.random.randint(0, 1 << 16, shape, np.uint16)
+
+    def blocks(self, tiles, height, width):
+        """
+        随机偏移和翻转后铺满图像的噪声块
+        :param tiles: self.gauss 或 self.uniform
+        :param height: int 图像高
+        :param width: int 图像宽
+        :return: yield tuple[tuple[slice,slice],np.ndarray] 图像中的区域、对应的噪声视图
+        """
+        tile = self.tile
+        off_y, off_x = random.randrange(tile), random.randrange(tile)
+        first = random.randrange(self.count)
+        flip = slice(None, None, -1 if random.random() < 0.5 else 1)
+        flop = slice(None, None, -1 if random.random() < 0.5 else 1)
+        for row, top in enumerate(range(-off_y, height, tile)):
+            for col, left in enumerate(range(-off_x, width, tile)):
+                y_0, y_1 = max(top, 0), min(top + tile, height)
+                x_0, x_1 = max(left, 0), min(left + tile, width)
+                noise = tiles[(first + 3 * row + col) % self.count][flip, flop]
+                yield (slice(y_0, y_1), slice(x_0, x_1)), noise[
+                    y_0 - top : y_1 - top, x_0 - left : x_1 - left
+                ]
+
+
+@lru_cache(maxsize=1)
+def noise_ring():
+    """
+    默认的噪声块环，第一次使用时生成
+    :return: NoiseRing
+    """
+    return NoiseRing()
+
+
+def pepper_noise(image, prob=0.01, inplace=False, ring=None):
     """
     添加椒盐噪声
-    :param image: np.ndarray
+    :param image: np.ndarray uint8
     :param prob: 噪声比例
+    :param inplace: bool 是否直接修改原图
+    :param ring: NoiseRing 噪声块环，默认共用一个
     :return: np.ndarray
     """
-    output = np.zeros(image.shape, np.uint8)
-    thresh = 1 - prob
-    for i in range(image.shape[0]):
-        for j in range(image.shape[1]):
-            rdn = random.random()
-            if rdn < prob:
-                output[i][j] = 0
-            elif rdn > thresh:
-                output[i][j] = 255
-            else:
-                output[i][j] = image[i][j]
-    return output
-
-
-def gauss_noise(image, mean=0, var=0.001):
+    if not inplace:
+        image = image.copy()
+    ring = ring or noise_ring()
+    low = int(prob * (1 << 16))
+    high = (1 << 16) - low
+    for region, uniform in ring.blocks(ring.uniform, *image.shape[:2]):
+        block = image[region]
+        block[uniform < low] = 0
+        block[uniform >= high] = 255
+    return image
+
+
+def gauss_noise(image, mean=0, var=0.001, inplace=False, ring=None):
     """
-    添加高斯噪声
-    :param image: np.ndarray
+    添加高斯噪声，均值和方差按 [0, 1] 的像素值计
+    :param image: np.ndarray uint8
     :param mean: 均值
     :param var: 方差
+    :param inplace: bool 是否直接修改原图
+    :param ring: NoiseRing 噪声块环，默认共用一个
     :return: np.ndarray
     """
-    image = np.array(image / 255, dtype=float)
-    noise = np.random.normal(mean, var**0.5, image.shape)
-    out = image + noise
-    if out.min() < 0:
-        low_clip = -1.0
-    else:
-        low_clip = 0.0
-    out = np.clip(out, low_clip, 1.0)
-    out = np.uint8(out * 255)
-    return out
+    if not inplace:
+        image = image.copy()
+    ring = ring or noise_ring()
+    mean, std = np.float32(mean * 255), np.float32(var**0.5 * 255)
+    channels = image.shape[2] if image.ndim == 3 else 1
+    for region, noise in ring.blocks(ring.gauss, *image.shape[:2]):
+        block = image[region]
+        noise = noise[..., 0] if image.ndim == 2 else noise[..., :channels]
+        out = block.astype(np.float32)
+        out += noise * std + mean
+        np.clip(out, 0, 255, out=out)
+        block[...] = out
+    return image
@@ -54,11 +54,7 @@ class Paper:
             self.dip = width // self.width_mm
             self.height = self.dip * self.height_mm
         self.size = (self.width, self.height)
-        if self.texture:
-            self._image = Image.open(self.texture).resize(self.size)
-        else:
-            self._image = Image.new("RGB", self.size, self.color)
-        self._draw = ImageDraw.Draw(self._image)
+        self._image = None  # 只计算几何尺寸时不分配图像
         if offset_p is not None:
             offset = offset_p // self.dip
         self.pad = (
@@ -78,8 +74,13 @@ class Paper:
 
     @property
     def image(self):
-        """纸张图像"""
+        """纸张图像，首次访问时创建"""
         # self._draw.rectangle(self._box,outline='black',width=4)
+        if self._image is None:
+            if self.texture:
+                self._image = Image.open(self.texture).resize(self.size)
+            else:
+                self._image = Image.new("RGB", self.size, self.color)
         return self._image
 
     def set_header(self, text, font):
@@ -90,8 +91,9 @@ class Paper:
         :return: None
         """
         pos = self.width // 2, self.header_box[3] // 2
-        self._draw.line((0, 10 * DIP) + (self.width, 10 * DIP), fill=(0, 0, 0), width=2)
-        self._draw.text(pos, text, fill="black", font=font, anchor="mm")
+        draw = ImageDraw.Draw(self.image)
+        draw.line((0, 10 * DIP) + (self.width, 10 * DIP), fill=(0, 0, 0), width=2)
+        draw.text(pos, text, fill="black", font=font, anchor="mm")
 
     @property
     def box(self):
@@ -133,7 +135,7 @@ def print_on_a4(image):
     return out
 
 
-@processor
+@processor(layout="cv")
 def add_corner(image, mode="fold"):
     """
     给纸张或图像增加折角效果
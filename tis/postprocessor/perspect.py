@@ -5,6 +5,28 @@ import cv2
 import numpy as np
 
 from postprocessor.convert import as_array
+from postprocessor.label import Labels, transform_points
+
+
+def perspective_matrix(size, left_offset=0.02, right_offset=0.02):
+    """
+    下面两点不动，上面两点向内偏移的透视矩阵
+    :param size: tuple[int,int] 宽高
+    :param left_offset: float 左上角向右偏移比例
+    :param right_offset: float 右上角向左偏移比例
+    :return: np.ndarray (3,3) 矩阵
+    """
+    width, height = size
+    src = np.float32([(0, 0), (width, 0), (0, height), (width, height)])
+    dst = np.float32(
+        [
+            (width * left_offset, 0),
+            (width - width * right_offset, 0),
+            (0, height),
+            (width, height),
+        ]
+    )
+    return cv2.getPerspectiveTransform(src, dst)
 
 
 def perspective(
@@ -28,16 +50,7 @@ def perspective(
     """
     img = as_array(img)
     height, width = img.shape[:2]
-    src = np.float32([(0, 0), (width, 0), (0, height), (width, height)])
-    dst = np.float32(
-        [
-            (width * left_offset, 0),
-            (width - width * right_offset, 0),
-            (0, height),
-            (width, height),
-        ]
-    )
-    mat = cv2.getPerspectiveTransform(src, dst)
+    mat = perspective_matrix((width, height), left_offset, right_offset)
     out = cv2.warpPerspective(img, mat, [width, height], borderValue=border_value)
     if not mask and not matrix:
         return out
@@ -52,15 +65,6 @@ def perspective(
         return out, mat
 
 
-def _trans(points, matrix):
-    points = np.array(points)
-    height, _ = points.shape
-    nps = np.ones((height, 3), np.uint32)
-    nps[:, :2] = points
-    out = np.array(np.matmul(nps, matrix.T))
-    return out
-
-
 def perspective_points(points, matrix):
     """
     经过透视变化后的点坐标
@@ -68,11 +72,7 @@ def perspective_points(points, matrix):
     :param matrix: 所使用的变换矩阵
     :return: np.ndarray 变换后的坐标
     """
-    pts = _trans(points, matrix)
-    pts[:, 0] = np.round(pts[:, 0] // pts[:, 2])
-    pts[:, 1] = np.round(pts[:, 1] // pts[:, 2])
-    points = np.array(pts[:, :2], np.uint32)
-    return points
+    return transform_points(points, matrix).astype(np.float32)
 
 
 def perspective_data(data, left_offset=0.05, right_offset=0.05, border_value=(0, 0, 0)):
@@ -87,7 +87,7 @@ def perspective_data(data, left_offset=0.05, right_offset=0.05, border_value=(0,
     data["image"], mask, mat = perspective(
         data["image"], left_offset, right_offset, border_value, mask=True, matrix=True
     )
-    data["points"] = perspective_points(data["points"], mat)
+    Labels.of(data).transform(mat)
     if data.get("mask", None) is not None:
         data["mask"] = perspective(data["mask"], left_offset, right_offset)
     else:
@@ -0,0 +1,348 @@
+"""
+增强计划
+AugmentPlanner 把 post_processor_config.yaml 编译成计划器：
+概率为 0 的处理器在编译时去掉，每个样本先一次性抽取要执行的处理器和全部参数，
+得到的 AugmentPlan 随样本保存为 <文件名>.plan.json，之后可以按原参数重放。
+相邻的旋转、透视等纯几何变换合并成一次透视变换。
+"""
+import copy
+import json
+import random
+from functools import lru_cache, partial
+
+import cv2
+import numpy as np
+import yaml
+
+from postprocessor import rand as _random
+from postprocessor.background import add_background_data
+from postprocessor.convert import ImageBuffer, as_array, processor, unwrap
+from postprocessor.distort import distort_data
+from postprocessor.label import Labels
+from postprocessor.noise import gauss_noise, pepper_noise
+from postprocessor.perspect import perspective_data, perspective_matrix
+from postprocessor.rand import LIGHT_DIR, PAPER_DIR, SEAL_DIR, random_source
+from postprocessor.reflect import reflect
+from postprocessor.rotate import rotate_data, rotate_matrix
+from postprocessor.seal import add_seal
+from postprocessor.shadow import add_fold, add_shader
+
+
+@lru_cache(maxsize=8)
+def _read_config(path):
+    with open(path, "r", encoding="utf-8") as cfg:
+        return yaml.load(cfg, Loader=yaml.SafeLoader) or {}
+
+
+def load_config(path):
+    """
+    读取后处理配置，同一文件只解析一次
+    :param path: str yaml 路径
+    :return: dict 配置的副本，可以随意修改
+    """
+    return copy.deepcopy(_read_config(path))
+
+
+class Operation:
+    """
+    可编译的后处理器
+    sample(**config) 抽取参数，apply(data, **params) 按参数处理标注字典；
+    geometry(size, **params) 存在时表示纯几何变换，返回 (3,3) 矩阵和输出宽高，
+    相邻的几何变换会合并成一次
+    """
+
+    __slots__ = ("sample", "apply", "geometry")
+
+    def __init__(self, sample, apply, geometry=None):
+        self.sample = sample
+        self.apply = apply
+        self.geometry = geometry
+
+
+def _sample_seal(seal_dir=None):
+    return {
+        "seal": random_source(seal_dir or SEAL_DIR),
+        "x": random.uniform(0, 0.75),
+        "y": random.uniform(0, 0.75),
+        "angle": random.randint(0, 45),
+    }
+
+
+@processor(layout="pil")
+def _apply_seal(img, seal, x, y, angle):
+    width, height = img.size
+    return add_seal(img, seal, (int(x * width), int(y * height)), angle)
+
+
+def _sample_stamp(**_config):
+    return {
+        "x": random.uniform(0, 0.75),
+        "y": random.uniform(0, 0.75),
+        "angle": random.randint(0, 45),
+    }
+
+
+def _apply_stamp(library, data, name, x, y, angle):
+    width, height = as_array(data["image"]).shape[1::-1]
+    return library.stamp(data, name, (int(x * width), int(y * height)), angle)
+
+
+def stamp_operation(library):
+    """
+    用印章库盖章的处理器，名字在抽样时传入
+    planner.sample(random_seal={"name": bankname})
+    :param library: SealLibrary
+    :return: Operation
+    """
+    return Operation(_sample_stamp, partial(_apply_stamp, library))
+
+
+def _sample_fold(min_range=0.25, max_range=0.75):
+    return {
+        "direction": random.choice("hv"),
+        "at": random.uniform(min_range, max_range),
+    }
+
+
+@processor(layout="cv")
+def _apply_fold(img, direction, at):
+    height, width = img.shape[:2]
+    return add_fold(img, int(at * (width if direction == "h" else height)), direction)
+
+
+def _sample_noise(max_prob=0.02):
+    return {"prob": random.uniform(0, max_prob)}
+
+
+def _sample_distortion(max_peak, max_period):
+    return {
+        "peak": random.uniform(0, max_peak),
+        "period": random.randint(1, max_period),
+        "direction": random.choice("xy"),
+    }
+
+
+def _sample_rotate(min_angle=-10, max_angle=10):
+    return {"angle": random.uniform(min_angle, max_angle)}
+
+
+def _rotate_geometry(size, angle):
+    mat, size = rotate_matrix(size, angle)
+    return np.vstack([mat, (0, 0, 1)]), size
+
+
+def _sample_perspective(min_offset=0.02, max_offset=0.05):
+    return {
+        "left_offset": random.uniform(min_offset, max_offset),
+        "right_offset": random.uniform(min_offset, max_offset),
+    }
+
+
+def _perspective_geometry(size, left_offset, right_offset):
+    return perspective_matrix(size, left_offset, right_offset), size
+
+
+def _sample_background(bg_dir, min_offset, max_offset):
+    return {
+        "background": random_source(bg_dir),
+        "offset": random.randint(min_offset, max_offset),
+    }
+
+
+def _sample_reflect(light_dir=None, func="screen", alpha=0.3):
+    return {
+        "light": random_source(light_dir or LIGHT_DIR),
+        "func": func,
+        "alpha": alpha,
+    }
+
+
+OPERATIONS = {
+    "random_seal": Operation(_sample_seal, _apply_seal),
+    "random_fold": Operation(_sample_fold, _apply_fold),
+    "random_noise": Operation(
+        _sample_noise, processor(partial(pepper_noise, inplace=True), layout="cv")
+    ),
+    "random_gauss_noise": Operation(
+        dict, processor(partial(gauss_noise, mean=0.01, inplace=True), layout="cv")
+    ),
+    "random_distortion": Operation(_sample_distortion, distort_data),
+    "random_rotate": Operation(_sample_rotate, rotate_data, _rotate_geometry),
+    "random_perspective": Operation(
+        _sample_perspective, perspective_data, _perspective_geometry
+    ),
+    "random_background": Operation(_sample_background, add_background_data),
+    "random_reflect": Operation(_sample_reflect, processor(reflect, layout="cv")),
+    "random_shadow": Operation(
+        lambda: {"shader": random_source(PAPER_DIR)},
+        processor(add_shader, layout="cv"),
+    ),
+}
+
+
+def _opaque(name):
+    """没有编译版本的处理器，参数就是配置，执行时仍在内部随机，不能精确重放"""
+    return Operation(dict, getattr(_random, name))
+
+
+def warp_data(data, matrix, size):
+    """
+    一次透视变换标注字典，边界填充为黑色，蒙版与 rotate_data 等相同
+    :param data: dict 标注字典
+    :param matrix: (3,3) 变换矩阵
+    :param size: tuple[int,int] 输出宽高
+    :return: dict 标注字典
+    """
+    image = as_array(data["image"])
+    mask = data.get("mask", None)
+    if mask is None:
+        mask = np.ones(image.shape[:2], np.uint8) * 255
+    data["image"] = cv2.warpPerspective(image, matrix, size, borderValue=(0, 0, 0))
+    data["mask"] = cv2.warpPerspective(mask, matrix, size, borderValue=0)
+    Labels.of(data).transform(matrix)
+    return data
+
+
+class AugmentPlan:
+    """一个样本的增强计划，steps 是 [(处理器名, 参数)]"""
+
+    def __init__(self, steps=()):
+        self.steps = [(name, dict(params)) for name, params in steps]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    @property
+    def names(self):
+        return [name for name, _params in self.steps]
+
+    @property
+    def last(self):
+        """最后一个处理器名，空计划为 None"""
+        return self.steps[-1][0] if self.steps else None
+
+    def to_json(self):
+        return json.dumps(self.steps, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(json.loads(text))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        """读取 save 或 log_plan 保存的计划，用 AugmentPlanner.apply 重放"""
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.from_json(file.read())
+
+
+def log_plan(filename, data):
+    """
+    保存标注字典中记录的增强计划，没有计划时不写文件
+    :param filename: json 文件名
+    :param data: dict 标注字典
+    :return: None
+    """
+    plan = data.get("plan")
+    if plan is not None:
+        plan.save(filename)
+
+
+class AugmentPlanner:
+    """增强计划器"""
+
+    def __init__(self, config, operations=None):
+        """
+        :param config: dict|str 配置 {处理器名: {ratio: 概率, 参数...}} 或 yaml 路径
+        :param operations: dict[str, Operation] 替换默认的处理器
+        """
+        if isinstance(config, str):
+            config = load_config(config)
+        operations = dict(OPERATIONS, **(operations or {}))
+        self.names = list(config)
+        self.last = self.names[-1] if self.names else None
+        self.index = {name: index for index, name in enumerate(self.names, start=1)}
+        self.operations = {}
+        self._compiled = []
+        for name, params in config.items():
+            params = dict(params or {})
+            ratio = params.pop("ratio")
+            self.operations[name] = operations.get(name) or _opaque(name)
+            if ratio > 0:  # 概率为 0 的处理器不参与抽样
+                self._compiled.append((name, ratio, params))
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def sample(self, **extra):
+        """
+        抽取一个样本的计划
+        :param extra: 按处理器名附加的参数，如 random_seal={"name": "中国银行"}
+        :return: AugmentPlan
+        """
+        steps = []
+        for name, ratio, params in self._compiled:
+            if ratio >= 1 or random.random() < ratio:
+                params = self.operations[name].sample(**params)
+                params.update(extra.get(name, {}))
+                steps.append((name, params))
+        return AugmentPlan(steps)
+
+    def run(self, data, plan):
+        """
+        按计划逐步处理，相邻的几何变换合并为一步。
+        处理过程中 image 是 ImageBuffer，各步骤之间的格式转换只做一次并缓存，
+        全部处理完后还原为图像
+        :param data: dict 标注字典
+        :param plan: AugmentPlan
+        :return: yield tuple[int,dict] 配置中的序号、处理后的标注字典
+        """
+        steps = list(plan)
+        start = 0
+        while start < len(steps):
+            if not isinstance(data["image"], ImageBuffer):
+                data["image"] = ImageBuffer(data["image"])
+            stop = start + 1
+            if self._is_geometry(steps[start][0]):
+                while stop < len(steps) and self._is_geometry(steps[stop][0]):
+                    stop += 1
+            if stop - start > 1:
+                data = self._warp(data, steps[start:stop])
+            else:
+                name, params = steps[start]
+                data = self.operations[name].apply(data, **params)
+            yield self.index[steps[stop - 1][0]], data
+            start = stop
+        data["image"] = unwrap(data["image"])
+
+    def apply(self, data, plan):
+        """
+        按计划处理，计划记录在标注字典的 plan 中
+        :param data: dict 标注字典
+        :param plan: AugmentPlan
+        :return: dict 标注字典
+        """
+        for _index, data in self.run(data, plan):
+            pass
+        data["plan"] = plan
+        return data
+
+    def __call__(self, data, **extra):
+        return self.apply(data, self.sample(**extra))
+
+    def _is_geometry(self, name):
+        return self.operations[name].geometry is not None
+
+    def _warp(self, data, steps):
+        size = as_array(data["image"]).shape[1::-1]
+        matrix = np.eye(3)
+        for name, params in steps:
+            mat, size = self.operations[name].geometry(size, **params)
+            matrix = mat @ matrix
+        return warp_data(data, matrix, tuple(int(v) for v in size))
@@ -9,9 +9,9 @@ import numpy as np
 
 from postprocessor.background import add_background_data
 from postprocessor.convert import processor
-from postprocessor.curve import bezier_curve
+from postprocessor.curve import StrokePool, bezier_curve
 from postprocessor.displace import TEXTURE_DIR, displace
-from postprocessor.distort import distort
+from postprocessor.distort import distort_data
 from postprocessor.noise import gauss_noise, pepper_noise
 from postprocessor.perspect import perspective_data
 from postprocessor.reflect import reflect
@@ -34,11 +34,7 @@ def random_distortion(data, max_peak, max_period):
     peak = random.uniform(0, max_peak)
     period = random.randint(1, max_period)
     direction = random.choice("xy")
-    if data.get("mask", None) is None:
-        data["mask"] = np.ones(data["image"].shape[:2], np.uint8) * 255
-    data["image"] = distort(data["image"], peak, period, direction)
-    data["mask"] = distort(data["mask"], peak, period, direction)
-    return data
+    return distort_data(data, peak, period, direction)
 
 
 def random_rotate(data, min_angle=-10, max_angle=10):
@@ -103,7 +99,7 @@ def random_background(data, bg_dir, min_offset, max_offset):
 SEAL_DIR = os.path.join(STATIC_DIR, "seal")
 
 
-@processor
+@processor(layout="pil")
 def random_seal(data, seal_dir=None):
     """
     随机盖章
@@ -117,7 +113,7 @@ def random_seal(data, seal_dir=None):
     return add_seal(data, seal)
 
 
-@processor
+@processor(layout="cv")
 def random_fold(data, min_range=0.25, max_range=0.75):
     """
     随机折痕
@@ -135,7 +131,7 @@ def random_fold(data, min_range=0.25, max_range=0.75):
     return add_fold(data, pos, direction)
 
 
-@processor
+@processor(layout="cv")
 def random_noise(data, max_prob=0.02):
     """
     随机噪声
@@ -144,29 +140,39 @@ def random_noise(data, max_prob=0.02):
     :return: dict 标注字典
     """
     prob = random.uniform(0, max_prob)
-    return pepper_noise(data, prob)
+    return pepper_noise(data, prob, inplace=True)
 
 
-@processor
+@processor(layout="cv")
 def random_gauss_noise(data):
-    return gauss_noise(data, mean=0.01)
+    """
+    随机高斯噪声，原地修改图像
+    :param data: dict 标注字典
+    :return: dict 标注字典
+    """
+    return gauss_noise(data, mean=0.01, inplace=True)
 
 
-# @processor
-# def random_reflect(data, light=None):
-#     """
-#     随机反射效果
-#     :param data: dict 标注字典
-#     :return: dict
-#     """
-#     if not light:
-#         light = r'E:\00IT\P\uniform\post_processor\tmp\test.jpeg'
-#     return reflect(data, light)
+LIGHT_DIR = os.path.join(STATIC_DIR, "light")
+
+
+@processor(layout="cv")
+def random_reflect(data, light_dir=None, func="screen", alpha=0.3):
+    """
+    随机反射效果，光照图按路径缓存
+    :param data: dict 标注字典
+    :param light_dir: str 光照图目录
+    :param func: str 混合模式 screen/soft/strong
+    :param alpha: float 光照透明度
+    :return: dict 标注字典
+    """
+    light = random_source(light_dir or LIGHT_DIR)
+    return reflect(data, light, func=func, alpha=alpha)
 
 PAPER_DIR = os.path.join(STATIC_DIR, "paper")
 
 
-@processor
+@processor(layout="cv")
 def random_shadow(data):
     shader = random_source(PAPER_DIR)
     return add_shader(data, shader)
@@ -184,12 +190,27 @@ def random_curve(num=5, high=4):
     return bezier_curve(pts, color)
 
 
-def random_ink():
-    """随机笔迹"""
+def random_ink(pool=None):
+    """
+    随机笔迹
+    :param pool: StrokePool 笔迹池，给出时直接从池中取
+    :return: np.ndarray
+    """
+    if pool is not None:
+        return pool.sample()
     img = random_curve()
     return cv2.blur(spread(img), ksize=(3, 3))
 
 
+def ink_pool(size=64):
+    """
+    预先渲染的随机笔迹池
+    :param size: int 笔迹数量
+    :return: StrokePool
+    """
+    return StrokePool(random_ink, size)
+
+
 def random_displace(text_layer, ratio=2, paper_dir=TEXTURE_DIR):
     """
     随机置换
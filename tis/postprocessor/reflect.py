@@ -2,16 +2,29 @@
 玻璃反光效果
 
 选取一些带有光照效果的图片，作为蒙版按照一定的透明度添加
+色阶表和混合表按参数缓存，混合在 uint8 上用定点数完成：
+滤色用 OpenCV 的饱和乘法，其余模式查 256x256 的二维表。
+Reflector 预先处理光照图，按路径读取的光照图和缩放到各尺寸的结果
+放在一个按字节数限制的全局缓存中，页面尺寸随样本变化时常驻内存也有上限。
 """
+from functools import lru_cache
 
 import cv2
 import numpy as np
 
 from postprocessor.convert import as_array
+from utils.bytecache import ByteLRU
 
+TEXTURE_CACHE_BYTES = 128 * 2**20
+_textures = ByteLRU(TEXTURE_CACHE_BYTES)
 
-# Photoshop 色阶调整算法
-def level_adjust(img, sin=0, hin=255, mt=1.0, sout=0, hout=255):
+
+@lru_cache(maxsize=64)
+def level_table(sin=0, hin=255, mt=1.0, sout=0, hout=255):
+    """
+    Photoshop 色阶调整的查找表
+    :return: np.ndarray uint8 (256,)
+    """
     sin = min(max(sin, 0), hin - 2)  # Sin, 黑场阈值, 0<=Sin<Hin
     hin = min(hin, 255)  # Hin, 白场阈值, Sin<Hin<=255
     mt = min(max(mt, 0.01), 9.99)  # Mt, 灰场调节值, 0.01~9.99
@@ -20,42 +33,18 @@ def level_adjust(img, sin=0, hin=255, mt=1.0, sout=0, hout=255):
 
     dif_in = hin - sin
     dif_out = hout - sout
-    table = np.zeros(256, np.uint16)
-    for i in range(256):
-        v1 = min(max(255 * (i - sin) / dif_in, 0), 255)  # 输入动态线性拉伸
-        v2 = 255 * np.power(v1 / 255, 1 / mt)  # 灰场伽马调节
-        table[i] = min(max(sout + dif_out * v2 / 255, 0), 255)  # 输出线性拉伸
-
-    out = cv2.LUT(img, table)
-    return out
+    index = np.arange(256)
+    v1 = np.clip(255 * (index - sin) / dif_in, 0, 255)  # 输入动态线性拉伸
+    v2 = 255 * np.power(v1 / 255, 1 / mt)  # 灰场伽马调节
+    table = np.clip(sout + dif_out * v2 / 255, 0, 255)  # 输出线性拉伸
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+    return table
 
 
-def apply(bottom_img, top_img, func):
-    """
-    在img1和img2上运用叠加算法，img2在img1 的上层
-    :param bottom_img:底层图
-    :param top_img:上层图
-    :param func:所用算法
-    :return:
-    """
-    if isinstance(func, str):
-        if func == "screen":
-            func = screen
-        elif func == "soft":
-            func = soft_lighten
-        elif func == "strong":
-            func = strong_lighten
-        else:
-            func = add_color
-
-    bottom_img = as_array(bottom_img)
-    top_img = as_array(top_img)
-    top_img = cv2.resize(top_img, (bottom_img.shape[1], bottom_img.shape[0]))
-    img_up = cv2.cvtColor(bottom_img, cv2.COLOR_RGB2BGR, cv2.CV_32FC3)
-    img_down = cv2.cvtColor(top_img, cv2.COLOR_RGB2BGR, cv2.CV_32FC3)
-    img_up = img_up / 255
-    img_down = img_down / 255
-    return func(img_up, img_down) * 255
+# Photoshop 色阶调整算法
+def level_adjust(img, sin=0, hin=255, mt=1.0, sout=0, hout=255):
+    return cv2.LUT(img, level_table(sin, hin, mt, sout, hout))
 
 
 def screen(img1, img2):
@@ -88,17 +77,153 @@ def strong_lighten(img1, img2):
     return dst
 
 
+BLEND_MODES = {"screen": screen, "soft": soft_lighten, "strong": strong_lighten}
+
+
+def blend_mode(func):
+    """
+    :param func: str|callable 模式名或浮点混合函数，未知的名字为叠加模式
+    :return: callable
+    """
+    if isinstance(func, str):
+        return BLEND_MODES.get(func, add_color)
+    return func
+
+
+@lru_cache(maxsize=16)
+def blend_table(func):
+    """
+    二维混合表，下层像素值 a、上层像素值 b 的结果在 table[a << 8 | b]
+    :param func: 浮点混合函数
+    :return: np.ndarray uint8 (65536,)
+    """
+    grid = np.arange(256) / 255
+    dst = func(grid[:, None], grid[None, :]) * 255
+    table = np.clip(np.round(dst), 0, 255).astype(np.uint8).ravel()
+    table.flags.writeable = False
+    return table
+
+
+def blend(bottom_img, top_img, func="screen"):
+    """
+    uint8 定点混合，两图尺寸相同，下层的 alpha 通道保持不变
+    :param bottom_img: np.ndarray 底层图
+    :param top_img: np.ndarray 上层图
+    :param func: str|callable 所用算法
+    :return: np.ndarray uint8
+    """
+    func = blend_mode(func)
+    alpha = None
+    if bottom_img.ndim == 3 and bottom_img.shape[2] == 4:
+        alpha = bottom_img[..., 3:]
+        bottom_img = np.ascontiguousarray(bottom_img[..., :3])
+    if top_img.ndim == 3 and top_img.shape[2] == 4:
+        top_img = cv2.cvtColor(top_img, cv2.COLOR_BGRA2BGR)
+    if top_img.ndim != bottom_img.ndim:
+        code = cv2.COLOR_GRAY2BGR if top_img.ndim == 2 else cv2.COLOR_BGR2GRAY
+        top_img = cv2.cvtColor(top_img, code)
+    if func is screen:
+        # 255 - (255 - a) * (255 - b) / 255
+        inverse = cv2.multiply(
+            cv2.bitwise_not(bottom_img), cv2.bitwise_not(top_img), scale=1 / 255
+        )
+        out = cv2.bitwise_not(inverse)
+    else:
+        index = np.left_shift(bottom_img, 8, dtype=np.uint16)
+        index |= top_img
+        out = blend_table(func)[index]
+    if alpha is not None:
+        out = np.concatenate([out, alpha], 2)
+    return out
+
+
+def apply(bottom_img, top_img, func):
+    """
+    在img1和img2上运用叠加算法，img2在img1 的上层
+    :param bottom_img:底层图
+    :param top_img:上层图，缩放到底层图的大小
+    :param func:所用算法
+    :return: np.ndarray uint8
+    """
+    bottom_img = as_array(bottom_img)
+    top_img = as_array(top_img)
+    top_img = cv2.resize(top_img, (bottom_img.shape[1], bottom_img.shape[0]))
+    return blend(bottom_img, top_img, func)
+
+
+def light_texture(light, ksize=(50, 50), alpha=0.3):
+    """
+    模糊、色阶调整并按透明度压暗的光照图
+    :param light: 光照图
+    :param ksize: 模糊核大小
+    :param alpha: 透明度
+    :return: np.ndarray uint8
+    """
+    out = cv2.blur(as_array(light), ksize)
+    out = level_adjust(out, 90, 225, 1.0, 10, 245)
+    return np.uint8(out * alpha)
+
+
+class Reflector:
+    """反光器，光照图只处理一次，给出 key 时处理结果和缩放结果放入全局缓存"""
+
+    def __init__(self, light, ksize=(50, 50), func="screen", alpha=0.3, key=None):
+        """
+        :param light: 光照图
+        :param ksize: 模糊核大小
+        :param func: str|callable 混合模式
+        :param alpha: 透明度
+        :param key: 可哈希的缓存键，None 时不缓存
+        """
+        self.key = key
+        self.func = blend_mode(func)
+        self.light = None if key is None else _textures.get(key)
+        if self.light is None:
+            self.light = light_texture(light, ksize, alpha)
+            self.light.flags.writeable = False
+            if key is not None:
+                _textures.put(key, self.light)
+
+    def texture(self, size):
+        """
+        :param size: tuple[int,int] 宽高
+        :return: np.ndarray 缩放好的光照图，只读
+        """
+        if self.key is None:
+            return cv2.resize(self.light, size)
+        key = self.key + (size,)
+        texture = _textures.get(key)
+        if texture is None:
+            texture = cv2.resize(self.light, size)
+            texture.flags.writeable = False
+            _textures.put(key, texture)
+        return texture
+
+    def __call__(self, img):
+        img = as_array(img)
+        return blend(img, self.texture(img.shape[1::-1]), self.func)
+
+
+def get_reflector(light, ksize=(50, 50), func="screen", alpha=0.3):
+    """
+    按光照图路径和参数缓存处理结果的反光器
+    :param light: str 光照图路径
+    :return: Reflector
+    """
+    return Reflector(light, ksize, func, alpha, key=(light, tuple(ksize), alpha))
+
+
 def reflect(img, light, ksize=(50, 50), func="screen", alpha=0.3):
     """
     模拟玻璃反射
     https://jingyan.baidu.com/article/4e5b3e193865e8d0911e2444.html
-    :return:
+    :param img: 原图
+    :param light: 光照图，路径时缓存处理结果
+    :param ksize: 模糊核大小
+    :param func: 混合模式
+    :param alpha: 透明度
+    :return: np.ndarray
     """
-
-    light = as_array(light)
-    out = cv2.blur(light, ksize)
-    img2 = level_adjust(out, 90, 225, 1.0, 10, 245)
-    cv2.imwrite("t2.jpg", img2)
-    img2 = np.uint8(img2 * alpha)
-    out = apply(img, img2, func)
-    return out
+    if isinstance(light, str):
+        return get_reflector(light, tuple(ksize), func, alpha)(img)
+    return Reflector(light, ksize, func, alpha)(img)
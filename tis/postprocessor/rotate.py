@@ -4,18 +4,18 @@
 import cv2
 import numpy as np
 
+from postprocessor.convert import as_array
+from postprocessor.label import Labels, transform_points
 
-def rotate_bound(image, angle, border_value=(0, 0, 0), mask=False, matrix=False):
+
+def rotate_matrix(size, angle):
     """
-    旋转图片，扩展边界
-    :param image: np.ndarray
+    扩展边界旋转的变换矩阵
+    :param size: tuple[int,int] 原图宽高
     :param angle: degree
-    :param border_value: 边界填充色
-    :param mask: bool 是否返回 mask
-    :param matrix: bool 是否返回 变换矩阵
-    :return: np.ndarray|tuple
+    :return: tuple[np.ndarray,tuple[int,int]] (2,3) 矩阵和旋转后的宽高
     """
-    height, width = image.shape[:2]
+    width, height = size
     c_x, c_y = width // 2, height // 2
     mat = cv2.getRotationMatrix2D((c_x, c_y), angle, 1.0)
     cos = np.abs(mat[0, 0])
@@ -26,6 +26,21 @@ def rotate_bound(image, angle, border_value=(0, 0, 0), mask=False, matrix=False)
     # adjust the rotation matrix to take into account translation
     mat[0, 2] += (n_w / 2) - c_x
     mat[1, 2] += (n_h / 2) - c_y
+    return mat, (n_w, n_h)
+
+
+def rotate_bound(image, angle, border_value=(0, 0, 0), mask=False, matrix=False):
+    """
+    旋转图片，扩展边界
+    :param image: np.ndarray
+    :param angle: degree
+    :param border_value: 边界填充色
+    :param mask: bool 是否返回 mask
+    :param matrix: bool 是否返回 变换矩阵
+    :return: np.ndarray|tuple
+    """
+    height, width = image.shape[:2]
+    mat, (n_w, n_h) = rotate_matrix((width, height), angle)
     # perform the actual rotation and return the image
     out = cv2.warpAffine(image, mat, (n_w, n_h), borderValue=border_value)
     if mask:
@@ -46,12 +61,7 @@ def rotate_points(points, matrix):
     :param matrix: np.ndarray 旋转矩阵
     :return: np.ndarray 新的点坐标
     """
-    points = np.array(points)
-    height, _ = points.shape
-    nps = np.ones((height, 3), np.uint32)
-    nps[:, :2] = points
-    out = np.array(np.matmul(nps, matrix.T))
-    return out
+    return transform_points(points, matrix)
 
 
 def rotate_data(data, angle=0, border_value=(0, 0, 0)):
@@ -63,9 +73,9 @@ def rotate_data(data, angle=0, border_value=(0, 0, 0)):
     :return: dict 新的标注字典
     """
     data["image"], mask, mat = rotate_bound(
-        data["image"], angle=angle, border_value=border_value, mask=True, matrix=True
+        as_array(data["image"]), angle=angle, border_value=border_value, mask=True, matrix=True
     )
-    data["points"] = rotate_points(data["points"], mat)
+    Labels.of(data).transform(mat)
     if data.get("mask", None) is not None:
         data["mask"] = rotate_bound(
             data["mask"], angle=angle, border_value=border_value
@@ -1,12 +1,16 @@
 """
 印章生成相关相关模块
+SealLibrary 每个名字的印章只生成一次，按角度分桶预先旋转并算好蒙版常驻内存，
+盖章时直接用 numpy 混合到页面缓冲区，并把印章框加入标注。
 """
 import math
 import random
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 from postprocessor.convert import as_array, as_image, c2p
+from postprocessor.label import Labels
 from postprocessor.rotate import rotate_bound
 
 
@@ -183,3 +187,152 @@ def add_seal_box(
         x_0, y_0 = pos
         x_1, y_1 = x_0 + seal.width, y_0 + seal.height
     return img, (x_0, y_0, x_1, y_1)
+
+
+def seal_mask(seal):
+    """
+    印章蒙版，与 add_seal 相同：灰度大于 200 的像素透明，其余不透明度为 200
+    :param seal: np.ndarray BGR 印章
+    :return: np.ndarray uint8 单通道
+    """
+    gray = seal.astype(np.uint32) @ np.array([7471, 38470, 19595], np.uint32)
+    gray = (gray + 0x8000) >> 16
+    return np.where(gray > 200, 0, 200).astype(np.uint8)
+
+
+class SealSprite:
+    """旋转好的印章，像素裁剪到蒙版的外接矩形"""
+
+    __slots__ = ("angle", "size", "offset", "bgr", "alpha", "box")
+
+    def __init__(self, seal, angle):
+        """
+        :param seal: np.ndarray BGR 印章
+        :param angle: 旋转角度
+        """
+        height, width = seal.shape[:2]
+        rotated = rotate_bound(seal, angle, border_value=(255, 255, 255))
+        alpha = seal_mask(rotated)
+        rows, cols = np.nonzero(alpha.any(1))[0], np.nonzero(alpha.any(0))[0]
+        if not len(rows):
+            rows = cols = np.zeros(1, np.int64)
+        y_0, y_1, x_0, x_1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        self.angle = angle
+        self.size = rotated.shape[1], rotated.shape[0]
+        self.offset = int(x_0), int(y_0)
+        self.bgr = np.ascontiguousarray(rotated[y_0:y_1, x_0:x_1])
+        self.alpha = np.ascontiguousarray(alpha[y_0:y_1, x_0:x_1, None])
+        # 圆形章旋转后外接框不变，与 add_seal_box 的 arc_seal 相同
+        left = (self.size[0] - width) // 2
+        top = (self.size[1] - height) // 2
+        self.box = left, top, left + width, top + height
+
+    def blend(self, page, pos):
+        """
+        按蒙版混合到页面，超出页面的部分裁掉
+        :param page: np.ndarray BGR 或 BGRA 页面，原地修改
+        :param pos: 旋转后印章左上角在页面中的位置
+        :return: None
+        """
+        page_h, page_w = page.shape[:2]
+        height, width = self.alpha.shape[:2]
+        left, top = pos[0] + self.offset[0], pos[1] + self.offset[1]
+        x_0, y_0 = max(left, 0), max(top, 0)
+        x_1, y_1 = min(left + width, page_w), min(top + height, page_h)
+        if x_0 >= x_1 or y_0 >= y_1:
+            return
+        crop = slice(y_0 - top, y_1 - top), slice(x_0 - left, x_1 - left)
+        alpha = self.alpha[crop].astype(np.uint32)
+        bgr = self.bgr[crop].astype(np.uint32)
+        if page.ndim == 2:
+            bgr = (bgr @ np.array([7471, 38470, 19595], np.uint32) + 0x8000) >> 16
+            bgr = bgr[..., None]
+            region = page[y_0:y_1, x_0:x_1, None]
+        else:
+            region = page[y_0:y_1, x_0:x_1]
+            if page.shape[2] == 4:
+                bgr = np.concatenate([bgr, np.full_like(alpha, 255)], 2)
+        region[...] = (region * (255 - alpha) + bgr * alpha + 127) // 255
+
+
+class SealLibrary:
+    """
+    印章库
+    印章在第一次使用或 preload 时生成，旋转到 buckets 个角度后常驻内存，
+    每个印章约占 buckets * 160KB
+    """
+
+    def __init__(self, suffix="南京市分行", max_angle=45, buckets=10, maker=None):
+        """
+        :param suffix: 印章文字在名字后追加的后缀
+        :param max_angle: 最大旋转角度
+        :param buckets: 角度分桶数，随机角度取最近的桶
+        :param maker: 印章生成函数 maker(text) -> PIL.Image，默认 gen_seal
+        """
+        self.suffix = suffix
+        self.angles = np.linspace(0, max_angle, buckets).round().astype(int).tolist()
+        self.maker = maker or gen_seal
+        self._sprites = {}
+
+    def __contains__(self, name):
+        return name in self._sprites
+
+    def preload(self, names):
+        """
+        预先生成一批印章
+        :param names: Iterable[str] 名字，如 bank_list
+        :return: SealLibrary
+        """
+        for name in names:
+            self.sprites(name)
+        return self
+
+    def sprites(self, name):
+        """
+        名字对应的各个角度的印章
+        :param name: str 名字
+        :return: list[SealSprite]
+        """
+        sprites = self._sprites.get(name)
+        if sprites is None:
+            # 与 add_seal 读图相同，忽略 alpha 只看颜色
+            seal = as_array(self.maker(name + self.suffix).convert("RGB"))
+            sprites = [SealSprite(seal, angle) for angle in self.angles]
+            self._sprites[name] = sprites
+        return sprites
+
+    def sprite(self, name, angle=None):
+        """
+        :param name: str 名字
+        :param angle: 角度，None 时随机
+        :return: SealSprite 最接近该角度的印章
+        """
+        sprites = self.sprites(name)
+        if angle is None:
+            return random.choice(sprites)
+        return min(sprites, key=lambda sprite: abs(sprite.angle - angle))
+
+    def stamp(self, data, name, pos=None, angle=None):
+        """
+        盖章，印章框作为 seal@名字 加入标注
+        :param data: dict 标注字典
+        :param name: str 名字
+        :param pos: 位置，None 时与 add_seal 相同随机
+        :param angle: 角度，None 时随机
+        :return: dict 标注字典
+        """
+        page = as_array(data["image"])
+        height, width = page.shape[:2]
+        if pos is None:
+            pos = random.randint(0, 3 * width // 4), random.randint(0, 3 * height // 4)
+        sprite = self.sprite(name, angle)
+        sprite.blend(page, pos)
+        data["image"] = page
+
+        box = np.array(sprite.box) + np.tile(pos, 2)
+        box[0::2] = box[0::2].clip(0, width)
+        box[1::2] = box[1::2].clip(0, height)
+        if box[0] < box[2] and box[1] < box[3]:
+            seal = Labels.from_boxes([box], ["seal@" + name])
+            Labels.concat([Labels.of(data), seal]).attach(data)
+        return data
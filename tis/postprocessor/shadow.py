@@ -1,4 +1,5 @@
 """给图片增加渐变和光影"""
+from functools import lru_cache
 
 import cv2
 import numpy as np
@@ -16,70 +17,62 @@ def grad(size, direct, color_start, color_end):
     :return: np.ndarray
     """
     width, height = size
-    # 创建一幅与原图片一样大小的透明图片
-    grad_img = np.ndarray((height, width, 3), dtype=np.uint8)
-
+    length = width if direct == "h" else height
+    start = np.array(color_start[:3], np.float64)
+    step = (np.array(color_end[:3], np.float64) - start) / max(length, 1)
+    line = (start + np.arange(length)[:, None] * step).astype(np.uint8)
     if direct == "h":
-        g_b = float(color_end[0] - color_start[0]) / width
-        g_g = float(color_end[1] - color_start[1]) / width
-        g_r = float(color_end[2] - color_start[2]) / width
-        for i in range(height):
-            for j in range(width):
-                grad_img[i, j, 0] = color_start[0] + j * g_b
-                grad_img[i, j, 1] = color_start[1] + j * g_g
-                grad_img[i, j, 2] = color_start[2] + j * g_r
-    else:
-        g_b = float(color_end[0] - color_start[0]) / height
-        g_g = float(color_end[1] - color_start[1]) / height
-        g_r = float(color_end[2] - color_start[2]) / height
-        for i in range(height):
-            for j in range(width):
-                grad_img[i, j, 0] = color_start[0] + i * g_b
-                grad_img[i, j, 1] = color_start[1] + i * g_g
-                grad_img[i, j, 2] = color_start[2] + i * g_r
-
-    return grad_img
+        return np.ascontiguousarray(np.broadcast_to(line, (height, width, 3)))
+    return np.ascontiguousarray(np.broadcast_to(line[:, None], (height, width, 3)))
 
 
-def add_fold(img, pos, direction="h"):
+@lru_cache(maxsize=1024)
+def fold_line(length):
     """
-    加一条折痕的效果
-    :param img: np.ndarray
-    :param pos: int 位置
-    :param direction: str 方向 h 横向 or v 纵向
-    :return: np.ndarray
+    折痕一侧沿折痕法向的渐变，与 grad(..., (50,50,50), (0,0,0)) 的一行相同，
+    只按长度缓存一维数组，使用时广播到整块
+    :param length: int 渐变长度
+    :return: np.ndarray (length,) uint8 只读
     """
-    height, width = img.shape[:2]
-    if direction == "h":
-        left = img[:, :pos]
-        right = img[:, pos:]
+    step = -50.0 / max(length, 1)
+    line = (50.0 + np.arange(length) * step).astype(np.uint8)
+    line.flags.writeable = False
+    return line
+
 
-        left_light = np.uint8(np.clip((0.8 * left + 1), 0, 255))
-        right_light = np.uint8(np.clip((0.85 * right + 1), 0, 255))
+def _fold_table(light, weight):
+    """[渐变值, 像素值] 查找表，等于 cv2.addWeighted(light[像素], 1, 渐变, weight, 0)"""
+    shade = np.arange(256)[:, None] * weight
+    return np.uint8(np.clip(np.rint(light[None, :] + shade), 0, 255))
 
-        left_mask = grad((pos, height), "h", (50, 50, 50), (0, 0, 0))
-        left = cv2.addWeighted(left_light, 1, left_mask, 1, 0.0)
 
-        right_mask = grad((width - pos, height), "h", (50, 50, 50), (0, 0, 0))
-        right = cv2.addWeighted(right_light, 1, right_mask, 0.8, 0.0)
+_LEFT_LIGHT = np.uint8(np.clip(0.8 * np.arange(256) + 1, 0, 255))
+_RIGHT_LIGHT = np.uint8(np.clip(0.85 * np.arange(256) + 1, 0, 255))
+_FOLD_LEFT = _fold_table(_LEFT_LIGHT, 1)
+_FOLD_RIGHT = _fold_table(_RIGHT_LIGHT, 0.8)
 
-        blend = np.hstack([left, right])
-        assert blend.shape == img.shape
-    else:
-        left = img[:pos, :]
-        right = img[pos:, :]
-        # 分别调整光影
-        left_light = np.uint8(np.clip((0.8 * left + 1), 0, 255))
-        right_light = np.uint8(np.clip((0.85 * right + 1), 0, 255))
 
-        left_mask = grad((width, pos), "v", (50, 50, 50), (0, 0, 0))
-        left = cv2.addWeighted(left_light, 1, left_mask, 1, 0.0)
+def _shade(table, part, axis):
+    """按渐变调整一侧的光影，渐变沿 axis 变化，查表代替整块渐变图和浮点运算"""
+    shape = [1] * part.ndim
+    shape[axis] = part.shape[axis]
+    return table[fold_line(part.shape[axis]).reshape(shape), part]
 
-        right_mask = grad((width, height - pos), "v", (50, 50, 50), (0, 0, 0))
-        right = cv2.addWeighted(right_light, 1, right_mask, 0.8, 0.0)
 
-        blend = np.vstack([left, right])
-        assert blend.shape == img.shape
+def add_fold(img, pos, direction="h"):
+    """
+    加一条折痕的效果
+    :param img: np.ndarray
+    :param pos: int 位置
+    :param direction: str 方向 h 横向 or v 纵向
+    :return: np.ndarray
+    """
+    axis = 1 if direction == "h" else 0
+    left, right = np.split(img, [pos], axis)
+    blend = np.concatenate(
+        [_shade(_FOLD_LEFT, left, axis), _shade(_FOLD_RIGHT, right, axis)], axis
+    )
+    assert blend.shape == img.shape
     return blend
 
 
@@ -40,13 +40,11 @@ def spread(image, offset=1):
     :return: np.ndarray
     """
     rows, cols = image.shape[:2]
-    map_y = np.array([list(range(rows)) for _ in range(cols)], np.float32).T
-    map_x = np.array([list(range(cols)) for _ in range(rows)], np.float32)
     map_ex = np.random.randint(-offset, offset, (rows, cols))
     map_ey = np.random.randint(-offset, offset, (rows, cols))
-    map_x = map_x + map_ex
-    map_y = map_y + map_ey
-    map_x = np.clip(map_x, 0, cols - 1).astype(np.float32)
-    map_y = np.clip(map_y, 0, rows - 1).astype(np.float32)
+    map_x = np.arange(cols, dtype=np.float32) + map_ex.astype(np.float32)
+    map_y = np.arange(rows, dtype=np.float32)[:, None] + map_ey.astype(np.float32)
+    map_x = np.clip(map_x, 0, cols - 1, out=map_x)
+    map_y = np.clip(map_y, 0, rows - 1, out=map_y)
     out = cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR)
     return out
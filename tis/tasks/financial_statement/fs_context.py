@@ -0,0 +1,91 @@
+"""
+财报渲染上下文
+在 FSFactory 的生命周期内持有字体、纸张几何尺寸和解码后的背景原图，
+逐张渲染时不再读文件、不再创建字体。
+缩放后的背景随表格尺寸变化，放在按字节数限制的缓存里。
+"""
+from PIL import Image, ImageFont
+
+from postprocessor.paper import Paper
+from utils.bytecache import ByteLRU
+
+BACKGROUND_CACHE_BYTES = 64 * 2**20  # 缩放后背景缓存的字节数上限
+
+
+class FSRenderContext:
+    """财报渲染共享资源"""
+
+    def __init__(self):
+        self._fonts = {}
+        self._papers = {}
+        self._sources = {}
+        self._backgrounds = ByteLRU(BACKGROUND_CACHE_BYTES)
+        self.stats = {"font": 0, "font_hit": 0, "bg": 0, "bg_hit": 0}
+
+    def font(self, path, size):
+        """
+        获取字体，同一路径字号只创建一次
+        :param path: 字体路径
+        :param size: 字号
+        :return: FreeTypeFont
+        """
+        key = (path, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = ImageFont.truetype(path, size)
+            self._fonts[key] = font
+            self.stats["font"] += 1
+        else:
+            self.stats["font_hit"] += 1
+        return font
+
+    def paper_box(self, direction="v", offset=20):
+        """
+        纸张可用区域，只计算几何尺寸
+        :param direction: v 竖向 h 横向
+        :param offset: 页边距毫米数
+        :return: tuple 可用区域
+        """
+        key = (direction, offset)
+        box = self._papers.get(key)
+        if box is None:
+            box = Paper(direction=direction, offset=offset).box
+            self._papers[key] = box
+        return box
+
+    def background(self, path, bg_box, size):
+        """
+        按表格尺寸缩放背景，原图每个路径只解码一次，返回副本供绘制
+        :param path: 背景图片路径
+        :param bg_box: 背景中表格区域
+        :param size: 表格图片尺寸
+        :return: tuple[Image, tuple] 背景图和表格起点
+        """
+        w, h = size
+        x1, y1, x2, y2 = bg_box
+        w0, h0 = x2 - x1, y2 - y1
+        key = (path, tuple(bg_box), size)
+        image = self._backgrounds.get(key)
+        if image is None:
+            source = self._sources.get(path)
+            if source is None:
+                with Image.open(path) as source:
+                    source.load()
+                self._sources[path] = source
+            wb, hb = source.size
+            image = source.resize((int(wb * w / w0), int(hb * h / h0)))
+            self._backgrounds.put(key, image)
+            self.stats["bg"] += 1
+        else:
+            self.stats["bg_hit"] += 1
+        return image.copy(), (int(x1 * w / w0), int(y1 * h / h0))
+
+    def savings(self):
+        """
+        复用统计，用于进度条显示
+        :return: dict
+        """
+        return {
+            "fonts": f"{self.stats['font_hit']}/{self.stats['font']}",
+            "bgs": f"{self.stats['bg_hit']}/{self.stats['bg']}",
+        }
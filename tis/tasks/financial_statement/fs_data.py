@@ -12,7 +12,7 @@ import cv2
 import faker
 import numpy as np
 import yaml
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
 sys.path.append("E:\\00IT\\P\\uniform")
 from awesometable.awesometable import (
@@ -27,7 +27,7 @@ from awesometable.awesometable import (
     wrap,
 )
 from awesometable.converter import from_list
-from postprocessor.paper import Paper
+from .fs_context import FSRenderContext
 from postprocessor.seal import add_seal_box, gen_name_seal, gen_seal
 from utils.ulpb import encode
 
@@ -70,8 +70,15 @@ random_words = lambda: FAKE_CN.word()
 class FinancialStatementTable(object):
     """财报统一生成接口"""
 
-    def __init__(self, name, lang="zh_CN", random_price=None):
+    def __init__(self, name, lang="zh_CN", random_price=None, ctx=None):
+        """
+        :param name: 报表名称
+        :param lang: 语种
+        :param random_price: 生成金额的函数
+        :param ctx: FSRenderContext 共享纸张几何尺寸，None 时新建
+        """
         self.faker = faker.Faker(lang)
+        self.ctx = ctx or FSRenderContext()
         self.is_zh = "zh" in lang
         if random_price:
             self.random_price = random_price
@@ -425,7 +432,7 @@ class FinancialStatementTable(object):
             for i in range(batch):
                 yield self.table
         else:
-            lpp = _compute_lines_per_page(self.table)
+            lpp = _compute_lines_per_page(self.table, ctx=self.ctx)
             for i in range(batch):
                 for t in paginate(self.table, lpp):
                     yield t
@@ -704,15 +711,15 @@ def gen_header(c, w, h=tuple(range(5))):
     return t
 
 
-def _compute_lines_per_page(table, fontsize=40, line_pad=-5):
+def _compute_lines_per_page(table, fontsize=40, line_pad=-5, ctx=None):
+    ctx = ctx or FSRenderContext()
     lines = str(table).splitlines()
     w = str_block_width(lines[0]) * fontsize // 2
     h = len(lines) * (fontsize + line_pad)
     if h > w:
-        paper = Paper(direction="v")
+        box = ctx.paper_box("v")
     else:
-        paper = Paper(direction="h", offset=10)
-    box = paper.box
+        box = ctx.paper_box("h", offset=10)
     ww, hh = box[2] - box[0], box[3] - box[1]
     lines = int(hh * (w / ww) / (fontsize + line_pad))
     return lines // 2
@@ -736,10 +743,13 @@ def fstable2image(
     sealed=True,
     bold_pattern=None,
     back_pattern=None,
+    ctx=None,
 ):
     """
     将财务报表渲染成图片
+    :param ctx: FSRenderContext 共享字体和背景，None 时新建
     """
+    ctx = ctx or FSRenderContext()
     assert font_size % 4 == 0
     lines = str(table).splitlines()
     char_width = font_size // 2  # 西文字符宽度
@@ -752,29 +762,23 @@ def fstable2image(
     h = (len(lines) + 6) * line_height  # 图片高度
 
     if background and bg_box:
-        x1, y1, x2, y2 = bg_box
-        w0, h0 = x2 - x1, y2 - y1
-        background = Image.open(background)
-        wb, hb = background.size
-        wn, hn = int(wb * w / w0), int(hb * h / h0)
-        background = background.resize((wn, hn))
-        x0, y0 = int(x1 * w / w0), int(y1 * h / h0)
+        background, (x0, y0) = ctx.background(background, bg_box, (w, h))
     else:
         background = Image.new("RGB", (w, h), bgcolor)
         x0, y0 = xy or (char_width + char_width * offset, char_width)
 
     draw = ImageDraw.Draw(background)
-    font = ImageFont.truetype(font_path, font_size)
+    font = ctx.font(font_path, font_size)
 
-    title_font = ImageFont.truetype("simhei.ttf", font_size + 10)
-    subtitle_font = ImageFont.truetype("simkai.ttf", font_size - 2)
+    title_font = ctx.font("simhei.ttf", font_size + 10)
+    subtitle_font = ctx.font("simkai.ttf", font_size - 2)
     handwrite_fonts = [
-        ImageFont.truetype("./static/fonts/shouxie.ttf", font_size + 10),
-        ImageFont.truetype("./static/fonts/shouxie1.ttf", font_size + 10),
-        ImageFont.truetype("./static/fonts/shouxie2.ttf", font_size + 10),
+        ctx.font("./static/fonts/shouxie.ttf", font_size + 10),
+        ctx.font("./static/fonts/shouxie1.ttf", font_size + 10),
+        ctx.font("./static/fonts/shouxie2.ttf", font_size + 10),
     ]
-    bold_font = ImageFont.truetype("simkai.ttf", font_size)
-    text_font = ImageFont.truetype(font_path, font_size)
+    bold_font = ctx.font("simkai.ttf", font_size)
+    text_font = ctx.font(font_path, font_size)
 
     cell_boxes = set()  # 多行文字的外框是同一个，需要去重
     text_boxes = []  # 文本框
@@ -1047,10 +1051,13 @@ def fstable2image_en(
     striped_color=BLUE,
     bold_pattern=None,
     back_pattern=None,
+    ctx=None,
 ):
     """
     将财务报表渲染成图片
+    :param ctx: FSRenderContext 共享字体和背景，None 时新建
     """
+    ctx = ctx or FSRenderContext()
     assert font_size % 4 == 0  # 图个方便
 
     char_width = font_size // 2  # 西文字符宽度
@@ -1064,13 +1071,7 @@ def fstable2image_en(
     h = (len(lines) + 6) * line_height  # 图片高度
 
     if background is not None and bg_box:
-        x1, y1, x2, y2 = bg_box
-        w0, h0 = x2 - x1, y2 - y1
-        background = Image.open(background)
-        wb, hb = background.size
-        wn, hn = int(wb * w / w0), int(hb * h / h0)
-        background = background.resize((wn, hn))
-        x0, y0 = int(x1 * w / w0), int(y1 * h / h0)
+        background, (x0, y0) = ctx.background(background, bg_box, (w, h))
     else:
         background = Image.new("RGB", (w, h), bgcolor)
         x0, y0 = xy or (char_width + char_width * offset, char_width)
@@ -1088,17 +1089,17 @@ def fstable2image_en(
             need_striped = False
 
     draw = ImageDraw.Draw(background)
-    font = ImageFont.truetype(font_path, font_size)
+    font = ctx.font(font_path, font_size)
 
-    en_font = ImageFont.truetype("arial.ttf", font_size)
-    title_font = ImageFont.truetype("ariblk.ttf", font_size + 12)
-    subtitle_font = ImageFont.truetype("ariali.ttf", font_size - 2)
+    en_font = ctx.font("arial.ttf", font_size)
+    title_font = ctx.font("ariblk.ttf", font_size + 12)
+    subtitle_font = ctx.font("ariali.ttf", font_size - 2)
     # handwrite_fonts = [
     #     ImageFont.truetype('./static/fonts/shouxie.ttf', font_size + 10),
     #     ImageFont.truetype('./static/fonts/shouxie1.ttf', font_size + 10),
     #     ImageFont.truetype('./static/fonts/shouxie2.ttf', font_size + 10)]
-    bold_font = ImageFont.truetype("arialbi.ttf", font_size)
-    text_font = ImageFont.truetype("simfang.ttf", font_size)
+    bold_font = ctx.font("arialbi.ttf", font_size)
+    text_font = ctx.font("simfang.ttf", font_size)
 
     cell_boxes = set()  # 多行文字的外框是同一个，需要去重
     text_boxes = []  # 文本框
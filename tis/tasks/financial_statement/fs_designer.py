@@ -373,6 +373,18 @@ class LayoutDesigner(object):
     def _toggle_style(self):
         self.ta.style = random.choice(["striped", "other", "simple"])
 
+    def render(self, index):
+        """
+        按序号轮流使用五种版式生成一页
+        :param index: int 序号
+        :return: dict 标注字典
+        """
+        self._toggle_style()
+        image_data = self.create(index % 5).get_image()
+        if index % 5 != 4:
+            return add_to_paper(image_data, paper)
+        return add_background_data(image_data, paper.image, offset=100)
+
     def run(self, batch, output_dir):
         """
         循环生成
@@ -382,24 +394,11 @@ class LayoutDesigner(object):
         """
         if not os.path.exists(output_dir):
             os.mkdir(output_dir)
-        err = 0
         cnt = 0
         pbar = tqdm(total=batch)
         pbar.set_description("Generating")
         while cnt < batch:
-            self._toggle_style()
-            try:
-                image_data = self.create(cnt % 5).get_image()
-            except ValueError as e:
-                err += 1
-                print(err)
-                raise e
-                continue
-
-            if cnt % 5 != 4:
-                image_data = add_to_paper(image_data, paper)
-            else:
-                image_data = add_background_data(image_data, paper.image, offset=100)
+            image_data = self.render(cnt)
 
             fn = "0" + str(int(time.time() * 1000))[5:]
             cv2.imwrite(os.path.join(output_dir, "%s.jpg" % fn), image_data["image"])
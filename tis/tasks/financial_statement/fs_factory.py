@@ -5,13 +5,11 @@ import os
 import random
 import re
 import sys
-import time
 from functools import partial
 from itertools import cycle
 from threading import Thread
 
 import cv2
-import numpy as np
 import yaml
 from tqdm import tqdm
 
@@ -20,11 +18,14 @@ PROJECT_DIR = os.path.dirname(os.path.dirname(BASE_DIR))
 
 sys.path.append(PROJECT_DIR)
 from awesometable.table2pdf import render_pdf
+from .fs_context import FSRenderContext
 from .fs_data import FinancialStatementTable, fstable2image, fstable2image_en
 from .fs_designer import LayoutDesigner
-from postprocessor import rand as _random
-from postprocessor.background import add_background_data
+from postprocessor.background import flatten_on
+from postprocessor.convert import as_array
 from postprocessor.label import log_label
+from postprocessor.plan import AugmentPlanner, log_plan
+from utils.pipeline import run_stages, unique_name
 from _appdir import OUTPUT_DIR
 
 print(OUTPUT_DIR)
@@ -38,6 +39,7 @@ class FSFactory(Thread):
 
     def __init__(self, type, batch, lang="zh_CN", need_proc=True):
         super().__init__()
+        self._args = (type, batch, lang, need_proc)
         self.batch = batch
         if lang == "zh_CN":
             config = "./config/fs_config_zh.yaml"
@@ -51,7 +53,10 @@ class FSFactory(Thread):
         else:
             names = [n for n in config.keys() if type in n]
 
-        self.table_machines = [FinancialStatementTable(name, lang) for name in names]
+        self.ctx = FSRenderContext()  # 字体、纸张、背景在工厂生命周期内复用
+        self.table_machines = [
+            FinancialStatementTable(name, lang, ctx=self.ctx) for name in names
+        ]
         self.fst = None
         if lang == "zh_CN":
             self.image_compositor = fstable2image  # table > image
@@ -64,140 +69,134 @@ class FSFactory(Thread):
             self.output_dir = os.path.join(OUTPUT_DIR, "financial_statement_en_layout")
 
         self.background_generator = None
-        self.post_processor = [
-            #     {'func': random_seal, 'ratio': 0.4},
-            #     {'func': random_pollution, 'ratio': 0},
-            #     {'func': random_fold, 'ratio': 0.5},
-            #     {'func': random_noise, 'ratio': 0.5},
-            #     {'func': random_distortion, 'ratio': 1},
-            #     {'func': random_rotate, 'ratio': 0.3},
-            #     {'func': random_perspective, 'ratio': 1},
-            #     {'func': random_background, 'ratio': 0.3},
-            #     {'func': show_label, 'ratio': 1},
-        ]
-
+        self.planner = None
         if need_proc:
-            with open(
-                "./config/post_processor_config.yaml", "r", encoding="utf-8"
-            ) as f:
-                self.post_processor_config = yaml.load(f, Loader=yaml.SafeLoader)
-            self.post_processor = []
-            for k, v in self.post_processor_config.items():
-                ratio = v.pop("ratio")
-                func = partial(getattr(_random, k), **v)
-                self.post_processor.append({"func": func, "ratio": ratio})
+            self.planner = AugmentPlanner("./config/post_processor_config.yaml")
 
         if not os.path.exists(self.output_dir):
             os.mkdir(self.output_dir)
         self.save_mid = False
 
     def _save_and_log(self, image_data, fn):
-        cv2.imwrite(os.path.join(self.output_dir, "%s.jpg" % fn), image_data["image"])
+        cv2.imwrite(
+            os.path.join(self.output_dir, "%s.jpg" % fn), as_array(image_data["image"])
+        )
         log_label(
             os.path.join(self.output_dir, "%s.txt" % fn), "%s.jpg" % fn, image_data
         )
+        log_plan(os.path.join(self.output_dir, "%s.plan.json" % fn), image_data)
+
+    def generate(self, count):
+        """
+        轮流从各个报表生成器取表格
+        :param count: 数量
+        :return: yield 表格，排版模式下为版式序号
+        """
+        if self.fst:
+            yield from range(count)
+            return
+        machines = cycle(self.table_machines)
+        while count > 0:
+            for t in next(machines).create(min(5, count), page_it=False):
+                yield t
+                count -= 1
+
+    def render(self, item):
+        """
+        表格渲染为图片
+        :param item: generate 的输出
+        :return: tuple[str,dict] 文件名、标注字典
+        """
+        fn = unique_name()
+        if self.fst:
+            return fn, self.fst.render(item)
+
+        if random.random() < 0.5:
+            back_pattern = self.BACK_PATTERN
+        else:
+            back_pattern = None
+
+        vr, hr = random.choice(
+            [
+                ("ALL", "ALL"),
+                ("None", "HEADER"),
+                ("ALL", "HEADER"),
+                ("NONE", "NONE"),
+            ]
+        )
 
-    def run(self):
-        output_dir = self.output_dir
+        image_data = self.image_compositor(
+            item,
+            line_pad=-2,
+            offset=10,
+            vrules=vr,
+            hrules=hr,
+            bold_pattern=self.BOLD_PATTERN,
+            back_pattern=back_pattern,
+            ctx=self.ctx,
+        )
+        if self.save_mid:
+            self._save_and_log(image_data, fn)
+        return fn, image_data
+
+    def postprocess(self, item):
+        """
+        按配置的概率依次后处理，排版模式不做后处理
+        :param item: render 的输出
+        :return: tuple[str,dict] 文件名、标注字典
+        """
+        fn, image_data = item
+        if self.fst or not self.planner:
+            return fn, image_data
+
+        plan = self.planner.sample()
+        for fno, image_data in self.planner.run(image_data, plan):
+            if self.save_mid:
+                fn = str(fno) + fn[1:]
+                self._save_and_log(image_data, fn)
+        image_data["plan"] = plan
+        # 如果最后没有使用到 背景，就无偏的增加白底
+        if plan.last != self.planner.last:
+            image_data = flatten_on((255, 255, 255))(image_data)
+        return fn, image_data
+
+    def write(self, item):
+        """
+        保存图片和标注
+        :param item: postprocess 的输出
+        :return: str 文件名
+        """
+        fn, image_data = item
+        self._save_and_log(image_data, fn)
+        # 生成pdf
+        # render_pdf(image_data,
+        #            os.path.join(self.output_dir, "%s.pdf" % fn))
+        return fn
 
+    def run(self):
         if self.fst:
-            self.fst.run(self.batch, output_dir)
+            self.fst.run(self.batch, self.output_dir)
             return
 
         pbar = tqdm(total=self.batch)
         pbar.set_description("FsFactory")
-        count = 0
-
-        # print(self.save_mid)
-        for table_generator in cycle(self.table_machines):
-            for t in table_generator.create(5, page_it=False):
-                fn = "0" + str(int(time.time() * 1000))[5:]
-                if random.random() < 0.5:
-                    back_pattern = self.BACK_PATTERN
-                else:
-                    back_pattern = None
-
-                vr, hr = random.choice(
-                    [
-                        ("ALL", "ALL"),
-                        ("None", "HEADER"),
-                        ("ALL", "HEADER"),
-                        ("NONE", "NONE"),
-                    ]
-                )
-
-                image_data = self.image_compositor(
-                    t,
-                    line_pad=-2,
-                    offset=10,
-                    vrules=vr,
-                    hrules=hr,
-                    bold_pattern=self.BOLD_PATTERN,
-                    back_pattern=back_pattern,
-                )
-                # print(image_data.keys())
-                if self.save_mid:
-                    cv2.imwrite(
-                        os.path.join(output_dir, "%s.jpg" % fn), image_data["image"]
-                    )
-                    log_label(
-                        os.path.join(output_dir, "%s.txt" % fn),
-                        "%s.jpg" % fn,
-                        image_data,
-                    )
-                    if count >= self.batch:
-                        return
-                    else:
-                        count += 1
-
-                if self.post_processor:
-                    for fno, fd in enumerate(self.post_processor, start=1):
-                        if random.random() < fd["ratio"]:
-                            func = fd.get("func")
-                            image_data = func(image_data)  # 默认参数就是随机的
-                            if self.save_mid:
-                                fn = str(fno) + fn[1:]
-                                cv2.imwrite(
-                                    os.path.join(output_dir, "%s.jpg" % fn),
-                                    image_data["image"],
-                                )
-                                log_label(
-                                    os.path.join(output_dir, "%s.txt" % fn),
-                                    "%s.jpg" % fn,
-                                    image_data,
-                                )
-                                if count >= self.batch:
-                                    return
-                                else:
-                                    count += 1
-                    else:  # 如果最后没有使用到 背景，就无偏的增加白底
-                        if not func is self.post_processor[-1]["func"]:
-                            white = np.ones_like(image_data["image"]) * 255
-                            image_data = add_background_data(image_data, white, 0)
-
-                # if not self.save_mid:
-                print(os.path.join(output_dir, "%s.jpg" % fn))
-                cv2.imwrite(
-                    os.path.join(output_dir, "%s.jpg" % fn), image_data["image"]
-                )
-                # 生成pdf
-
-                # render_pdf(image_data,
-                #            os.path.join(output_dir, "%s.pdf" % fn))
-
-                log_label(
-                    os.path.join(output_dir, "%s.txt" % fn),
-                    "%s.jpg" % fn,
-                    image_data,
-                )
-                if count >= self.batch:
-                    return
-                else:
-                    count += 1
-
-                pbar.update(1)
+        for t in self.generate(self.batch):
+            self.write(self.postprocess(self.render(t)))
+            pbar.set_postfix(self.ctx.savings())
+            pbar.update(1)
         pbar.close()
 
+    def run_parallel(self, workers=None, queue_size=16):
+        """
+        多进程运行，生成、渲染、后处理、保存各自一个进程池
+        每个进程各有一份渲染上下文和后处理配置
+        :param workers: 见 utils.pipeline.plan_workers
+        :param queue_size: 阶段之间的队列长度
+        :return: int 完成的数量
+        """
+        builder = partial(type(self), *self._args)
+        return run_stages(builder, self.batch, workers, queue_size, "FsFactory")
+
 
 if __name__ == "__main__":
     import argparse
@@ -207,6 +206,10 @@ if __name__ == "__main__":
     parser.add_argument("lang", type=str, choices=["zh_CN", "en"], help="zh_CN or en")
     parser.add_argument("batch", type=int, help="总量")
     parser.add_argument("-p", "--post_process", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="进程数")
     args = parser.parse_args()
     ff = FSFactory(args.type, args.batch, args.lang, need_proc=args.post_process)
-    ff.run()
+    if args.workers:
+        ff.run_parallel(args.workers)
+    else:
+        ff.run()
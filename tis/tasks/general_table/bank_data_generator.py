@@ -180,6 +180,181 @@ class BankDetailProvider:
         }
 
 
+    def batch(self, size):
+        """
+        一次生成 size 张流水单的列式数据
+        :param size: 流水单数量
+        :return: BankStatements
+        """
+        return BankStatements.generate(size, self.faker, self._banks)
+
+    def create(self, iterations=1, batch_size=1024):
+        """
+        与 Schema.create 接口相同，按批生成后逐张返回
+        :param iterations: 流水单数量
+        :param batch_size: 每批数量
+        :return: generator
+        """
+        while iterations > 0:
+            statements = self.batch(min(batch_size, iterations))
+            iterations -= len(statements)
+            yield from statements
+
+
+class BankStatements:
+    """多张流水单的列式数据，每列是全部流水行拼接的 numpy 数组"""
+
+    # 与 BankDetailProvider 中 DataFrame 的列顺序一致
+    columns = [
+        "工作日期",
+        "账号",
+        "应用号",
+        "序号",
+        "币种",
+        "钞汇",
+        "交易代码",
+        "注释",
+        "借贷",
+        "发生额",
+        "余额",
+        "存期",
+        "约转期",
+        "通知种类",
+        "利息",
+        "利息税",
+        "起息日",
+        "止息日",
+        "地区号",
+        "网点号",
+        "操作员",
+        "界面",
+    ]
+    constants = {
+        "应用号": 1,
+        "币种": "RMB",
+        "钞汇": "钞",
+        "存期": 0,
+        "约转期": "不转存",
+        "通知种类": 0,
+        "利息": 0,
+        "利息税": 0,
+        "止息日": "2099-12-31",
+    }
+
+    def __init__(self, header, rows, offsets):
+        """
+        :param header: 每张单一个值的列，长度为单数
+        :param rows: 每行一个值的列，长度为总行数
+        :param offsets: 各单在行列中的起止位置，长度为单数加一
+        """
+        self.header = header
+        self.rows = rows
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def generate(cls, size, faker, banks):
+        """
+        向量化生成 size 张流水单
+        金额以分为单位的整数累加，余额由分段 cumsum 得到，日期为逐月月末
+        :param size: 流水单数量
+        :param faker: Faker 实例
+        :param banks: 银行列表
+        :return: BankStatements
+        """
+        nums = np.random.randint(10, 21, size)
+        offsets = np.concatenate([[0], np.cumsum(nums)])
+        total = int(offsets[-1])
+        owner = np.repeat(np.arange(size), nums)
+        seq = np.arange(total) - offsets[:-1][owner]
+
+        starts = [faker.date_this_decade() for _ in range(size)]
+        months = np.array(starts, "datetime64[M]")[owner] + seq
+        dates = np.datetime_as_string((months + 1).astype("datetime64[D]") - 1)
+
+        cents = np.random.randint(-100000, 100001, total)
+        running = np.cumsum(cents)
+        before = running[offsets[:-1]] - cents[offsets[:-1]]
+        money = np.random.randint(10000, 100001, size) * 100
+        balance = (money[owner] + running - before[owner]) / 100
+
+        header = {
+            "卡号": [faker.credit_card_number() for _ in range(size)],
+            "户名": [faker.name() for _ in range(size)],
+            "银行": [random.choice(banks) for _ in range(size)],
+            "起始日期": [str(one) for one in starts],
+            "截止日期": dates[offsets[1:] - 1].tolist(),
+            "操作地区": [_("zip_code") for _ in range(size)],
+            "操作网点": np.random.randint(1000, 1101, size).tolist(),
+            "操作柜员": np.random.randint(10000, 20001, size).tolist(),
+        }
+        rows = {
+            "工作日期": dates,
+            "序号": seq + 1,
+            "交易代码": np.random.randint(0, 3, total),
+            "注释": np.random.choice(["工资", "ATM转账", "ATM取款", "消费", "现存"], total),
+            "借贷": np.where(cents > 0, "贷", "借"),
+            "发生额": np.abs(cents) / 100,
+            "余额": balance,
+            "网点号": np.random.randint(1000, 1100, total),
+            "操作员": np.random.randint(10000, 20000, total),
+            "界面": np.random.choice(["ATM交易", "网上银行", "批量业务", "POS交易"], total),
+        }
+        return cls(header, rows, offsets)
+
+    def __getitem__(self, index):
+        detail = {key: value[index] for key, value in self.header.items()}
+        detail["流水明细"] = StatementSlice(self, index)
+        return detail
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class StatementSlice:
+    """BankStatements 中一张单的流水明细视图，供 from_dataframe 使用"""
+
+    def __init__(self, statements, index):
+        self.statements = statements
+        self.index = index
+        self.columns = list(BankStatements.columns)
+
+    def __len__(self):
+        offsets = self.statements.offsets
+        return int(offsets[self.index + 1] - offsets[self.index])
+
+    def column(self, name):
+        """
+        某一列在本单中的值
+        :param name: 列名
+        :return: list
+        """
+        stat = self.statements
+        if name in stat.rows:
+            lo, hi = stat.offsets[self.index], stat.offsets[self.index + 1]
+            return stat.rows[name][lo:hi].tolist()
+        if name in stat.constants:
+            value = stat.constants[name]
+        elif name == "账号":
+            value = stat.header["卡号"][self.index]
+        elif name == "起息日":
+            value = stat.header["起始日期"][self.index]
+        else:  # 地区号
+            value = stat.header["操作地区"][self.index]
+        return [value] * len(self)
+
+    def values(self, field_names):
+        """
+        按列名取出各行
+        :param field_names: 列名
+        :return: list[list]
+        """
+        return [list(row) for row in zip(*(self.column(n) for n in field_names))]
+
+
 bank_engine = BankDetailProvider()
 bank_detail_generator = Schema(bank_engine)
 
@@ -207,7 +382,10 @@ def from_dataframe(df, max_cols=12, drop=True):
         ]
         for i in range(random.randint(0, len(dropkey))):
             field_names.remove(dropkey.pop())
-    ndf = df.loc[:, field_names]
+    if isinstance(df, StatementSlice):
+        rows = df.values(field_names)
+    else:
+        rows = df.loc[:, field_names].values.tolist()
     # 更名
     for fno in range(len(field_names)):
         if field_names[fno] in field_dict.keys():
@@ -226,16 +404,15 @@ def from_dataframe(df, max_cols=12, drop=True):
 
     if len(field_names) <= max_cols:
         table.add_row(field_names)
-        for row in ndf.values:
-            table.add_row(row.tolist())
+        for row in rows:
+            table.add_row(row)
         multi = False
     else:
         multi = True
         r = field_names
         table.add_row(r[:max_cols])
         table.add_row(r[max_cols:] + [" "] * (max_cols - len(r[max_cols:])))
-        for rno, row in enumerate(ndf.values, start=1):
-            r = row.tolist()
+        for r in rows:
             table.add_row(r[:max_cols])
             table.add_row(r[max_cols:] + [" "] * (max_cols - len(r[max_cols:])))
     return table, multi
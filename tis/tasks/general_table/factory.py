@@ -8,157 +8,201 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(os.path.dirname(BASE_DIR))
 
 sys.path.append(PROJECT_DIR)
+import copy
 import random
-import time
 from functools import partial
 from itertools import cycle
 from threading import Thread
 
 import cv2
-import numpy as np
 import yaml
 from tqdm import tqdm
 
 from awesometable.table2image import table2image
-from postprocessor import rand as _random
-from postprocessor.background import add_background_data
-from postprocessor.convert import processor
-from postprocessor.label import log_label, show_label
-from postprocessor.rand import (
-    random_background,
-    random_distortion,
-    random_fold,
-    random_noise,
-    random_perspective,
-    # random_pollution,
-    random_rotate,
-    random_seal,
-)
-from postprocessor.seal import add_seal, gen_seal
-from postprocessor.logo import get_logo_path
-from utils.ulpb import encode
-from .bank_data_generator import bank_detail_generator, bank_table_generator
+from postprocessor.background import flatten_on
+from postprocessor.convert import as_array
+from postprocessor.label import log_label
+from postprocessor.plan import AugmentPlanner, log_plan, stamp_operation
+from postprocessor.seal import SealLibrary
+from postprocessor.logo import bank_list, get_logo_path
+from .bank_data_generator import bank_engine, bank_table_generator
 from .bank_data_generator import banktable2image
 from .fakekeys import read_background
 from .uniform import UniForm
+from utils.pipeline import run_stages, unique_name
 
-from _appdir import STATIC_DIR, OUTPUT_DIR
+from _appdir import OUTPUT_DIR
+
+
+class TableWriter:
+    """只保存图片、标注和增强计划，流水线的保存阶段不必构造整个工厂"""
+
+    def __init__(self, output_dir, save_mid=False):
+        """
+        :param output_dir: 输出目录
+        :param save_mid: 是否保存了中间结果，此时最后一步的中间结果就是成品
+        """
+        self.output_dir = output_dir
+        self.save_mid = save_mid
+
+    def save(self, image_data, fname):
+        """
+        保存一个样本
+        :param image_data: dict 标注字典
+        :param fname: 文件名，不含后缀
+        :return: None
+        """
+        cv2.imwrite(
+            os.path.join(self.output_dir, "%s.jpg" % fname),
+            as_array(image_data["image"]),
+        )
+        log_label(
+            os.path.join(self.output_dir, "%s.txt" % fname),
+            "%s.jpg" % fname,
+            image_data,
+        )
+        log_plan(os.path.join(self.output_dir, "%s.plan.json" % fname), image_data)
+
+    def write(self, item):
+        """
+        保存图片和标注
+        :param item: postprocess 的输出
+        :return: str 文件名
+        """
+        fname, image_data = item
+        if not self.save_mid:
+            self.save(image_data, fname)
+        return fname
 
 
 class BackTableFactory(Thread):
     """工厂模式"""
 
-    def __init__(self, batch):
+    def __init__(self, batch, preload_seals=False):
+        """
+        :param batch: 数量
+        :param preload_seals: 是否启动时生成所有银行的印章，否则在第一次使用时生成
+        """
         super().__init__()
+        self._args = (batch, preload_seals)
         self.batch = batch
-        self.data_generator = bank_detail_generator  # >data
+        self.seals = SealLibrary()
+        if preload_seals:
+            self.seals.preload(bank_list)
+        self.data_generator = bank_engine  # >data 按批列式生成
         self.table_generator = bank_table_generator  # data > table
         self.image_compositor = banktable2image  # table > image
-        self.post_processor = [
-            {"func": random_seal, "ratio": 0.4},
-            # {"func": random_pollution, "ratio": 0},
-            {"func": random_fold, "ratio": 0.5},
-            {"func": random_noise, "ratio": 0.5},
-            {"func": random_distortion, "ratio": 1},
-            {"func": random_rotate, "ratio": 0.3},
-            {"func": random_perspective, "ratio": 0.3},
-            {"func": random_background, "ratio": 0.3},
-            {"func": show_label, "ratio": 1},
-        ]
-
-        with open("config/post_processor_config.yaml", "r", encoding="utf-8") as cfg:
-            self.post_processor_config = yaml.load(cfg, Loader=yaml.SafeLoader)
-        self.post_processor = []
-        for key, val in self.post_processor_config.items():
-            ratio = val.pop("ratio")
-            func = partial(getattr(_random, key), **val)
-            self.post_processor.append({"func": func, "ratio": ratio})
+        # 银行印章由印章库盖，不随机选印章文件
+        self.planner = AugmentPlanner(
+            "config/post_processor_config.yaml",
+            {"random_seal": stamp_operation(self.seals)},
+        )
 
         self.output_dir = os.path.join(OUTPUT_DIR, "bank_flow")
         os.makedirs(self.output_dir, exist_ok=True)
         self.save_mid = False
 
     def _save_and_log(self, image_data, fname):
-        cv2.imwrite(
-            os.path.join(self.output_dir, "%s.jpg" % fname), image_data["image"]
-        )
-        log_label(
-            os.path.join(self.output_dir, "%s.txt" % fname),
-            "%s.jpg" % fname,
-            image_data,
-        )
-
-    def run(self):
-        pbar = tqdm(total=self.batch)
-        pbar.set_description("Factory")
-        print("start")
-        sealdir = self.post_processor_config["random_seal"]["seal_dir"]
-        if not sealdir:
-            sealdir = os.path.join(STATIC_DIR, "seal")
-        for data in self.data_generator.create(iterations=self.batch):
-            bankname = data["银行"]
+        TableWriter(self.output_dir).save(image_data, fname)
+
+    def generate(self, count):
+        """
+        生成流水数据并排成表格
+        :param count: 数量
+        :return: yield tuple[str,PrettyTable,bool] 银行名、表格、是否多行
+        """
+        for data in self.data_generator.create(iterations=count):
             align = random.choice("lcr")
             table, multi = self.table_generator(data, align=align)
-            white_val = random.randint(230, 255)
-            image_data = self.image_compositor(
-                table,
-                bgcolor=(white_val, white_val, white_val),
-                line_pad=-2,
-                logo_path=get_logo_path(bankname),
-                watermark=False,
-                dot_line=random.choice((True, False)),
-                multiline=multi,
-            )
-
+            yield data["银行"], table, multi
+
+    def render(self, item):
+        """
+        表格渲染为图片
+        :param item: generate 的输出
+        :return: tuple[str,str,dict] 文件名、银行名、标注字典
+        """
+        bankname, table, multi = item
+        white_val = random.randint(230, 255)
+        image_data = self.image_compositor(
+            table,
+            bgcolor=(white_val, white_val, white_val),
+            line_pad=-2,
+            logo_path=get_logo_path(bankname),
+            watermark=False,
+            dot_line=random.choice((True, False)),
+            multiline=multi,
+        )
+        fname = unique_name()
+        if self.save_mid:
+            self._save_and_log(image_data, fname)
+        return fname, bankname, image_data
+
+    def postprocess(self, item):
+        """
+        按配置的概率依次后处理，银行印章不随机
+        :param item: render 的输出
+        :return: tuple[str,dict] 文件名、标注字典
+        """
+        fname, bankname, image_data = item
+        plan = self.planner.sample(random_seal={"name": bankname})
+        for fno, image_data in self.planner.run(image_data, plan):
             if self.save_mid:
-                fname = "0" + str(int(time.time() * 1000))[5:]
+                fname = str(fno) + fname[1:]
                 self._save_and_log(image_data, fname)
+        image_data["plan"] = plan
+
+        if plan.last != self.planner.last:
+            image_data = flatten_on((255, 255, 255))(image_data)
+        return fname, image_data
+
+    def write(self, item):
+        """
+        保存图片和标注
+        :param item: postprocess 的输出
+        :return: str 文件名
+        """
+        fname, image_data = item
+        if not self.save_mid:  # 否则最后一步的中间结果就是成品
+            self._save_and_log(image_data, fname)
+        return fname
 
-            seal_name = os.path.join(sealdir, encode(bankname) + ".png")
-            if not os.path.exists(seal_name):
-                seal = gen_seal(bankname + "南京市分行")
-                seal.save(seal_name)
-                # cv2.imwrite(seal_name, seal)
-
-            # 银行印章不随机
-            self.post_processor[0]["func"] = processor(
-                partial(add_seal, seal_p=seal_name)
-            )
-            func = None
-            for fno, proc in enumerate(self.post_processor, start=1):
-                if random.random() < proc["ratio"]:
-                    func = proc.get("func")
-                    image_data = func(image_data)  # 默认参数就是随机的
-                    if self.save_mid:
-                        fname = str(fno) + fname[1:]
-                        self._save_and_log(image_data, fname)
-
-            if not func is self.post_processor[-1]["func"]:
-                white = np.ones_like(image_data["image"]) * 255
-                image_data = add_background_data(image_data, white, 0)
-
-            if not self.save_mid:
-                fname = "0" + str(int(time.time() * 1000))[5:]
-                self._save_and_log(image_data, fname)
-                pbar.update(1)
+    def run(self):
+        pbar = tqdm(total=self.batch)
+        pbar.set_description("Factory")
+        for item in self.generate(self.batch):
+            self.write(self.postprocess(self.render(item)))
+            pbar.update(1)
         pbar.close()
 
+    def run_parallel(self, workers=None, queue_size=16):
+        """
+        多进程运行，生成、渲染、后处理、保存各自一个进程池
+        :param workers: 见 utils.pipeline.plan_workers
+        :param queue_size: 阶段之间的队列长度
+        :return: int 完成的数量
+        """
+        builder = partial(type(self), *self._args)
+        writer = partial(TableWriter, self.output_dir, self.save_mid)
+        return run_stages(
+            builder, self.batch, workers, queue_size, "Factory", {"write": writer}
+        )
+
 
 class GeneralTableFactory(Thread):
     """通用表格工厂"""
 
     def __init__(self, config, batch, use_faker=True):
         super().__init__()
-        with open(config, "r", encoding="utf-8") as cfg:
-            self.config = yaml.load(cfg, Loader=yaml.SafeLoader)
-        self.save_mid = self.config["base"].get("save_mid", False)
+        self._args = (config, batch, use_faker)
         self.batch = batch
 
         if isinstance(config, dict):
-            self.config = config
+            self.config = copy.deepcopy(config)  # 下面会 pop，不能改动调用者的配置
         elif isinstance(config, str):
             with open(config, "r", encoding="utf-8") as cfg:
                 self.config = yaml.load(cfg, Loader=yaml.SafeLoader)
+        self.save_mid = self.config["base"].get("save_mid", False)
 
         self.table_generator = UniForm(self.config, use_faker=use_faker)
         bg_dir = self.config["base"]["bg_dir"]
@@ -168,96 +212,118 @@ class GeneralTableFactory(Thread):
         else:
             self.background_generator = None
 
-        post_processor_config = self.config.get("post_processor", {})
-        self.post_processor = []
-        for key, val in post_processor_config.items():
-            ratio = val.pop("ratio")
-            func = partial(getattr(_random, key), **val)
-            self.post_processor.append({"func": func, "ratio": ratio})
+        self.planner = AugmentPlanner(self.config.get("post_processor", {}))
 
         self._type = self.config["base"]["type"]
+        self.output_dir = os.path.join(OUTPUT_DIR, "normal")
+        os.makedirs(self.output_dir, exist_ok=True)
 
-    def run(self):
-        pbar = tqdm(total=self.batch)
-        pbar.set_description("Threading %s" % self._type)
-        output_dir = os.path.join(OUTPUT_DIR, "normal")
-        if not os.path.exists(output_dir):
-            os.mkdir(output_dir)
-
-        for tab in self.table_generator.create(self.batch):
+    def generate(self, count):
+        """
+        生成表格，并按顺序取背景
+        :param count: 数量
+        :return: yield tuple 表格、背景路径、背景中表格区域
+        """
+        for tab in self.table_generator.create(count):
             if self.background_generator is None:
-                background = None
-                bg_box = None
+                yield tab, None, None
             else:
-                background, bg_box = self.background_generator.__next__()
-
-            fname = "0" + str(int(time.time() * 1000))[5:]
-            image_data = table2image(
-                tab,
-                xy=(0, 0),
-                font_size=20,
-                line_pad=0,
-                bg_box=bg_box,
-                background=background,
-            )
+                background, bg_box = next(self.background_generator)
+                yield tab, background, bg_box
+
+    def render(self, item):
+        """
+        表格渲染为图片
+        :param item: generate 的输出
+        :return: tuple[str,dict,str] 文件名、标注字典、背景
+        """
+        tab, background, bg_box = item
+        image_data = table2image(
+            tab,
+            xy=(0, 0),
+            font_size=20,
+            line_pad=0,
+            bg_box=bg_box,
+            background=background,
+        )
+        fname = unique_name()
+        if self.save_mid:
+            self._save_and_log(image_data, fname)
+        return fname, image_data, background
+
+    def postprocess(self, item):
+        """
+        按配置的概率依次后处理
+        :param item: render 的输出
+        :return: tuple[str,dict] 文件名、标注字典
+        """
+        fname, image_data, background = item
+        if self.planner:
+            plan = self.planner.sample()
+            for fno, image_data in self.planner.run(image_data, plan):
+                if self.save_mid:
+                    fname = str(fno) + fname[1:]
+                    self._save_and_log(image_data, fname)
+            image_data["plan"] = plan
+            # 如果最后没有使用到 背景，就无偏的增加白底
+            if plan.last != self.planner.last or background is None:
+                image_data = flatten_on((255, 255, 255))(image_data)
+        return fname, image_data
+
+    def write(self, item):
+        """
+        保存图片和标注
+        :param item: postprocess 的输出
+        :return: str 文件名
+        """
+        fname, image_data = item
+        if not self.save_mid:
+            self._save_and_log(image_data, fname)
+        return fname
 
-            if self.save_mid:
-                cv2.imwrite(
-                    os.path.join(output_dir, "%s.jpg" % fname), image_data["image"]
-                )
-                log_label(
-                    os.path.join(output_dir, "%s.txt" % fname),
-                    "%s.jpg" % fname,
-                    image_data,
-                )
-            func = None
-            if self.post_processor:
-                for fno, proc in enumerate(self.post_processor, start=1):
-                    if random.random() < proc["ratio"]:
-                        func = proc.get("func")
-                        image_data = func(image_data)  # 默认参数就是随机的
-                        if self.save_mid:
-                            fname = str(fno) + fname[1:]
-                            cv2.imwrite(
-                                os.path.join(output_dir, "%s.jpg" % fname),
-                                image_data["image"],
-                            )
-                            log_label(
-                                os.path.join(output_dir, "%s.txt" % fname),
-                                "%s.jpg" % fname,
-                                image_data,
-                            )
-                # 如果最后没有使用到 背景，就无偏的增加白底
-                if not func is self.post_processor[-1]["func"] or background is None:
-                    white = np.ones_like(image_data["image"]) * 255
-                    image_data = add_background_data(image_data, white, 0)
-
-            if not self.save_mid:
-                cv2.imwrite(
-                    os.path.join(output_dir, "%s.jpg" % fname), image_data["image"]
-                )
-                log_label(
-                    os.path.join(output_dir, "%s.txt" % fname),
-                    "%s.jpg" % fname,
-                    image_data,
-                )
+    def _save_and_log(self, image_data, fname):
+        TableWriter(self.output_dir).save(image_data, fname)
+
+    def run(self):
+        pbar = tqdm(total=self.batch)
+        pbar.set_description("Threading %s" % self._type)
+        for item in self.generate(self.batch):
+            self.write(self.postprocess(self.render(item)))
             pbar.update(1)
         pbar.close()
 
+    def run_parallel(self, workers=None, queue_size=16):
+        """
+        多进程运行，生成、渲染、后处理、保存各自一个进程池
+        :param workers: 见 utils.pipeline.plan_workers
+        :param queue_size: 阶段之间的队列长度
+        :return: int 完成的数量
+        """
+        builder = partial(type(self), *self._args)
+        writer = partial(TableWriter, self.output_dir, self.save_mid)
+        desc = "Pipeline %s" % self._type
+        return run_stages(
+            builder, self.batch, workers, queue_size, desc, {"write": writer}
+        )
+
 
 def main(argv):
     """
-    :param argv: mode 'bank' or other config
+    :param argv: mode 'bank' or other config, batch, [workers]
     :return: None
     """
     mode = argv[1]
     batch = int(argv[2])
+    workers = int(argv[3]) if len(argv) > 3 else 0
     if mode == "bank":
         factory = BackTableFactory(batch)
     else:
         config = "config/%s.yaml" % mode
         factory = GeneralTableFactory(config=config, batch=batch, use_faker=True)
-    factory.start()
+    if workers:
+        factory.run_parallel(workers)
+    else:
+        factory.start()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 """银行卡设计模块"""
+import functools
 import io
 import sys
 
@@ -14,7 +15,10 @@ from PIL import Image, ImageDraw, ImageFont
 from pyrect import Rect
 
 from postprocessor.convert import as_image
+from postprocessor.label import Labels
 from postprocessor.logo import bank_list, get_logo_path
+from tis.utils.assets import LocalAssetProvider
+from tis.utils.geometry import GridIndex, box_of, overlap
 
 headers = """\
 accept: application/json, text/javascript, */*; q=0.01
@@ -71,9 +75,14 @@ def diskcache(cache_dir=None, ext=""):
     return wrapper
 
 
+_image_assets = {}
+
+
 def open_image(url, cache_dir=None, headers=None):
     """
     使用磁盘缓存的方式读取网络图片
+    缓存目录在首次使用时建立索引，找不到时重新扫描，读过的图片常驻内存
+    多个进程共用缓存目录，先写临时文件再改名，其他进程不会读到半张图
     :param url: 网络url
     :param cache_dir: 磁盘缓存路径
     :return: Image
@@ -83,13 +92,22 @@ def open_image(url, cache_dir=None, headers=None):
     if not os.path.exists(cache_dir):
         os.mkdir(cache_dir)
 
-    path = os.path.join(cache_dir, url.rsplit("/", 1)[1])
-    try:
-        img = Image.open(path)
-    except FileNotFoundError:
+    assets = _image_assets.get(cache_dir)
+    if assets is None:
+        assets = LocalAssetProvider(cache_dir, preload=False)
+        _image_assets[cache_dir] = assets
+
+    name = url.rsplit("/", 1)[1]
+    img = assets.find(name)
+    if img is None:
         response = requests.get(url, headers=headers)
         img = Image.open(io.BytesIO(response.content))
-        img.save(path)
+        path = os.path.join(cache_dir, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        img.save(tmp, format=img.format)
+        os.replace(tmp, path)
+        assets.add(path, img)
+        img = img.copy()
     return img
 
 
@@ -147,21 +165,29 @@ def download_all_region():
 
 def collide_any(rect, others):
     """
-    矩形碰撞判断
+    矩形碰撞判断，重叠或包含都算碰撞
     :param rect: Rect
-    :param others: List[Rect]
+    :param others: GridIndex|List[Rect]
     :return: bool
     """
-    for other in others:
-        if rect.collide(other) or other.collide(rect) or rect in other or other in rect:
-            return True
-    return False
+    if isinstance(others, GridIndex):
+        return others.collide(box_of(rect))
+    return any(overlap(box_of(rect), box_of(other)) for other in others)
 
 
 def _(text):
     return "_".join(text.lower().split())
 
 
+@functools.lru_cache(maxsize=None)
+def _emboss_sprite(style="gold"):
+    """卡号压印字模，只读一次"""
+    path = os.path.join(default_cachedir, f"image/emboss-{style}-20191125232130200.png")
+    with Image.open(path) as image:
+        image.load()
+        return image.copy()
+
+
 class BadTemplateError(Exception):
     pass
 
@@ -177,8 +203,8 @@ class BankCardDesigner:
             self._json = json.load(open(config))
         else:
             self._json = config
-        self._rects = []
-        self._back_rects = []
+        self._rects = GridIndex()
+        self._back_rects = GridIndex()
         self.elements = {}
         self.back_elements = {}
         self.points = []
@@ -188,10 +214,18 @@ class BankCardDesigner:
         self._name = None
         self._legend = ""
         self._logo_name = ""
+        self.number_digits = None  # 切好的卡号数字
 
     @classmethod
     def random_template(cls):
-        """随机选择一个地区的模板，初始化实例"""
+        """从预编译的模板包中随机取一个模板，不读文件也不重试"""
+        from .bundle import load_bundle  # pylint: disable=import-outside-toplevel
+
+        return load_bundle().sample()
+
+    @classmethod
+    def random_template_online(cls):
+        """随机选择一个地区的模板，初始化实例，素材从缓存或网络读取"""
         products = get_region(random.choice(REGIONS))
         hor = [one for one in products if one["format"] == "Physical Horizontal"]
         product = random.choice(hor)
@@ -279,7 +313,9 @@ class BankCardDesigner:
         else:
             face = self.elements
         if w > h:
-            number_image = self.gen_card_number_image(number, img)
+            if self.number_digits is None:
+                self.number_digits = self.slice_card_number(img)
+            number_image = self.paste_card_number(number, self.number_digits)
             face["account_number"] = number_image, pos, (w, h)
             # self.set_attr("account_number", number_image)
         else:
@@ -360,7 +396,7 @@ class BankCardDesigner:
 
     def get_data(self, face):
         """转为通用格式"""
-        points = []
+        boxes = []
         labels = []
         if face == "back":
             elements = self.back_elements
@@ -370,10 +406,7 @@ class BankCardDesigner:
             image = cv2.cvtColor(np.asarray(self.front, np.uint8), cv2.COLOR_RGBA2BGRA)
         for key, value in elements.items():
             _, (x, y), (w, h) = value
-            points.append([x, y])
-            points.append([x + w, y])
-            points.append([x + w, y + h])
-            points.append([x, y + h])
+            boxes.append((x, y, x + w, y + h))
             if key == "account_number":
                 label = "account_number@" + self._card_number
             elif key == "cardholder_name":
@@ -387,24 +420,19 @@ class BankCardDesigner:
             else:
                 label = key + "@"
             labels.append(label)
-        back_data = {
-            "image": image,
-            "points": points,
-            "label": labels,
-        }
-        return back_data
+        return Labels.from_boxes(boxes, labels).attach({"image": image})
 
     def show(self):
         self.front.show()
         self.back.show()
 
     def init_elements(self):
-        self._rects = []
-        self._back_rects = []
+        self._rects = GridIndex()
+        self._back_rects = GridIndex()
         for i in self._json:
             self.set_element(i)
-        self._rects = []
-        self._back_rects = []
+        self._rects = GridIndex()
+        self._back_rects = GridIndex()
 
     def set_attr(self, key, value):
         """
@@ -429,23 +457,17 @@ class BankCardDesigner:
         w = int(self.scale * w)
         h = int(self.scale * h)
         rect = Rect(x, y, w, h)
+        index = self._rects if face == "front" else self._back_rects
+        if collide_any(rect, index):  # 碰撞重试，先判断碰撞再读图
+            self.set_element(element)
+            return
+        index.insert(box_of(rect))
         image = open_image(image_url, headers=headers).convert("RGBA")
         image = image.resize((w, h))
-        # 如果没碰撞
         if face == "front":
-            if not collide_any(rect, self._rects):
-                self._rects.append(rect)
-                self.elements[_(element["name"])] = image, (x, y), (w, h)
-
-            else:
-                self.set_element(element)
+            self.elements[_(element["name"])] = image, (x, y), (w, h)
         else:
-            if not collide_any(rect, self._back_rects):
-                self._back_rects.append(rect)
-                self.back_elements[_(element["name"])] = image, (x, y), (w, h)
-            else:
-                # 碰撞重试 Todo:可以优化以免碰撞很多次
-                self.set_element(element)
+            self.back_elements[_(element["name"])] = image, (x, y), (w, h)
 
     @staticmethod
     def parse_element(element, color=None):
@@ -517,43 +539,29 @@ class BankCardDesigner:
         return rect, face
 
     @staticmethod
-    def gen_card_number_image(number, image=None, style="gold"):
+    def slice_card_number(image=None, style="gold"):
         """
-        生成银行卡号图片
-        :param number: str 银行卡号字符串,16位,每4位一个空格
+        把卡号压印图片切成单个数字
+        :param image: 卡号元素的图片，None 时用压印字模
         :param style: 'gold' or 'silver'
-        :return:
+        :return: tuple (数字到切片的映射, 切片高度, 下半部分, 画布尺寸, 输出尺寸)
         """
-
+        sprite = _emboss_sprite(style)
+        size = sprite.size
+        hid = size[1]
+        bottom_half = None
         if image is None:
-            image = Image.open(
-                os.path.join(
-                    default_cachedir, f"image/emboss-{style}-20191125232130200.png"
-                )
-            )
+            image = sprite
             oldsize = image.size
         else:
-            size = Image.open(
-                os.path.join(
-                    default_cachedir, f"image/emboss-{style}-20191125232130200.png"
-                )
-            ).size
-
-            hid = size[1]
             oldsize = image.size
             # 缩放到size[0],以宽为标准缩放
             image = image.resize((size[0], int(oldsize[1] * (size[0] / oldsize[0]))))
-            # print(image.size)
-            # print(image.height, size[1])
-            if image.height <= size[1]:  # 比例相同
-                bottom_half = None
-            else:
+            if image.height > size[1]:
                 bottom_half = image.crop((0, hid) + (size[0], image.height))
         nums = "4000 1234 5678 9010"
         pieces = []
         wid = 47
-        # hid = image.height
-        # print(wid)
         for i in range(0, image.width, wid):
             p = image.crop((i, 0) + (i + wid, hid))
             pieces.append(p)
@@ -561,10 +569,32 @@ class BankCardDesigner:
         for num, p in zip(nums, pieces):
             if num not in font_map:
                 font_map[num] = p
+        return font_map, hid, bottom_half, image.size, oldsize
 
-        out = Image.new("RGBA", image.size)
-        for n, i in zip(number, range(0, image.width, wid)):
+    @staticmethod
+    def paste_card_number(number, digits):
+        """
+        用切好的数字拼出卡号图片
+        :param number: str 银行卡号字符串
+        :param digits: slice_card_number 的结果
+        :return: Image
+        """
+        font_map, hid, bottom_half, size, oldsize = digits
+        wid = 47
+        out = Image.new("RGBA", size)
+        for n, i in zip(number, range(0, size[0], wid)):
             out.paste(font_map[n], (i, 0) + (i + wid, hid), mask=font_map[n])
         if bottom_half:
             out.paste(bottom_half, (0, hid))
         return out.resize(oldsize)
+
+    @staticmethod
+    def gen_card_number_image(number, image=None, style="gold"):
+        """
+        生成银行卡号图片
+        :param number: str 银行卡号字符串,16位,每4位一个空格
+        :param style: 'gold' or 'silver'
+        :return:
+        """
+        digits = BankCardDesigner.slice_card_number(image, style)
+        return BankCardDesigner.paste_card_number(number, digits)
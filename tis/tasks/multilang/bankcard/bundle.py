@@ -0,0 +1,263 @@
+"""
+银行卡模板包
+build_bundle 把磁盘缓存中的所有卡面设计一次性编译成一个带索引的模板包：
+解码好的卡面图、解析好的元素几何、按尺寸缩放好的元素图片、切好的卡号数字和有效标记。
+采样只在内存中随机选取有效的设计，不再读文件，也不会因为模板不合格而重试。
+命令：python -m tasks.multilang.bankcard.bundle [-o bundle.pkl]
+"""
+import argparse
+import logging
+import os
+import pickle
+import random
+import tempfile
+
+import requests
+
+from tis.utils.geometry import GridIndex
+
+from .bankcard_designer import (
+    REGIONS,
+    BankCardDesigner,
+    _,
+    default_cachedir,
+    get_background,
+    get_elements,
+    get_region,
+    headers,
+    open_image,
+)
+
+default_bundle = os.path.join(default_cachedir, "bundle.pkl")
+NUMBER = "account_number"
+
+logger = logging.getLogger(__name__)
+
+
+def _scale(rect):
+    scale = BankCardDesigner.scale
+    return tuple(int(scale * v) for v in rect)
+
+
+def _box(rect):
+    """(x, y, w, h) 转为 (left, top, right, bottom)"""
+    x, y, w, h = rect
+    return x, y, x + w, y + h
+
+
+def _positions(node):
+    """节点所有可选的位置 [(rect, face)]"""
+    return [
+        (_scale((int(s["x"]), int(s["y"]), int(s["w"]), int(s["h"]))), pos["card"])
+        for pos in node["position"]
+        for s in pos["style"]
+    ]
+
+
+def _color_urls(node):
+    """与 BankCardDesigner._choose_color 相同，优先银色和金色"""
+    urls = [
+        clr["image"]
+        for clr in node["color"]
+        if clr["name"].lower() in ("silver", "gold")
+    ]
+    return urls or [clr["image"] for clr in node["color"]]
+
+
+def element_options(element):
+    """
+    元素所有可能的取值，与 BankCardDesigner.parse_element 随机得到的取值范围相同
+    :param element: 元素 json
+    :return: list[tuple] [(image_url, (x, y, w, h), face)]，坐标已缩放
+    """
+    props = element["props"]
+    urls = [element["image"]]
+    rects = [(_scale((-100, -100, 10, 10)), "front")]
+    if props["color"]:
+        urls = _color_urls(props)
+    if props["position"]:
+        rects = _positions(props)
+    if props["pin"]:
+        urls = []
+        for pin in props["pin"]:
+            if pin["color"]:
+                urls.extend(color["image"] for color in pin["color"])
+            else:
+                urls.append(pin["image"])
+    if props["shape"]:
+        urls = [shape["image"] for shape in props["shape"]]
+    if props.get("process", []):
+        options = []
+        for process in props["process"]:
+            process_urls = _color_urls(process) if process["color"] else []
+            process_urls = process_urls or [process["image"]]
+            process_rects = _positions(process) if process["position"] else rects
+            options.extend(
+                (url, rect, face)
+                for url in process_urls
+                for rect, face in process_rects
+            )
+        return options
+    return [(url, rect, face) for url in urls for rect, face in rects]
+
+
+class CardDesign:
+    """编译好的一个卡面设计"""
+
+    __slots__ = ("key", "arts", "elements", "valid")
+
+    def __init__(self, key, arts, elements, valid):
+        """
+        :param key: (formatId, productId)
+        :param arts: list[Image] 卡面图
+        :param elements: list[tuple[str, list]] 元素名和所有可选取值，卡号排在最前
+        :param valid: bool 是否能生成合格的银行卡
+        """
+        self.key = key
+        self.arts = arts
+        self.elements = elements
+        self.valid = valid
+
+
+class CardBundle:
+    """银行卡模板包"""
+
+    def __init__(self, designs, images, digits):
+        """
+        :param designs: list[CardDesign]
+        :param images: dict[(url, w, h), Image] 缩放好的元素图片
+        :param digits: dict[(url, w, h), tuple] 卡号元素切好的数字
+        """
+        self.designs = designs
+        self.images = images
+        self.digits = digits
+        self.valid = [design for design in designs if design.valid]
+
+    def __len__(self):
+        return len(self.valid)
+
+    def sample(self):
+        """
+        随机生成一个模板，只挑选有效的设计
+        :return: BankCardDesigner
+        """
+        if not self.valid:
+            raise ValueError("模板包中没有有效的银行卡设计")
+        design = random.choice(self.valid)
+        card = BankCardDesigner(random.choice(design.arts).copy(), config=[])
+        placed = {"front": GridIndex(), "back": GridIndex()}
+        for name, options in design.elements:
+            # 只在不碰撞的取值中选择，代替碰撞后重试
+            free = [o for o in options if not placed[o[2]].collide(_box(o[1]))]
+            if not free:
+                continue
+            url, (x, y, w, h), face = random.choice(free)
+            placed[face].insert(_box((x, y, w, h)))
+            elements = card.elements if face == "front" else card.back_elements
+            elements[name] = self.images[(url, w, h)].copy(), (x, y), (w, h)
+            if name == NUMBER:
+                card.number_digits = self.digits[(url, w, h)]
+        return card
+
+    def save(self, path=default_bundle):
+        """先写临时文件再替换，并行的进程不会读到写了一半的模板包"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(self, file)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @staticmethod
+    def load(path=default_bundle):
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+
+def _compile_design(product, images, digits):
+    """编译一个设计，素材缺失或不合格时标记为无效"""
+    key = product["formatId"], product["productId"]
+    try:
+        backgrounds = get_background(product["formatId"])["image"]
+        arts = [
+            open_image(bg["imageFront"], headers=headers).convert("RGBA")
+            for bg in backgrounds
+        ]
+        arts = [art for art in arts if art.size == BankCardDesigner.size]
+        elements = []
+        for element in get_elements(*key):
+            name = _(element["name"])
+            options = []
+            for url, (x, y, w, h), face in element_options(element):
+                if name == NUMBER and w <= h:  # 去掉非长条形的数字
+                    continue
+                if (url, w, h) not in images:
+                    image = open_image(url, headers=headers).convert("RGBA")
+                    images[(url, w, h)] = image.resize((w, h))
+                if name == NUMBER and (url, w, h) not in digits:
+                    digits[(url, w, h)] = BankCardDesigner.slice_card_number(
+                        images[(url, w, h)]
+                    )
+                options.append((url, (x, y, w, h), face))
+            if options:
+                elements.append((name, options))
+    except (OSError, KeyError, ValueError, requests.RequestException) as e:
+        logger.warning("skip card design %s: %s", key, e)
+        return CardDesign(key, [], [], False)
+    # 卡号最先放置，保证不会因为碰撞而缺失
+    elements.sort(key=lambda item: item[0] != NUMBER)
+    valid = bool(arts) and any(name == NUMBER for name, _o in elements)
+    return CardDesign(key, arts, elements, valid)
+
+
+def build_bundle(path=default_bundle):
+    """
+    编译所有地区的横版卡面设计并保存
+    :param path: 模板包路径，None 时不保存
+    :return: CardBundle
+    """
+    designs = []
+    images = {}
+    digits = {}
+    seen = set()
+    for region in REGIONS:
+        for product in get_region(region):
+            key = product["formatId"], product["productId"]
+            if product["format"] != "Physical Horizontal" or key in seen:
+                continue
+            seen.add(key)
+            designs.append(_compile_design(product, images, digits))
+    bundle = CardBundle(designs, images, digits)
+    if path:
+        bundle.save(path)
+    return bundle
+
+
+_bundles = {}
+
+
+def load_bundle(path=default_bundle):
+    """
+    读取模板包，不存在时先编译，读过的模板包常驻内存
+    :param path: 模板包路径
+    :return: CardBundle
+    """
+    bundle = _bundles.get(path)
+    if bundle is None:
+        if os.path.exists(path):
+            bundle = CardBundle.load(path)
+        else:
+            bundle = build_bundle(path)
+        _bundles[path] = bundle
+    return bundle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="编译银行卡模板包")
+    parser.add_argument("-o", "--output", default=default_bundle, help="模板包路径")
+    args = parser.parse_args()
+    result = build_bundle(args.output)
+    print(f"{len(result)}/{len(result.designs)} valid designs -> {args.output}")
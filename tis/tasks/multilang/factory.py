@@ -26,14 +26,18 @@ PROJECT_DIR = os.path.dirname(os.path.dirname(BASE_DIR))
 
 sys.path.append(PROJECT_DIR)
 # pylint: disable=wrong-import-position ungrouped-imports
-from tasks.multilang.bankcard import BadTemplateError, BankCardDesigner
+from tasks.multilang.bankcard import BankCardDesigner
 from tasks.multilang.filters import iglob
 
 from tasks.general_table.bank_data_generator import (
     bank_detail_generator,
     bank_table_generator,
 )
-from tasks.multilang.formtemplate import FormTemplate, nolinetable2template
+from tasks.multilang.formtemplate import (
+    FormTemplate,
+    nolinetable2template,
+    table_layout,
+)
 from tasks.multilang.htmltemplate import IDCardTemplate, PassportTemplate
 from tasks.multilang.template import Template, Text
 from tasks.multilang.unilayout import UniForm
@@ -64,12 +68,8 @@ class BankCardGenerator(BaseGenerator):
     """
 
     def load_template(self, **kwargs):
-        temp = BankCardDesigner.random_template()
-        try:
-            temp.set_card_number()  # 去掉非长条形的数字
-        except BadTemplateError:
-            return self.load_template(**kwargs)
-        return temp
+        # 模板包中只有卡号为长条形的有效设计，无需重试
+        return BankCardDesigner.random_template()
 
     def render_template(self, template, engine):
         template.add_round_corner()
@@ -93,6 +93,8 @@ class TemplateGenerator(BaseGenerator):
     """
 
     templates_basedir = os.path.join(STATIC_DIR, "templates")
+    # 后处理是否要用模板原图重新合成文字，需要时渲染结果才附带原图副本
+    needs_background = False
 
     def __init__(self, name):
         super().__init__(name)
@@ -114,7 +116,7 @@ class TemplateGenerator(BaseGenerator):
         :return:
         """
         template.replace_text(engine=engine)
-        image_data = template.render_image_data()
+        image_data = template.render_image_data(background=self.needs_background)
         image_data["template"] = template
         return image_data
 
@@ -130,6 +132,8 @@ class TemplateGenerator(BaseGenerator):
 class IDCardGenerator(TemplateGenerator):
     """身份证生成器"""
 
+    needs_background = True
+
     def load_template(self, **kwargs):
         """
         身份证模板的加载与语言有关
@@ -355,6 +359,8 @@ class MenuGenerator(TemplateGenerator):
 class CouponGenerator(TemplateGenerator):
     """优惠券生成器"""
 
+    needs_background = True
+
     def postprocess(self, image_data, **kwargs):
         text_layer = image_data["text_layer"]
         paper = random_source(DISPLACE_PAPER)
@@ -398,15 +404,40 @@ class FormGenerator(TemplateGenerator):
     """表格生成器"""
 
     colors = [c for c in ImageColor.colormap if c != "black"]
+    needs_background = True
+    # 版面池大小，默认 0 每次解析新表格。大于 0 时池满之后随机复用版面，只重画样式和文字，
+    # 更快但整个运行只有这么多种表格结构，可在配置文件里用 layout_pool 打开
+    layout_pool = 0
 
     def __init__(self, name):
         super().__init__(name)
+        self._layouts = []
         if name != "noline":
             self.config_file = os.path.join(self.templates_dir, "config.yaml")
             self.table_generator = UniForm(self.config_file)
+            config = self.table_generator.config
+            self.layout_pool = config.get("layout_pool", self.layout_pool)
+
+    def pooled_layout(self, iteration=1, font_size=20, line_height=None):
+        """
+        取一个表格版面，没有打开版面池时每次都是新表格
+        :param iteration: 生成新表格时的参数
+        :param font_size: 新版面的字号
+        :param line_height: 新版面的行高
+        :return: tuple[TableLayout, int] 版面和它的字号
+        """
+        if self.layout_pool and len(self._layouts) >= self.layout_pool:
+            return random.choice(self._layouts)
+        table = next(self.table_generator.create(iteration))
+        layout = table_layout(table, font_size, line_height=line_height)
+        if self.layout_pool:
+            self._layouts.append((layout, font_size))
+        return layout, font_size
 
     def load_template(self, **kwargs):
-        table = next(self.table_generator.create())
+        font_size = random.choice([20, 24, 28, 32])
+        line_height = font_size + random.randint(-2, 5)
+        layout, font_size = self.pooled_layout(1, font_size, line_height)
         # 背景景随机有名色，前景颜色加深
         bg_color = ImageColor.getrgb(random.choice(self.colors))
         fg_color = bg_color[0] // 10, bg_color[1] // 10, bg_color[2] // 10
@@ -414,17 +445,17 @@ class FormGenerator(TemplateGenerator):
         vrules = random.choice(["ALL"])
         hrules = random.choice(["ALL", "-"])
         line_width = random.randint(1, 3)
-        template = FormTemplate.from_table(
-            table,
+        template = FormTemplate.from_layout(
+            layout,
             xy=(random.randint(50, 80), random.randint(50, 80)),
-            font_size=random.choice([20, 24, 28, 32]),
-            line_pad=random.randint(-2, 5),
+            font_size=font_size,
             line_width=line_width,
             bgcolor=bg_color,
             fgcolor=fg_color,
             vrules=vrules,
             hrules=hrules,
             border=border,
+            cache=False,
         )
         for text in template.texts:
             text.color = fg_color
@@ -485,8 +516,10 @@ class ExpressGenerator(FormGenerator):
     配置文件在 ./templates/express/config.yaml
     """
 
+    needs_background = False
+
     def load_template(self, **kwargs):
-        table = next(self.table_generator.create(10))
+        layout, _ = self.pooled_layout(10)
         # 背景景随机有名色，前景颜色加深
         white = random.randint(230, 255)
         black = random.randint(0, 30)
@@ -498,8 +531,8 @@ class ExpressGenerator(FormGenerator):
         cell_color = random.choice(self.colors)
         out_color = ImageColor.getrgb(random.choice(self.colors))
         title_color = tuple(255 - o for o in out_color)
-        template = FormTemplate.from_table(
-            table,
+        template = FormTemplate.from_layout(
+            layout,
             xy=(100, 120),
             bgcolor=bg_color,
             fgcolor=fg_color,
@@ -508,6 +541,7 @@ class ExpressGenerator(FormGenerator):
             hrules=hrules,
             outcolor=out_color,
             cellcolor=cell_color,
+            cache=False,
         )
         for text in template.texts:
             if text.text == "<TITLE>":
@@ -593,9 +627,9 @@ class ReceiptGenerator(FormGenerator):
     """
 
     def load_template(self, **kwargs):
-        table = next(self.table_generator.create(100))
-        template = FormTemplate.from_table(
-            table, xy=(40, 80), vrules=None, hrules="dot"
+        layout, _ = self.pooled_layout(100)
+        template = FormTemplate.from_layout(
+            layout, xy=(40, 80), vrules=None, hrules="dot"
         )
         return template
 
@@ -1,6 +1,7 @@
 """表格轉換成模板"""
 import random
 import re
+from collections import OrderedDict
 
 import cv2
 import numpy as np
@@ -14,8 +15,10 @@ from awesometable.awesometable import (
     count_padding,
     replace_chinese_to_dunder,
 )
+from awesometable.imagedata import load_font, textbbox
 from .template import Template, Text
 from postprocessor.convert import p2c
+from tis.utils.bytecache import ByteLRU
 
 
 class FormTemplate(Template):
@@ -26,9 +29,14 @@ class FormTemplate(Template):
         """从表格字符串生成模板"""
         return table2template(table, **kwargs)
 
+    @classmethod
+    def from_layout(cls, layout, **kwargs):
+        """从解析好的版面生成模板"""
+        return layout2template(layout, **kwargs)
+
     def replace_text(self, engine, translator=None):
         font = engine.font("n")
-        tempfont = ImageFont.truetype(font, self.texts[0].rect.height)
+        tempfont = load_font(font, self.texts[0].rect.height)
         title_count = 0
         for text in self.texts:
             if text.text == "<TITLE>":
@@ -42,76 +50,81 @@ class FormTemplate(Template):
                 text.text = tmp.title() if random.random() < 0.4 else tmp
             text.font = font
 
-    def render_image_data(self):
-        data = super().render_image_data()
+    def render_image_data(self, background=False):
+        data = super().render_image_data(background)
         data["image"] = p2c(data["image"])
         return data
 
 
-def table2template(
-    table,
-    xy=None,
-    font_size=20,
-    bgcolor="white",
-    background=None,
-    bg_box=None,
-    font_path="simfang.ttf",
-    line_pad=0,
-    line_height=None,
-    line_width=2,
-    vrules="ALL",
-    hrules="ALL",
-    keep_ratio=False,
-    debug=False,
-    fgcolor="black",
-    border=True,
-    outcolor="blue",
-    cellcolor="orange",
-):
-    """
-    将PrettyTable 字符串对象化为模板
-    """
+LAYOUT_CACHE_SIZE = 256
+BACKGROUND_CACHE_BYTES = 64 * 2**20  # 画好线的背景缓存的字节数上限
+_layouts = OrderedDict()
+_backgrounds = ByteLRU(BACKGROUND_CACHE_BYTES)
 
-    assert font_size % 4 == 0
-    lines = str(table).splitlines()
-    char_width = font_size // 2
-    half_char_width = char_width // 2
-    if not xy:
-        x, y = 0, 0
-    else:
-        x, y = xy
-    w = (len(lines[0]) + 1) * char_width + x * 2  # 图片宽度
-    if line_height is None:
-        line_height = font_size + line_pad
 
-    h = (len(lines)) * line_height + y * 2  # 图片高度
+class TableLayout:
+    """表格字符串解析得到的版面，只与表格字符串和字号行高有关，与颜色线型无关"""
 
-    if background is not None and bg_box:
-        x1, y1, x2, y2 = bg_box
-        w0, h0 = x2 - x1, y2 - y1
-        if isinstance(background, str):
-            background = Image.open(background)
-        elif isinstance(background, np.ndarray):
-            background = Image.fromarray(cv2.cvtColor(background, cv2.COLOR_BGR2RGB))
-        wb, hb = background.size
-        if not keep_ratio:
-            wn, hn = int(wb * w / w0), int(hb * h / h0)
-            background = background.resize((wn, hn))
-            x0, y0 = int(x1 * w / w0), int(y1 * h / h0)
-        else:
-            wn, hn = int(wb * w / w0), int(hb * w / w0)  # 宽度自适应，高度保持比例
-            background = background.resize((wn, hn))
-            x0, y0 = int(x1 * w / w0), int(y1 * w / w0)
+    __slots__ = ("size", "texts", "cells", "titles")
+
+    def __init__(self, size, texts, cells, titles):
+        """
+        :param size: 偏移为 (0,0) 时的图片尺寸
+        :param texts: list[tuple[str, tuple]] 文字和 (left, top, width, height)
+        :param cells: list[box] 单元格外框，已去重
+        :param titles: set[box] 标题单元格
+        """
+        self.size = size
+        self.texts = texts
+        self.cells = cells
+        self.titles = titles
+
+
+def table_layout(table, font_size=20, font_path="simfang.ttf", line_height=None):
+    """
+    解析表格版面，按表格字符串、字体、字号和行高缓存
+    :param table: 表格或表格字符串
+    :param font_size: 字号
+    :param font_path: 字体
+    :param line_height: 行高
+    :return: TableLayout
+    """
+    if line_height is None:
+        line_height = font_size
+    string = str(table)
+    key = string, font_size, font_path, line_height
+    layout = _layouts.get(key)
+    if layout is None:
+        lines = string.splitlines()
+        char_width = font_size // 2
+        layout = parse_table(
+            lines, char_width, char_width, font_size, font_path, line_height
+        )
+        _layouts[key] = layout
+        if len(_layouts) > LAYOUT_CACHE_SIZE:
+            _layouts.popitem(last=False)
     else:
-        background = Image.new("RGB", (w, h), bgcolor)
-        x0, y0 = x + char_width, y + char_width
+        _layouts.move_to_end(key)
+    return layout
 
-    draw = ImageDraw.Draw(background)
-    font = ImageFont.truetype(font_path, font_size)
 
-    cell_boxes = set()  # 多行文字的外框是同一个，需要去重
+def parse_table(lines, x0, y0, font_size, font_path, line_height):
+    """
+    把表格字符串解析成文字框和单元格
+    :param lines: 表格的行
+    :param x0: 第一列的左边
+    :param y0: 第一行的中线
+    :param font_size: 字号
+    :param font_path: 字体
+    :param line_height: 行高
+    :return: TableLayout
+    """
+    char_width = font_size // 2
+    half_char_width = char_width // 2
+    font = load_font(font_path, font_size)
+
+    cell_boxes = {}  # 多行文字的外框是同一个，需要去重，保持出现顺序
     title_cells = set()
-    text_boxes = []  # 文本框
     texts = []
     for lno, line in enumerate(lines):
         v = lno * line_height + y0
@@ -119,13 +132,8 @@ def table2template(
 
         cells = re.split(V_LINE_PATTERN, line)[1:-1]
         if not cells:
-            # text_box = draw.textbbox((start, v), line, font=font, anchor="lm")
-            texts.append(
-                Text(
-                    text=line,
-                    rect=Rect(start, v - char_width, font.getlength(line), font_size),
-                )
-            )
+            rect = start, v - char_width, font.getlength(line), font_size
+            texts.append((line, rect))
             continue
 
         for cno, cell in enumerate(cells):
@@ -133,9 +141,8 @@ def table2template(
             if cell == "" or "═" in cell:
                 start += (len(cell) + 1) * char_width
             else:
-                box = draw.textbbox((start, v), cell, font=font, anchor="lm")  # 左中对齐
+                box = textbbox((start, v), cell, font, "lm")  # 左中对齐
                 if box[1] != box[3]:  # 非空单元内文字框
-                    # draw.text((start, v), cell, font=font, fill="black", anchor="lm")
                     lpad, rpad = count_padding(cell)
                     l = box[0] + lpad * char_width
                     striped_cell = cell.strip()
@@ -145,36 +152,15 @@ def table2template(
                         for text in re.split("( {2,})", striped_cell):
                             if text.strip():
                                 rt = lt + _str_block_width(text) * char_width
-                                # text_box = (lt, box[1], rt, box[3])
-                                # text_boxes.append([text_box, "text@" + text])
-                                texts.append(
-                                    Text(
-                                        text=text,
-                                        rect=Rect(
-                                            lt,
-                                            v - char_width,
-                                            font.getlength(text),
-                                            font_size,
-                                        ),
-                                    )
-                                )
-
+                                width = font.getlength(text)
+                                rect = lt, v - char_width, width, font_size
+                                texts.append((text, rect))
                             else:  # 此时text是空格
                                 lt = rt + _str_block_width(text) * char_width
                     else:
-                        r = box[2] - rpad * char_width
-
-                        texts.append(
-                            Text(
-                                text=striped_cell,
-                                rect=Rect(
-                                    l,
-                                    v - char_width,
-                                    font.getlength(striped_cell),
-                                    font_size,
-                                ),
-                            )
-                        )
+                        width = font.getlength(striped_cell)
+                        rect = l, v - char_width, width, font_size
+                        texts.append((striped_cell, rect))
 
                 left = box[0] - half_char_width  # 其实box以及包括了空白长度，此处可以不偏置
                 right = box[2] + half_char_width
@@ -190,60 +176,57 @@ def table2template(
                 while replace_chinese_to_dunder(lines, bb)[ll] not in H_SYMBOLS:
                     bb += 1
                 cbox = (left, tt * line_height + y0, right, bb * line_height + y0)
-                cell_boxes.add(cbox)
+                cell_boxes[cbox] = None
                 if "<TITLE>" in cell:
                     title_cells.add(cbox)
 
-    # 以下处理标注
-    for box in cell_boxes:
-        text_boxes.append([box, "cell@"])
-        if vrules == "ALL":
-            draw.line(
-                (box[0], box[1]) + (box[0], box[3]), fill=fgcolor, width=line_width
-            )
-            draw.line(
-                (box[2], box[1]) + (box[2], box[3]), fill=fgcolor, width=line_width
-            )
-        if hrules == "ALL":
-            draw.line(
-                (box[0], box[1]) + (box[2], box[1]), fill=fgcolor, width=line_width
-            )
-            draw.line(
-                (box[0], box[3]) + (box[2], box[3]), fill=fgcolor, width=line_width
-            )
-        if hrules in ("-", ".", "=", "~", "_"):
-            draw.text(
-                (box[0], box[1]),
-                hrules * (int((box[2] - box[0]) / font.getlength(hrules))),
-                fgcolor,
-                font,
-                anchor="lm",
-            )
-            draw.text(
-                (box[0], box[3]),
-                hrules * (int((box[2] - box[0]) / font.getlength(hrules))),
-                fgcolor,
-                font,
-                anchor="lm",
-            )
+    size = (len(lines[0]) + 1) * char_width, len(lines) * line_height
+    return TableLayout(size, texts, list(cell_boxes), title_cells)
+
+
+def _draw_rules(draw, box, font, fgcolor, line_width, vrules, hrules):
+    if vrules == "ALL":
+        draw.line((box[0], box[1]) + (box[0], box[3]), fill=fgcolor, width=line_width)
+        draw.line((box[2], box[1]) + (box[2], box[3]), fill=fgcolor, width=line_width)
+    if hrules == "ALL":
+        draw.line((box[0], box[1]) + (box[2], box[1]), fill=fgcolor, width=line_width)
+        draw.line((box[0], box[3]) + (box[2], box[3]), fill=fgcolor, width=line_width)
+    if hrules in ("-", ".", "=", "~", "_"):
+        dashes = hrules * (int((box[2] - box[0]) / font.getlength(hrules)))
+        draw.text((box[0], box[1]), dashes, fgcolor, font, anchor="lm")
+        draw.text((box[0], box[3]), dashes, fgcolor, font, anchor="lm")
 
+
+def draw_table(
+    background,
+    cell_boxes,
+    title_cells,
+    font,
+    bgcolor="white",
+    line_width=2,
+    vrules="ALL",
+    hrules="ALL",
+    debug=False,
+    fgcolor="black",
+    border=True,
+    outcolor="blue",
+    cellcolor="orange",
+):
+    """
+    在背景上画表格线
+    :return: Image 背景
+    """
+    draw = ImageDraw.Draw(background)
+    for box in cell_boxes:
+        _draw_rules(draw, box, font, fgcolor, line_width, vrules, hrules)
         if debug:
             print(box, "@cell")
 
-    points = []
-    boxes = [tb[0] for tb in text_boxes]  # 单纯的boxes分不清是行列还是表格和文本
-    l, t, r, b = boxes[0]  # 求表格四极
-
-    for box in boxes:
-        points.append([box[0], box[1]])
-        points.append([box[2], box[1]])
-        points.append([box[2], box[3]])
-        points.append([box[0], box[3]])
-        l = min(l, box[0])
-        t = min(t, box[1])
-        r = max(r, box[2])
-        b = max(b, box[3])
-    boxes.append([l, t, r, b])
+    # 求表格四极
+    l = min(box[0] for box in cell_boxes)
+    t = min(box[1] for box in cell_boxes)
+    r = max(box[2] for box in cell_boxes)
+    b = max(box[3] for box in cell_boxes)
     if border == "bold":
         draw.rectangle((l, t, r, b), outline=fgcolor, width=line_width + 1)
     if border == "double":
@@ -255,41 +238,131 @@ def table2template(
             draw.rectangle(box, bgcolor, fgcolor, line_width)
             if box in title_cells:
                 draw.rectangle(box, cellcolor, fgcolor, line_width)
-            if vrules == "ALL":
-                draw.line(
-                    (box[0], box[1]) + (box[0], box[3]), fill=fgcolor, width=line_width
-                )
-                draw.line(
-                    (box[2], box[1]) + (box[2], box[3]), fill=fgcolor, width=line_width
-                )
-            if hrules == "ALL":
-                draw.line(
-                    (box[0], box[1]) + (box[2], box[1]), fill=fgcolor, width=line_width
-                )
-                draw.line(
-                    (box[0], box[3]) + (box[2], box[3]), fill=fgcolor, width=line_width
-                )
-            if hrules in ("-", ".", "=", "~", "_"):
-                draw.text(
-                    (box[0], box[1]),
-                    hrules * (int((box[2] - box[0]) / font.getlength(hrules))),
-                    fgcolor,
-                    font,
-                    anchor="lm",
-                )
-                draw.text(
-                    (box[0], box[3]),
-                    hrules * (int((box[2] - box[0]) / font.getlength(hrules))),
-                    fgcolor,
-                    font,
-                    anchor="lm",
-                )
+            _draw_rules(draw, box, font, fgcolor, line_width, vrules, hrules)
+    return background
+
+
+def _cached_background(key, draw_func):
+    """
+    画好线的背景，相同版面和样式只画一次
+    :param key: 版面、偏移和样式参数
+    :param draw_func: 无参函数，返回新画的背景
+    :return: Image 副本
+    """
+    try:
+        background = _backgrounds.get(key)
+    except TypeError:  # 样式参数不可哈希
+        return draw_func()
+    if background is None:
+        background = _backgrounds.put(key, draw_func())
+    return background.copy()
+
+
+def layout2template(
+    layout, xy=None, font_size=20, font_path="simfang.ttf", cache=True, **style
+):
+    """
+    用解析好的版面生成模板，只画背景和表格线，相同样式的背景直接复用
+    :param layout: TableLayout
+    :param xy: 表格偏移
+    :param font_size: 字号，与解析版面时相同
+    :param font_path: 字体，与解析版面时相同
+    :param cache: 是否缓存画好线的背景，偏移和颜色随机的样式几乎不会重复，应关闭
+    :param style: draw_table 的样式参数
+    :return: FormTemplate
+    """
+    x, y = xy or (0, 0)
+    w, h = layout.size[0] + x * 2, layout.size[1] + y * 2
+    cells = [(b[0] + x, b[1] + y, b[2] + x, b[3] + y) for b in layout.cells]
+    titles = {(b[0] + x, b[1] + y, b[2] + x, b[3] + y) for b in layout.titles}
+    font = load_font(font_path, font_size)
+    bgcolor = style.get("bgcolor", "white")
+
+    def draw_background():
+        background = Image.new("RGB", (w, h), bgcolor)
+        return draw_table(background, cells, titles, font, **style)
+
+    if cache:
+        key = (layout, x, y, font_size, font_path) + tuple(sorted(style.items()))
+        background = _cached_background(key, draw_background)
+    else:
+        background = draw_background()
+    texts = [
+        Text(text=text, rect=Rect(left + x, top + y, width, height))
+        for text, (left, top, width, height) in layout.texts
+    ]
+    return FormTemplate(background, texts)
+
 
-    points.append([l, t])
-    points.append([r, t])
-    points.append([r, b])
-    points.append([l, b])
+def table2template(
+    table,
+    xy=None,
+    font_size=20,
+    bgcolor="white",
+    background=None,
+    bg_box=None,
+    font_path="simfang.ttf",
+    line_pad=0,
+    line_height=None,
+    line_width=2,
+    vrules="ALL",
+    hrules="ALL",
+    keep_ratio=False,
+    debug=False,
+    fgcolor="black",
+    border=True,
+    outcolor="blue",
+    cellcolor="orange",
+):
+    """
+    将PrettyTable 字符串对象化为模板
+    没有指定背景图片时，版面按表格字符串缓存，相同的表格不再重复解析
+    """
+
+    assert font_size % 4 == 0
+    if line_height is None:
+        line_height = font_size + line_pad
+    style = dict(
+        bgcolor=bgcolor,
+        line_width=line_width,
+        vrules=vrules,
+        hrules=hrules,
+        debug=debug,
+        fgcolor=fgcolor,
+        border=border,
+        outcolor=outcolor,
+        cellcolor=cellcolor,
+    )
+    if background is None or not bg_box:
+        layout = table_layout(table, font_size, font_path, line_height)
+        return layout2template(layout, xy, font_size, font_path, **style)
+
+    lines = str(table).splitlines()
+    char_width = font_size // 2
+    x, y = xy or (0, 0)
+    w = (len(lines[0]) + 1) * char_width + x * 2  # 图片宽度
+    h = (len(lines)) * line_height + y * 2  # 图片高度
+
+    x1, y1, x2, y2 = bg_box
+    w0, h0 = x2 - x1, y2 - y1
+    if isinstance(background, str):
+        background = Image.open(background)
+    elif isinstance(background, np.ndarray):
+        background = Image.fromarray(cv2.cvtColor(background, cv2.COLOR_BGR2RGB))
+    wb, hb = background.size
+    if not keep_ratio:
+        wn, hn = int(wb * w / w0), int(hb * h / h0)
+        background = background.resize((wn, hn))
+        x0, y0 = int(x1 * w / w0), int(y1 * h / h0)
+    else:
+        wn, hn = int(wb * w / w0), int(hb * w / w0)  # 宽度自适应，高度保持比例
+        background = background.resize((wn, hn))
+        x0, y0 = int(x1 * w / w0), int(y1 * w / w0)
 
+    layout = parse_table(lines, x0, y0, font_size, font_path, line_height)
+    font = load_font(font_path, font_size)
+    draw_table(background, layout.cells, layout.titles, font, **style)
+    texts = [Text(text=text, rect=Rect(*rect)) for text, rect in layout.texts]
     return FormTemplate(background, texts)
 
 
@@ -3,11 +3,13 @@
 import os
 import re
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from pyrect import Rect
 
+from awesometable.imagedata import load_font
 from multifaker import Faker
-from .template import Template, Text, random_color
+from .template import Template, Text
+from .textraster import TextRaster
 from tis.utils.picsum import rand_person
 from tis.utils.poison import poison_text
 
@@ -115,7 +117,7 @@ class IDCardTemplate(Template):
                 if text.text.split("@")[0] == "spbirth":
                     text.text = _(birth)
 
-    def render_image_data(self):
+    def render_image_data(self, background=False):
         try:
             person_img = rand_person()
         except Exception:
@@ -124,19 +126,16 @@ class IDCardTemplate(Template):
             if text.text in ("IMAGE", "image@"):
                 img = person_img.resize(text.rect.size)
                 self.image.paste(img, text.rect.topleft)
-        return super().render_image_data()
+        return super().render_image_data(background)
 
-    def render_image_data_poison(self):
+    def render_image_data_poison(self, background=False):
         """使用泊松编辑方法写字"""
         person_img = rand_person()
         image = self.image.copy()
-        text_layer = Image.new("RGB", image.size, (255, 255, 255))
-        text_drawer = ImageDraw.Draw(text_layer)
-
-        mask = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(image)
-        mask_draw = ImageDraw.Draw(mask)
+        # 合成交给泊松编辑，光栅化器只生成文字层和蒙版
+        raster = TextRaster(image, composite=False)
         text_list = []
+        outlines = []
         for text in self.texts:
             if text.text in ("<LTImage>", "IMAGE", "image@"):
                 img = person_img.resize(text.rect.size)
@@ -145,33 +144,21 @@ class IDCardTemplate(Template):
                 continue
 
             if text.text.startswith("key@"):  # 固定位置的文字不重写
-                text_box = [
-                    text.rect.left,
-                    text.rect.top,
-                    text.rect.right,
-                    text.rect.bottom,
-                ]
-                text_list.append([text_box, "text@" + text.text.removeprefix("key@")])
+                text_list.append(self._key_label(text))
                 continue
 
             if text.font is None or text.font.lower() in ("b", "i"):
                 # """原始模板，没填充的"""
-                draw.rectangle(
-                    (text.rect.left, text.rect.top, text.rect.right, text.rect.bottom),
-                    outline=random_color(),
-                    width=2,
-                )
-                font = ImageFont.truetype(self.default_font, text.rect.height)
+                outlines.append(text.rect)
+                font = load_font(self.default_font, text.rect.height)
+                box = self._text_bbox(text, font)
             else:
                 size = text.rect.height  # - 4
-                # 重新居中渲染
-                # print(text.font)
                 try:
-                    font = ImageFont.truetype(text.font, size)
+                    font = load_font(text.font, size)
                 except Exception as e:
                     print(e)
                     print(text.font)
-                # 如果字宽小于框宽或字符串单词数较少
                 image = poison_text(
                     image,
                     (text.rect.left, text.rect.top),
@@ -180,36 +167,12 @@ class IDCardTemplate(Template):
                     font,
                     mode="mixed",
                 )
-                # draw.text((text.rect.left, text.rect.top), text.text,
-                #           text.color, font)
-                text_drawer.text(
-                    (text.rect.left, text.rect.top), text.text, text.color, font
-                )
-                mask_draw.text((text.rect.left, text.rect.top), text.text, 255, font)
-                # mask_draw.rectangle((text.rect.left,text.rect.top,text.rect.right,text.rect.bottom),(255,255,255,255))
-
-            text_box = draw.textbbox((text.rect.left, text.rect.top), text.text, font)
-            text_list.append([text_box, "text@" + text.text])
-
-        boxes = [tb[0] for tb in text_list]
-        label = [tb[1] for tb in text_list]
-        points = []
-        for box in boxes:
-            points.append([box[0], box[1]])
-            points.append([box[2], box[1]])
-            points.append([box[2], box[3]])
-            points.append([box[0], box[3]])
-
-        return {
-            "image": image,
-            # cv2.cvtColor(np.array(image, np.uint8),cv2.COLOR_RGB2BGR),
-            "boxes": boxes,  # box 和 label是一一对应的
-            "label": label,
-            "points": points,
-            "mask": mask,
-            "text_layer": text_layer,
-            "background": self.image.copy(),
-        }
+                box = raster.text(text.rect.topleft, text.text, text.color, font)
+            text_list.append([box, "text@" + text.text])
+
+        self._draw_outlines(image, outlines)
+        text_layer = raster.text_layer((255, 255, 255))
+        return self._pack(image, raster, text_list, background, text_layer)
 
     @classmethod
     def from_html(cls, file):
@@ -234,106 +197,56 @@ class PassportTemplate(IDCardTemplate):
                 label, txt = text.text.split("@")
                 text.text = passport.get(label, "")
 
-    def render_image_data(self):
+    def render_image_data(self, background=False):
         """
         渲染模板成图片字典格式,包含标注
+        :param background: 是否附带模板原图的副本
         :return:
         """
         self.set_person_image()
 
-        image = self.image.copy()
-        text_layer = Image.new("RGBA", image.size, (255, 255, 255, 0))
-        text_drawer = ImageDraw.Draw(text_layer)
-
-        mask = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(image)
-        mask_draw = ImageDraw.Draw(mask)
+        raster = TextRaster(self.image)
         text_list = []
+        outlines = []
 
         for text in self.texts:
             if text.text in ("IMAGE", "image@"):
                 continue
             if text.text.startswith("key@"):  # 固定位置的文字不重写
-                text_box = [
-                    text.rect.left,
-                    text.rect.top,
-                    text.rect.right,
-                    text.rect.bottom,
-                ]
-                text_list.append([text_box, "text@" + text.text.removeprefix("key@")])
+                text_list.append(self._key_label(text))
                 continue
 
             if text.font is None or text.font.lower() in ("b", "i"):
                 # 原始模板，没填充的
-                draw.rectangle(
-                    (text.rect.left, text.rect.top, text.rect.right, text.rect.bottom),
-                    outline=random_color(),
-                    width=2,
-                )
-                font = ImageFont.truetype(self.default_font, text.rect.height)
+                outlines.append(text.rect)
+                font = load_font(self.default_font, text.rect.height)
+                box = self._text_bbox(text, font)
             else:
+                font = load_font(text.font, text.rect.height)
 
                 def put_text_in_rect(text):
-                    """闭包,将text.text拉伸值text.rect的宽度"""
+                    """闭包,将text.text拉伸值text.rect的宽度，同一字符只渲染一次"""
                     width = text.rect.width
                     length = len(text.text)
-                    font = ImageFont.truetype(text.font, text.rect.height)
                     delta_x = (width - font.getlength(text.text)) // length
 
                     ptx = text.rect.left
                     pty = text.rect.top
                     for char in text.text:
-                        draw.text((ptx, pty), char, text.color, font)
-                        text_drawer.text((ptx, pty), char, text.color, font)
-                        mask_draw.text(
-                            (ptx, pty), char, 255, font, stroke_fill=255, stroke_width=0
-                        )
+                        raster.text((ptx, pty), char, text.color, font)
                         ptx += font.getlength(char) + delta_x
 
                 if len(text.text) == 44:  # 专门针对编号优化
                     put_text_in_rect(text)
+                    box = self._text_bbox(text, font)
                 else:
-                    font = ImageFont.truetype(text.font, text.rect.height)
-                    draw.text(
-                        (text.rect.left, text.rect.top), text.text, text.color, font
-                    )
-                    text_drawer.text(
-                        (text.rect.left, text.rect.top), text.text, text.color, font
-                    )
-                    mask_draw.text(
-                        (text.rect.left, text.rect.top),
-                        text.text,
-                        255,
-                        font,
-                        stroke_fill=255,
-                        stroke_width=0,
-                    )
+                    box = raster.text(text.rect.topleft, text.text, text.color, font)
 
-            text_list.append(
-                [
-                    draw.textbbox((text.rect.left, text.rect.top), text.text, font),
-                    "text@" + text.text,
-                ]
-            )
+            text_list.append([box, "text@" + text.text])
 
-        boxes = [tb[0] for tb in text_list]
-        label = [tb[1] for tb in text_list]
-        points = []
-        for box in boxes:
-            points.append([box[0], box[1]])
-            points.append([box[2], box[1]])
-            points.append([box[2], box[3]])
-            points.append([box[0], box[3]])
-
-        return {
-            "image": image,
-            "boxes": boxes,
-            "label": label,
-            "points": points,
-            "mask": mask,
-            "text_layer": text_layer,
-            "background": self.image.copy(),
-        }
+        image = raster.image()
+        self._draw_outlines(image, outlines)
+        return self._pack(image, raster, text_list, background)
 
     def set_person_image(self):
         try:
@@ -11,10 +11,14 @@ from collections import defaultdict
 from dataclasses import dataclass
 from typing import Any, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from pyrect import Rect
 
 from awesometable.fontwrap import put_text_in_box
+from awesometable.imagedata import load_font
+from postprocessor.label import Labels
+from tasks.multilang.textraster import TextRaster
+from tis.utils.geometry import GridIndex, box_of, overlap, typical_size
 
 
 class TemplateError(Exception):
@@ -53,81 +57,79 @@ class Template:
         """
         return self.render_image_data()["image"]
 
-    def render_image_data(self):
+    def render_image_data(self, background=False):
         """
         渲染模板成图片字典格式,包含标注
+        每个字符串只光栅化一次，合成图、文字层、蒙版和文字框都由同一个切片得到
+        :param background: 是否附带模板原图的副本，只有需要重新合成的后处理才要
         :return:
         """
-        image = self.image.copy()
-        text_layer = Image.new("RGBA", image.size, (255, 255, 255, 0))
-        text_drawer = ImageDraw.Draw(text_layer)
-
-        mask = Image.new("L", image.size, 0)
-        draw = ImageDraw.Draw(image)
-        mask_draw = ImageDraw.Draw(mask)
+        raster = TextRaster(self.image)
         text_list = []
+        outlines = []
         for text in self.texts:
             if text.text in ("<LTImage>", "IMAGE", "image@"):
                 continue
 
             if text.text.startswith("key@"):  # 固定位置的文字不重写
-                text_box = [
-                    text.rect.left,
-                    text.rect.top,
-                    text.rect.right,
-                    text.rect.bottom,
-                ]
-                text_list.append([text_box, "text@" + text.text.removeprefix("key@")])
+                text_list.append(self._key_label(text))
                 continue
 
             if text.font is None or text.font.lower() in ("b", "i"):
                 # 原始模板，没填充的
+                outlines.append(text.rect)
+                font = load_font(self.default_font, text.rect.height)
+                box = self._text_bbox(text, font)
+            else:
+                font = load_font(text.font, text.rect.height)
+                box = raster.text(text.rect.topleft, text.text, text.color, font)
+            text_list.append([box, "text@" + text.text])
+
+        image = raster.image()
+        self._draw_outlines(image, outlines)
+        return self._pack(image, raster, text_list, background)
+
+    @staticmethod
+    def _key_label(text):
+        text_box = [
+            text.rect.left,
+            text.rect.top,
+            text.rect.right,
+            text.rect.bottom,
+        ]
+        return [text_box, "text@" + text.text.removeprefix("key@")]
+
+    @staticmethod
+    def _text_bbox(text, font):
+        """不写字时的文字框，与 ImageDraw.textbbox 相同"""
+        box = font.getbbox(text.text)
+        left, top = text.rect.topleft
+        return left + box[0], top + box[1], left + box[2], top + box[3]
+
+    @staticmethod
+    def _draw_outlines(image, rects):
+        if rects:
+            draw = ImageDraw.Draw(image)
+            for rect in rects:
                 draw.rectangle(
-                    (text.rect.left, text.rect.top, text.rect.right, text.rect.bottom),
+                    (rect.left, rect.top, rect.right, rect.bottom),
                     outline=random_color(),
                     width=2,
                 )
-                font = ImageFont.truetype(self.default_font, text.rect.height)
-            else:
-                font = ImageFont.truetype(text.font, text.rect.height)
-                draw.text((text.rect.left, text.rect.top), text.text, text.color, font)
-                text_drawer.text(
-                    (text.rect.left, text.rect.top), text.text, text.color, font
-                )
-                mask_draw.text(
-                    (text.rect.left, text.rect.top),
-                    text.text,
-                    255,
-                    font,
-                    stroke_fill=255,
-                    stroke_width=0,
-                )
-
-            text_list.append(
-                [
-                    draw.textbbox((text.rect.left, text.rect.top), text.text, font),
-                    "text@" + text.text,
-                ]
-            )
 
+    def _pack(self, image, raster, text_list, background=False, text_layer=None):
+        """组装图片字典"""
         boxes = [tb[0] for tb in text_list]
         label = [tb[1] for tb in text_list]
-        points = []
-        for box in boxes:
-            points.append([box[0], box[1]])
-            points.append([box[2], box[1]])
-            points.append([box[2], box[3]])
-            points.append([box[0], box[3]])
-
-        return {
+        data = {
             "image": image,
             "boxes": boxes,
-            "label": label,
-            "points": points,
-            "mask": mask,
-            "text_layer": text_layer,
-            "background": self.image.copy(),
+            "mask": raster.mask_image(),
+            "text_layer": text_layer or raster.text_layer(),
         }
+        if background:
+            data["background"] = self.image.copy()
+        return Labels.from_boxes(boxes, label).attach(data)
 
     def __setstate__(self, state):
         self.image = state["image"]
@@ -176,13 +178,13 @@ class Template:
                 continue
 
             if not translator:  # 不是翻译
-                font = ImageFont.truetype(text.font, text.rect.height)
+                font = load_font(text.font, text.rect.height)
                 text.text = engine.sentence_fontlike(font, text.rect.width).title()
             else:
                 try:
                     trans_text = translator.translate(text.text.strip())
                 except KeyError:
-                    font = ImageFont.truetype(text.font, text.rect.height)
+                    font = load_font(text.font, text.rect.height)
                     text.text = engine.sentence_font_like(font, text.rect.width)
                 else:
                     text.text = str(trans_text)
@@ -390,29 +392,37 @@ def random_color():
     return random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)
 
 
+def _similar_area(box, other):
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    other_area = (other[2] - other[0]) * (other[3] - other[1])
+    return math.isclose(area, other_area, rel_tol=0.1)
+
+
 def collide_any(rect, others):
     """
-    矩形碰撞判断
+    矩形碰撞判断，重叠且面积相近才算碰撞
     :param rect: Rect
     :param others: List[Rect]
     :return: bool
     """
-    for other in others:
-        if rect.collide(other) and math.isclose(rect.area, other.area, rel_tol=0.1):
-            return True
-    return False
+    box = box_of(rect)
+    return any(
+        overlap(box, other) and _similar_area(box, other)
+        for other in map(box_of, others)
+    )
 
 
 def remove_col(texts):
     """去除有碰撞的内容"""
     outs = []
     seen = set()
-    seen_rect = []
-    for text in texts:
-        if text.rect.box not in seen and not collide_any(text.rect, seen_rect):
+    boxes = [box_of(text.rect) for text in texts]
+    index = GridIndex(typical_size(boxes))
+    for text, box in zip(texts, boxes):
+        if box not in seen and not index.collide(box, _similar_area):
             outs.append(text)
-            seen.add(text.rect.box)
-            seen_rect.append(text.rect)
+            seen.add(box)
+            index.insert(box)
     return outs
 
 
@@ -0,0 +1,123 @@
+"""
+单次渲染的文字光栅化
+每个字符串只渲染一次，得到紧凑的 alpha 切片，
+合成图、文字层、蒙版和文字框都由切片混合到共享缓冲区得到，
+不再对整页分别绘制三次再调用 textbbox。
+同一字体字号的相同字符串的切片会缓存，护照机读码逐字符排版时同一字符只渲染一次。
+"""
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+
+def _over(region, ink, weight):
+    """
+    按 alpha 把纯色混合到缓冲区，与 ImageDraw.text 的结果一致
+    :param region: 缓冲区切片，单通道、RGB 或 RGBA
+    :param ink: RGBA 颜色
+    :param weight: 文字的 alpha
+    :return:
+    """
+    value = ink[3:] if region.shape[2] == 1 else ink[: region.shape[2]]
+    blend = (region * (255 - weight) + value * weight + 127) // 255
+    if region.shape[2] == 4:
+        # 完全透明的像素直接取文字颜色
+        clear = (region[..., 3:] == 0) & (weight > 0)
+        blend[..., :3] = np.where(clear, ink[:3], blend[..., :3])
+    region[...] = blend
+
+
+class TextRaster:
+    """文字光栅化器，page 是合成图，layer 是 RGBA 文字层，mask 是文字蒙版"""
+
+    def __init__(self, image, composite=True):
+        """
+        :param image: 模板图片，不会被修改
+        :param composite: 是否在模板图片上合成文字，泊松编辑等自行合成时关闭
+        """
+        width, height = image.size
+        self.size = image.size
+        self.page = None
+        if composite:
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            self.mode = image.mode
+            self.page = np.array(image)
+        self.layer = np.empty((height, width, 4), np.uint8)
+        self.layer[...] = (255, 255, 255, 0)
+        self.mask = np.zeros((height, width), np.uint8)
+        self._tiles = {}
+
+    def tile(self, text, font):
+        """
+        文字的 alpha 切片
+        :param text: 文字
+        :param font: FreeTypeFont
+        :return: tuple[np.ndarray, tuple] 切片和相对书写位置的偏移
+        """
+        key = (font.path, font.size, text)
+        cached = self._tiles.get(key)
+        if cached is None:
+            box = font.getbbox(text)
+            width, height = max(box[2] - box[0], 0), max(box[3] - box[1], 0)
+            alpha = Image.new("L", (width, height), 0)
+            if width and height:
+                ImageDraw.Draw(alpha).text((-box[0], -box[1]), text, 255, font)
+            cached = np.asarray(alpha), (box[0], box[1])
+            self._tiles[key] = cached
+        return cached
+
+    def text(self, xy, text, color, font):
+        """
+        左上角锚点写字
+        :param xy: 书写位置
+        :param text: 文字
+        :param color: 颜色
+        :param font: FreeTypeFont
+        :return: tuple 文字框，与 ImageDraw.textbbox 相同
+        """
+        alpha, (dx, dy) = self.tile(text, font)
+        left, top = int(round(xy[0])) + dx, int(round(xy[1])) + dy
+        height, width = alpha.shape
+        box = (left, top, left + width, top + height)
+        self._blend(box, alpha, color)
+        return box
+
+    def _blend(self, box, alpha, color):
+        page_w, page_h = self.size
+        x_0, y_0 = max(box[0], 0), max(box[1], 0)
+        x_1, y_1 = min(box[2], page_w), min(box[3], page_h)
+        if x_0 >= x_1 or y_0 >= y_1:
+            return
+        alpha = alpha[y_0 - box[1] : y_1 - box[1], x_0 - box[0] : x_1 - box[0]]
+        if not alpha.any():
+            return
+        if isinstance(color, str):
+            color = ImageColor.getrgb(color)
+        ink = np.array(tuple(color[:3]) + (255,), np.uint32)
+        weight = alpha.astype(np.uint32)[..., None]
+
+        _over(self.layer[y_0:y_1, x_0:x_1], ink, weight)
+        _over(self.mask[y_0:y_1, x_0:x_1, None], ink, weight)
+        if self.page is not None:
+            _over(self.page[y_0:y_1, x_0:x_1], ink, weight)
+
+    def image(self):
+        return Image.fromarray(self.page, self.mode)
+
+    def text_layer(self, background=None):
+        """
+        :param background: 背景色，None 时返回透明的 RGBA 文字层，
+            否则按 alpha 合成到纯色上，与在该颜色的 RGB 图上写字相同
+        :return: PIL.Image
+        """
+        if background is None:
+            return Image.fromarray(self.layer, "RGBA")
+        if isinstance(background, str):
+            background = ImageColor.getrgb(background)
+        back = np.array(background[:3], np.uint32)
+        weight = self.layer[..., 3:].astype(np.uint32)
+        blend = (back * (255 - weight) + self.layer[..., :3] * weight + 127) // 255
+        return Image.fromarray(blend.astype(np.uint8), "RGB")
+
+    def mask_image(self):
+        return Image.fromarray(self.mask, "L")
@@ -0,0 +1,261 @@
+"""
+图片素材提供器
+人像、logo、背景等素材统一从提供器获取，生成过程不再依赖网络。
+LocalAssetProvider 预先索引并解码本地目录中的图片，
+PrefetchAssetProvider 在后台线程中从可选的远程来源预取图片，
+远程预取需要设置环境变量 TIS_REMOTE_ASSETS=1 显式打开。
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from glob import glob
+
+from PIL import Image
+
+from _appdir import STATIC_DIR
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+REMOTE_ENV = "TIS_REMOTE_ASSETS"
+
+logger = logging.getLogger(__name__)
+
+
+class AssetProvider:
+    """素材提供器基类"""
+
+    def get(self):
+        """
+        返回一张素材图片
+        :return: Image
+        """
+        raise NotImplementedError
+
+    def __call__(self, width=None, height=None):
+        img = self.get()
+        if width and height:
+            return img.resize((width, height))
+        return img
+
+
+class LocalAssetProvider(AssetProvider):
+    """本地目录素材，初始化时建立索引，图片解码一次后常驻内存"""
+
+    def __init__(self, directory=None, files=None, preload=True, max_decoded=256):
+        """
+        :param directory: 素材目录，递归查找图片
+        :param files: 直接指定文件列表
+        :param preload: 是否在初始化时解码全部图片
+        :param max_decoded: 常驻内存的最大图片数
+        """
+        self.directory = directory
+        self.files = list(files or [])
+        self.files.extend(self._scan())
+        self.files.sort()
+        self.index = {os.path.basename(p): p for p in self.files}
+        self.max_decoded = max_decoded
+        self._decoded = {}
+        self._lock = threading.Lock()
+        if preload:
+            for path in self.files[:max_decoded]:
+                self._load(path)
+
+    def __len__(self):
+        return len(self.files)
+
+    def _scan(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        pattern = os.path.join(self.directory, "**", "*")
+        paths = glob(pattern, recursive=True)
+        return [path for path in paths if path.lower().endswith(IMAGE_EXTS)]
+
+    def refresh(self):
+        """
+        重新扫描目录，登记其他进程新写入的文件
+        :return: None
+        """
+        for path in self._scan():
+            if os.path.basename(path) not in self.index:
+                self.add(path)
+
+    def _load(self, path):
+        img = self._decoded.get(path)
+        if img is None:
+            img = Image.open(path)
+            img.load()
+            with self._lock:
+                if len(self._decoded) < self.max_decoded:
+                    self._decoded[path] = img
+        return img
+
+    def add(self, path, img=None):
+        """
+        登记新的素材文件
+        :param path: 文件路径
+        :param img: 已解码的图片
+        :return: None
+        """
+        with self._lock:
+            if path not in self.index.values():
+                self.files.append(path)
+            self.index[os.path.basename(path)] = path
+            if img is not None and len(self._decoded) < self.max_decoded:
+                self._decoded[path] = img
+
+    def find(self, name):
+        """
+        按文件名查找素材，索引中没有时重新扫描一次目录
+        :param name: 文件名
+        :return: Image|None 返回副本，可直接修改
+        """
+        path = self.index.get(name)
+        if path is None:
+            self.refresh()
+            path = self.index.get(name)
+        if path is None:
+            return None
+        return self._load(path).copy()
+
+    def get(self):
+        if not self.files:
+            raise IndexError(f"No image found in {self.directory}")
+        return self._load(random.choice(self.files)).copy()
+
+
+class PrefetchAssetProvider(AssetProvider):
+    """
+    后台线程预取远程素材，取用时不等待网络，队列为空则使用后备提供器
+    线程在首次取用时才启动，fork 出的子进程取用时各自重新启动
+    """
+
+    def __init__(self, fetch, fallback=None, size=16, retry_interval=5):
+        """
+        :param fetch: 获取一张图片的函数
+        :param fallback: 队列为空时的后备提供器，None 时阻塞等待
+        :param size: 预取队列长度
+        :param retry_interval: 获取失败后的重试间隔秒数
+        """
+        self.fetch = fetch
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self.size = size
+        self._pid = None
+        self._queue = None
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.size)
+        threading.Thread(target=self._fill, args=(self._queue,), daemon=True).start()
+
+    def _fill(self, images):
+        while True:
+            try:
+                img = self.fetch()
+                img.load()
+            except Exception:  # pylint: disable=broad-except
+                time.sleep(self.retry_interval)
+                continue
+            images.put(img)
+
+    def get(self):
+        self._start()
+        if self.fallback is None:
+            return self._queue.get()
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return self.fallback.get()
+
+
+class SolidAssetProvider(AssetProvider):
+    """纯色占位素材，没有任何素材来源时使用"""
+
+    def __init__(self, size=(500, 500), color=(0, 255, 0), mode="RGB"):
+        self.size = size
+        self.color = color
+        self.mode = mode
+
+    def get(self):
+        return Image.new(self.mode, self.size, self.color)
+
+
+ASSET_DIRS = {
+    "person": os.path.join(STATIC_DIR, "person"),
+    "logo": os.path.join(STATIC_DIR, "logo"),
+    "background": os.path.join(STATIC_DIR, "background"),
+}
+
+_providers = {}
+
+
+def set_provider(kind, provider):
+    """
+    注册某类素材的提供器
+    :param kind: 素材种类 person|logo|background
+    :param provider: AssetProvider
+    :return: None
+    """
+    _providers[kind] = provider
+
+
+def asset_dir(kind):
+    """
+    某类素材的本地目录，kind 可以带子类，如 logo/A 对应 logo 目录下的 A 目录
+    :param kind: 素材种类
+    :return: str|None
+    """
+    base, _, sub = kind.partition("/")
+    directory = ASSET_DIRS.get(base)
+    if directory and sub:
+        directory = os.path.join(directory, sub)
+    return directory
+
+
+def remote_enabled():
+    """
+    是否允许从远程来源预取素材，由环境变量 TIS_REMOTE_ASSETS=1 打开
+    :return: bool
+    """
+    return os.environ.get(REMOTE_ENV, "") == "1"
+
+
+def get_provider(kind, remote=None):
+    """
+    获取某类素材的提供器
+    未注册时优先使用本地目录，本地没有素材时使用纯色占位图并记录警告，
+    给出了远程来源且打开了远程预取时在后台预取远程素材，取不到时才用占位图
+    :param kind: 素材种类
+    :param remote: 远程获取一张图片的函数
+    :return: AssetProvider
+    """
+    provider = _providers.get(kind)
+    if provider is None:
+        directory = asset_dir(kind)
+        provider = LocalAssetProvider(directory, preload=False)
+        if not len(provider):
+            if remote is not None and not remote_enabled():
+                remote = None
+                note = f"; set {REMOTE_ENV}=1 to prefetch remote images"
+            elif remote is not None:
+                note = " until remote images are prefetched"
+            else:
+                note = ""
+            logger.warning(
+                "No %s assets in %s, using solid placeholder images%s",
+                kind,
+                directory,
+                note,
+            )
+            if kind.partition("/")[0] == "logo":
+                provider = SolidAssetProvider(color=(0, 0, 0, 0), mode="RGBA")
+            else:
+                provider = SolidAssetProvider()
+            if remote is not None:
+                provider = PrefetchAssetProvider(remote, fallback=provider)
+        _providers[kind] = provider
+    return provider
@@ -0,0 +1,78 @@
+"""
+按字节数限制的 LRU 缓存
+整页大小的图片、网格等缓存按占用的内存淘汰，而不是按条数，
+页面尺寸随样本变化时常驻内存也有上限。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+def nbytes(value):
+    """
+    缓存值占用的字节数
+    :param value: np.ndarray、PIL.Image 或它们组成的元组、列表
+    :return: int 其他对象记为 0
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Image.Image):
+        width, height = value.size
+        return width * height * len(value.getbands())
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+
+class ByteLRU:
+    """线程安全的 LRU 缓存，总字节数超过上限时淘汰最久未用的值"""
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: int 字节数上限，单个值超过上限时不缓存
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        :param key: 可哈希的键
+        :param value: 缓存值
+        :return: value
+        """
+        size = nbytes(value)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= nbytes(old)
+            self._data[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _key, old = self._data.popitem(last=False)
+                self.nbytes -= nbytes(old)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
@@ -0,0 +1,330 @@
+"""
+字体目录
+对一个字体文件夹建立一次目录：字族、字形、cmap 覆盖的 Unicode 区间、度量，
+按 (文字, 字形) 建立索引，可以 O(1) 查询例如“覆盖高棉文的粗体字体”。
+目录缓存在 CACHE_DIR/font_catalog 下，首次使用时才加载。
+"""
+import hashlib
+import json
+import os
+import struct
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from glob import glob
+
+from PIL import ImageFont
+
+from _appdir import CACHE_DIR
+
+FONT_CATALOG_DIR = os.path.join(CACHE_DIR, "font_catalog")
+FONT_EXTS = (".ttf", ".otf", ".ttc")
+CATALOG_VERSION = 2  # cmap 解析方式变化时加一，旧缓存随之失效
+
+# 每种文字的代表字符，全部有字形才认为字体支持该文字
+SCRIPT_SAMPLES = {
+    "latin": "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789",
+    "latin_ext": "ÁČĎÉĚÍŇÓŘŠŤÚŮÝŽáčďéěíňóřšťúůýž",
+    "greek": "ΑΒΓΔΕΖΗΘΙΚΛΜΝΞΟΠΡΣΤΥΦΧΨΩαβγδεζηθικλμνξοπρστυφχψω",
+    "bengali": "অআইউএওকখগঘঙচছজঝঞটঠডঢণতথদধনপফবভমযরলশষসহ",
+    "devanagari": "अआइईउऊएऐओऔकखगघङचछजझञटठडढणतथदधनपफबभमयरलवशषसह",
+    "sinhala": "අආඇඈඉඊඋඌඑඒඔකඛගඝඞචඡජඣඤටඨඩඪණතථදධනපඵබභමයරලවශෂසහළෆ",
+    "khmer": "កខគឃងចឆជឈញដឋឌឍណតថទធនបផពភមយរលវសហឡអ",
+    "lao": "ກຂຄງຈຊຍດຕຖທນບປຜຝພຟມຢຣລວສຫອຮ",
+    "cjk": "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年",
+}
+
+# 各语种需要的文字
+LOCALE_SCRIPTS = {
+    "bn": ("bengali",),
+    "cs": ("latin", "latin_ext"),
+    "el_GR": ("greek",),
+    "km": ("khmer",),
+    "lo_LA": ("lao",),
+    "ne": ("devanagari",),
+    "si": ("sinhala",),
+    "zh_CN": ("cjk",),
+    "hk": ("cjk",),
+}
+
+FontInfo = namedtuple(
+    "FontInfo", "path family style bold italic scripts ascent descent ranges"
+)
+
+
+def _read_table_offsets(data):
+    """读取 sfnt 表目录，ttc 取第一个字体"""
+    offset = 0
+    if data[:4] == b"ttcf":
+        offset = struct.unpack(">I", data[12:16])[0]
+    num_tables = struct.unpack(">H", data[offset + 4 : offset + 6])[0]
+    tables = {}
+    for i in range(num_tables):
+        rec = offset + 12 + i * 16
+        tag, _, table_offset, length = struct.unpack(">4sIII", data[rec : rec + 16])
+        tables[tag] = (table_offset, length)
+    return tables
+
+
+def _glyph_runs(first, glyphs):
+    """映射到非 0 字形的连续码位区间，0 号字形 .notdef 会显示成方框"""
+    runs = []
+    run_start = None
+    for offset, glyph in enumerate(glyphs):
+        if glyph and run_start is None:
+            run_start = first + offset
+        elif not glyph and run_start is not None:
+            runs.append((run_start, first + offset - 1))
+            run_start = None
+    if run_start is not None:
+        runs.append((run_start, first + len(glyphs) - 1))
+    return runs
+
+
+def _cmap_format4(data, sub):
+    seg_count = struct.unpack(">H", data[sub + 6 : sub + 8])[0] // 2
+    size = seg_count * 2
+    ends = struct.unpack(f">{seg_count}H", data[sub + 14 : sub + 14 + size])
+    start_at = sub + 16 + size
+    starts = struct.unpack(f">{seg_count}H", data[start_at : start_at + size])
+    delta_at = start_at + size
+    deltas = struct.unpack(f">{seg_count}H", data[delta_at : delta_at + size])
+    offset_at = delta_at + size
+    offsets = struct.unpack(f">{seg_count}H", data[offset_at : offset_at + size])
+    ranges = []
+    for i, (start, end, delta, offset) in enumerate(zip(starts, ends, deltas, offsets)):
+        if start == 0xFFFF or start > end:
+            continue
+        codes = range(start, end + 1)
+        if offset == 0:
+            glyphs = [(code + delta) & 0xFFFF for code in codes]
+        else:
+            at = offset_at + i * 2 + offset
+            raw = struct.unpack(f">{len(codes)}H", data[at : at + len(codes) * 2])
+            glyphs = [glyph and (glyph + delta) & 0xFFFF for glyph in raw]
+        ranges.extend(_glyph_runs(start, glyphs))
+    return ranges
+
+
+def _cmap_format12(data, sub):
+    num_groups = struct.unpack(">I", data[sub + 12 : sub + 16])[0]
+    ranges = []
+    for i in range(num_groups):
+        at = sub + 16 + i * 12
+        start, end, glyph = struct.unpack(">III", data[at : at + 12])
+        if glyph == 0:  # 第一个码位映射到 .notdef
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+def read_cmap(path):
+    """
+    读取字体 cmap 覆盖的 Unicode 区间
+    :param path: 字体文件路径
+    :return: list[tuple[int,int]] 合并后的闭区间，升序
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    tables = _read_table_offsets(data)
+    if b"cmap" not in tables:
+        return []
+    cmap = tables[b"cmap"][0]
+    num = struct.unpack(">H", data[cmap + 2 : cmap + 4])[0]
+    subtables = {}
+    for i in range(num):
+        rec = cmap + 4 + i * 8
+        platform, encoding, offset = struct.unpack(">HHI", data[rec : rec + 8])
+        fmt = struct.unpack(">H", data[cmap + offset : cmap + offset + 2])[0]
+        subtables[(platform, encoding, fmt)] = cmap + offset
+
+    ranges = []
+    for key in ((3, 10, 12), (0, 4, 12), (0, 6, 12)):
+        if key in subtables:
+            ranges = _cmap_format12(data, subtables[key])
+            break
+    else:
+        for key in ((3, 1, 4), (0, 3, 4), (0, 1, 4)):
+            if key in subtables:
+                ranges = _cmap_format4(data, subtables[key])
+                break
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def covers(ranges, text):
+    """
+    区间是否覆盖文本中所有非空白字符
+    :param ranges: read_cmap 的结果
+    :param text: 文本
+    :return: bool
+    """
+    starts = [r[0] for r in ranges]
+    for char in set(text):
+        if char.isspace():
+            continue
+        code = ord(char)
+        i = bisect_right(starts, code) - 1
+        if i < 0 or ranges[i][1] < code:
+            return False
+    return True
+
+
+def read_font_info(path, size=100):
+    """
+    读取单个字体的信息
+    :param path: 字体文件路径
+    :param size: 度量所用字号
+    :return: FontInfo
+    """
+    font = ImageFont.truetype(path, size)
+    family, style = font.getname()
+    style = style or "Regular"
+    ascent, descent = font.getmetrics()
+    ranges = read_cmap(path)
+    scripts = tuple(
+        name for name, sample in SCRIPT_SAMPLES.items() if covers(ranges, sample)
+    )
+    lower = style.lower()
+    return FontInfo(
+        path,
+        family,
+        style,
+        "bold" in lower or "black" in lower or "heavy" in lower,
+        "italic" in lower or "oblique" in lower,
+        scripts,
+        ascent / size,
+        descent / size,
+        ranges,
+    )
+
+
+def style_key(info):
+    """
+    字形分类，与 lorem.font 的 mode 对应
+    :param info: FontInfo
+    :return: str n|b|i|bi
+    """
+    if info.bold and info.italic:
+        return "bi"
+    if info.bold:
+        return "b"
+    if info.italic:
+        return "i"
+    return "n"
+
+
+class FontCatalog:
+    """字体文件夹目录"""
+
+    def __init__(self, fonts):
+        """
+        :param fonts: list[FontInfo]
+        """
+        self.fonts = {info.path: info for info in fonts}
+        self._index = defaultdict(list)
+        for info in fonts:
+            key = style_key(info)
+            for script in tuple(info.scripts) + (None,):
+                self._index[(script, None)].append(info.path)
+                self._index[(script, key)].append(info.path)
+
+    def __len__(self):
+        return len(self.fonts)
+
+    @staticmethod
+    def _signature(files):
+        stats = [
+            (os.path.basename(f), os.path.getsize(f), int(os.path.getmtime(f)))
+            for f in files
+        ]
+        key = repr((CATALOG_VERSION, stats))
+        return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build(cls, font_dir):
+        """
+        扫描字体文件夹，无法解析的字体会被跳过
+        :param font_dir: 字体文件夹
+        :return: FontCatalog
+        """
+        fonts = []
+        for path in cls.list_fonts(font_dir):
+            try:
+                fonts.append(read_font_info(path))
+            except (OSError, struct.error):
+                continue
+        return cls(fonts)
+
+    @staticmethod
+    def list_fonts(font_dir):
+        files = glob(os.path.join(font_dir, "*"))
+        return sorted(f for f in files if f.lower().endswith(FONT_EXTS))
+
+    @classmethod
+    def load(cls, font_dir, cache_dir=FONT_CATALOG_DIR):
+        """
+        读取缓存的目录，字体文件有增删改时重新扫描
+        :param font_dir: 字体文件夹
+        :param cache_dir: 缓存文件夹
+        :return: FontCatalog
+        """
+        name = hashlib.md5(os.path.abspath(font_dir).encode("utf-8")).hexdigest()
+        path = os.path.join(cache_dir, name + ".json")
+        signature = cls._signature(cls.list_fonts(font_dir))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+            if cached["signature"] == signature:
+                return cls([FontInfo(*f) for f in cached["fonts"]])
+
+        catalog = cls.build(font_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"signature": signature, "fonts": list(catalog.fonts.values())}, file
+            )
+        return catalog
+
+    def query(self, script=None, mode=None):
+        """
+        查询支持某种文字、某种字形的字体
+        :param script: 文字，见 SCRIPT_SAMPLES，None 表示任意
+        :param mode: n 常规 b 粗体 i 斜体 bi 粗斜体，None 表示任意
+        :return: list[str] 字体路径
+        """
+        return self._index.get((script, mode), [])
+
+    def covers(self, path, text):
+        """
+        字体是否有文本中所有字符的字形
+        :param path: 字体路径
+        :param text: 文本
+        :return: bool
+        """
+        return covers(self.fonts[path].ranges, text)
+
+
+_catalogs = {}
+
+
+def get_catalog(font_dir):
+    """
+    获取字体目录，同一文件夹只加载一次
+    :param font_dir: 字体文件夹
+    :return: FontCatalog
+    """
+    catalog = _catalogs.get(font_dir)
+    if catalog is None:
+        if os.path.isdir(font_dir):
+            catalog = FontCatalog.load(font_dir)
+        else:
+            catalog = FontCatalog([])
+        _catalogs[font_dir] = catalog
+    return catalog
@@ -0,0 +1,202 @@
+"""
+矩形几何
+矩形统一用 (left, top, right, bottom) 元组表示，边界相接不算重叠。
+GridIndex 是均匀网格空间索引，重叠查询只检查所在网格中的矩形；
+max_empty_rect 在 O(N^2) 内求不与任何矩形重叠的最大矩形。
+"""
+from collections import defaultdict
+
+import numpy as np
+
+
+def box_of(rect):
+    """
+    转换为 (left, top, right, bottom)
+    :param rect: pyrect.Rect 或四元组
+    :return: tuple
+    """
+    if isinstance(rect, (tuple, list)):
+        return tuple(rect)
+    return rect.left, rect.top, rect.right, rect.bottom
+
+
+def overlap(a, b):
+    """
+    两个矩形是否重叠，包含也算重叠
+    :param a: box
+    :param b: box
+    :return: bool
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def collide_any(box, others):
+    """
+    矩形是否与任何一个矩形重叠，线性扫描，只查询一次时使用
+    :param box: box
+    :param others: Iterable[box]
+    :return: bool
+    """
+    return any(overlap(box, other) for other in others)
+
+
+def typical_size(boxes, default=64):
+    """
+    矩形边长的中位数，用作网格边长
+    :param boxes: list[box]
+    :param default: 没有矩形时的默认值
+    :return: float
+    """
+    sizes = [max(b[2] - b[0], b[3] - b[1]) for b in boxes]
+    return float(np.median(sizes)) if sizes else default
+
+
+class GridIndex:
+    """均匀网格空间索引"""
+
+    def __init__(self, cell=64):
+        """
+        :param cell: 网格边长，取矩形的典型尺寸效果最好
+        """
+        self.cell = max(1, int(cell))
+        self.boxes = []
+        self.items = []
+        self._grid = defaultdict(list)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def from_boxes(cls, boxes, items=None):
+        """
+        按矩形尺寸的中位数确定网格边长并建立索引
+        :param boxes: list[box]
+        :param items: 与矩形一一对应的对象
+        :return: GridIndex
+        """
+        index = cls(typical_size(boxes))
+        for i, box in enumerate(boxes):
+            index.insert(box, items[i] if items is not None else None)
+        return index
+
+    def _cells(self, box):
+        cell = self.cell
+        x_0, y_0 = int(box[0] // cell), int(box[1] // cell)
+        x_1, y_1 = int((box[2] - 1) // cell), int((box[3] - 1) // cell)
+        for gx in range(x_0, max(x_0, x_1) + 1):
+            for gy in range(y_0, max(y_0, y_1) + 1):
+                yield gx, gy
+
+    def insert(self, box, item=None):
+        """
+        加入一个矩形
+        :param box: box
+        :param item: 附带的对象
+        :return: int 序号
+        """
+        idx = len(self.boxes)
+        self.boxes.append(box)
+        self.items.append(item)
+        for key in self._cells(box):
+            self._grid[key].append(idx)
+        return idx
+
+    def query(self, box):
+        """
+        与 box 重叠的矩形序号，按插入顺序
+        :param box: box
+        :return: list[int]
+        """
+        found = set()
+        for key in self._cells(box):
+            for idx in self._grid.get(key, ()):
+                if idx not in found and overlap(box, self.boxes[idx]):
+                    found.add(idx)
+        return sorted(found)
+
+    def collide(self, box, predicate=None):
+        """
+        是否与已有矩形重叠
+        :param box: box
+        :param predicate: 附加条件 predicate(box, other_box) 为真才算碰撞
+        :return: bool
+        """
+        seen = set()
+        for key in self._cells(box):
+            for idx in self._grid.get(key, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                other = self.boxes[idx]
+                if overlap(box, other) and (predicate is None or predicate(box, other)):
+                    return True
+        return False
+
+
+def max_empty_rect(boxes, bound=None):
+    """
+    边界内不与任何矩形重叠的最大矩形
+    坐标压缩后用二维差分标记被占据的格子，再逐行做带宽度的直方图最大矩形，
+    复杂度 O(N^2)
+    :param boxes: list[box]
+    :param bound: 边界 box，默认为所有矩形的外接矩形
+    :return: box|None 没有空白时返回 None
+    """
+    if bound is None:
+        if not boxes:
+            return None
+        bound = (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+    clipped = []
+    for box in boxes:
+        box = (
+            max(box[0], bound[0]),
+            max(box[1], bound[1]),
+            min(box[2], bound[2]),
+            min(box[3], bound[3]),
+        )
+        if box[0] < box[2] and box[1] < box[3]:
+            clipped.append(box)
+
+    xs = sorted({bound[0], bound[2]} | {v for b in clipped for v in (b[0], b[2])})
+    ys = sorted({bound[1], bound[3]} | {v for b in clipped for v in (b[1], b[3])})
+    x_pos = {v: i for i, v in enumerate(xs)}
+    y_pos = {v: i for i, v in enumerate(ys)}
+
+    cover = np.zeros((len(ys), len(xs)), np.int32)
+    for box in clipped:
+        x_0, x_1 = x_pos[box[0]], x_pos[box[2]]
+        y_0, y_1 = y_pos[box[1]], y_pos[box[3]]
+        cover[y_0, x_0] += 1
+        cover[y_0, x_1] -= 1
+        cover[y_1, x_0] -= 1
+        cover[y_1, x_1] += 1
+    empty = cover.cumsum(0).cumsum(1)[:-1, :-1] == 0
+
+    widths = np.diff(xs).tolist()
+    lefts = xs[:-1]
+    best, best_area = None, 0
+    heights = [0] * len(widths)
+    for row, row_height in enumerate(np.diff(ys).tolist()):
+        row_empty = empty[row].tolist()
+        for col, free in enumerate(row_empty):
+            heights[col] = heights[col] + row_height if free else 0
+        bottom = ys[row + 1]
+        # 单调栈求直方图中的最大矩形，栈中保存 (起始列, 高度)
+        stack = []
+        for col in range(len(widths) + 1):
+            height = heights[col] if col < len(widths) else 0
+            start = col
+            while stack and stack[-1][1] >= height:
+                start, top_height = stack.pop()
+                right = lefts[col] if col < len(widths) else xs[-1]
+                area = (right - lefts[start]) * top_height
+                if area > best_area:
+                    best_area = area
+                    best = (lefts[start], bottom - top_height, right, bottom)
+            stack.append((start, height))
+    return best
@@ -1,18 +1,17 @@
 """矩形相关的操作"""
 from pyrect import Rect
 
+from . import geometry
+
 
 def collide_any(rect, others):
     """
-    矩形碰撞判断
+    矩形碰撞判断，重叠或包含都算碰撞
     :param rect: Rect
     :param others: List[Rect]
     :return: bool
     """
-    for other in others:
-        if rect.collide(other) or other.collide(rect):
-            return True
-    return False
+    return geometry.collide_any(geometry.box_of(rect), map(geometry.box_of, others))
 
 
 def union_all(otherRects):
@@ -25,35 +24,10 @@ def union_all(otherRects):
 
 def max_left(rects):
     """最大剩余矩形
-    复杂度 N*4
+    外接矩形内不与任何矩形重叠的最大矩形，复杂度 N^2
     """
-    rects.append(union_all(rects))
-    hlines = set()
-    vlines = set()
-    for rect in rects:
-        hlines.add(rect.top)
-        hlines.add(rect.bottom)
-        vlines.add(rect.left)
-        vlines.add(rect.right)
-    vlines = list(vlines)
-    vlines.sort()
-    hlines = list(hlines)
-    hlines.sort()
-
-    rects.pop()
-    max_rect = Rect()
-    max_area = 0
-    for li in range(0, len(vlines) - 1):
-        for ri in range(li + 1, len(vlines)):
-            for ti in range(0, len(hlines) - 1):
-                for bi in range(ti + 1, len(hlines)):
-                    c = Rect(
-                        vlines[li],
-                        hlines[ti],
-                        vlines[ri] - vlines[li],
-                        hlines[bi] - hlines[ti],
-                    )
-                    if not collide_any(c, rects) and c.area >= max_area:
-                        max_rect = c
-                        max_area = c.area
-    return max_rect
+    box = geometry.max_empty_rect([geometry.box_of(r) for r in rects])
+    if box is None:
+        return Rect()
+    left, top, right, bottom = box
+    return Rect(left, top, right - left, bottom - top)
@@ -2,10 +2,13 @@ import io
 import random
 import re
 import string
+from functools import partial
 
 import requests
 from PIL import Image
 
+from .assets import get_provider
+
 headers = {
     "Connection": "keep-alive",
     "Cache-Control": "max-age=0",
@@ -30,15 +33,30 @@ def open_url(img_url):
     return Image.open(io.BytesIO(get_img(img_url)))
 
 
-def rand_image(w, h):
+def fetch_image(w=1024, h=768):
     return Image.open(io.BytesIO(get_img(randimg(w, h))))
 
 
-def rand_person():
+def fetch_person():
     return Image.open(io.BytesIO(get_img("https://thispersondoesnotexist.com/image")))
 
 
+def rand_image(w, h):
+    return get_provider("background", fetch_image)(w, h)
+
+
+def rand_person():
+    return get_provider("person", fetch_person).get()
+
+
 def rand_logo(letter=None):
+    if not letter:
+        return get_provider("logo", fetch_logo).get()
+    letter = letter.upper()
+    return get_provider(f"logo/{letter}", partial(fetch_logo, letter)).get()
+
+
+def fetch_logo(letter=None):
     if not letter:
         letter = random.choice(string.ascii_uppercase)
     url = f"https://www.logosc.cn/logo/{letter}%E5%AD%97%E6%AF%8D"
@@ -0,0 +1,184 @@
+"""
+多进程生产者/消费者流水线
+每个阶段运行在自己的进程池中，阶段之间用有界队列相连，
+下游处理不过来时上游阻塞，内存占用与批量无关。
+每个工作进程各自构造一份工作对象，并重新设置随机种子，
+只做简单工作的阶段可以单独指定更轻量的构造函数。
+"""
+import multiprocessing as mp
+import os
+import random
+import time
+import traceback
+
+import numpy as np
+from tqdm import tqdm
+
+STAGES = ("generate", "render", "postprocess", "write")
+
+
+def plan_workers(workers=None):
+    """
+    各阶段的进程数
+    :param workers: int 渲染和后处理的进程数，默认 CPU 核数；dict 直接指定各阶段
+    :return: dict 阶段名到进程数
+    """
+    if isinstance(workers, dict):
+        return {name: max(1, int(workers.get(name, 1))) for name in STAGES}
+    workers = workers or os.cpu_count() or 1
+    light = max(1, workers // 4)
+    return {
+        "generate": light,
+        "render": workers,
+        "postprocess": workers,
+        "write": light,
+    }
+
+
+def unique_name(prefix="0"):
+    """
+    输出文件名，毫秒时间戳，在工作进程中附加进程号避免重名
+    :param prefix: 前缀
+    :return: str
+    """
+    name = prefix + str(int(time.time() * 1000))[5:]
+    if mp.current_process().name != "MainProcess":
+        name += "_%d" % os.getpid()
+    return name
+
+
+def _reseed(worker):
+    """fork 出的进程继承了相同的随机状态，必须各自重设"""
+    from faker import Faker
+
+    seed = (os.getpid() * 1000003 + time.time_ns()) % (2**32)
+    random.seed(seed)
+    np.random.seed(seed)
+    Faker.seed(seed)
+    if hasattr(worker, "seed"):
+        worker.seed(seed)
+
+
+def _finish(lock, finished, workers, out_q, downstream):
+    """本阶段最后一个退出的进程通知下游每个进程结束"""
+    with lock:
+        finished.value += 1
+        last = finished.value == workers
+    if last:
+        for _ in range(downstream):
+            out_q.put(None)
+
+
+def _source_worker(builder, stage, count, out_q, finish):
+    try:
+        worker = builder()
+        _reseed(worker)
+        for item in getattr(worker, stage)(count):
+            out_q.put(item)
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        _finish(*finish)
+
+
+def _stage_worker(builder, stage, in_q, out_q, finish):
+    try:
+        worker = builder()
+        _reseed(worker)
+        func = getattr(worker, stage)
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        func = None  # 构造失败也要取走上游数据，否则上游会一直阻塞
+    try:
+        while True:
+            item = in_q.get()
+            if item is None:
+                break
+            if func is None:
+                continue
+            try:
+                out = func(item)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                continue
+            if out is not None:
+                out_q.put(out)
+    finally:
+        _finish(*finish)
+
+
+class Pipeline:
+    """多进程流水线"""
+
+    def __init__(self, builder, stages, queue_size=16, builders=None):
+        """
+        :param builder: 无参可调用对象，在每个工作进程中构造工作对象，需可 pickle，
+            例如 functools.partial(工厂类, 参数...)
+        :param stages: list[tuple[str,int]] 工作对象的方法名和进程数。
+            第一个阶段是生产者，method(count) 返回迭代器；
+            其余阶段 method(item) 返回下一阶段的输入，返回 None 表示丢弃
+        :param queue_size: 阶段之间的队列长度
+        :param builders: dict 阶段名到该阶段专用的构造函数，未列出的阶段用 builder
+        """
+        self.builder = builder
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.builders = builders or {}
+
+    def run(self, total, desc="Pipeline"):
+        """
+        运行到生产者产出 total 个样本全部处理完毕
+        :param total: int 总数，按生产者进程数平分
+        :param desc: 进度条描述
+        :return: int 完成的样本数
+        """
+        ctx = mp.get_context()
+        queues = [ctx.Queue(self.queue_size) for _ in self.stages[1:]]
+        queues.append(ctx.Queue())  # 最后一个阶段的结果只用于计数
+        processes = []
+        for i, (stage, workers) in enumerate(self.stages):
+            downstream = self.stages[i + 1][1] if i + 1 < len(self.stages) else 1
+            finish = (ctx.Lock(), ctx.Value("i", 0), workers, queues[i], downstream)
+            builder = self.builders.get(stage, self.builder)
+            for wno in range(workers):
+                if i == 0:
+                    count = total // workers + (wno < total % workers)
+                    target = _source_worker
+                    args = (builder, stage, count, queues[0], finish)
+                else:
+                    target = _stage_worker
+                    args = (builder, stage, queues[i - 1], queues[i], finish)
+                processes.append(
+                    ctx.Process(target=target, args=args, name=f"{stage}-{wno}")
+                )
+        for proc in processes:
+            proc.start()
+
+        done = 0
+        pbar = tqdm(total=total)
+        pbar.set_description(desc)
+        while queues[-1].get() is not None:
+            done += 1
+            pbar.update(1)
+        pbar.close()
+        for proc in processes:
+            proc.join()
+        return done
+
+
+def run_stages(
+    builder, total, workers=None, queue_size=16, desc="Pipeline", builders=None
+):
+    """
+    按 generate/render/postprocess/write 四个阶段运行工厂
+    :param builder: 构造工厂的无参可调用对象
+    :param total: 总数
+    :param workers: 见 plan_workers
+    :param queue_size: 队列长度
+    :param desc: 进度条描述
+    :param builders: 见 Pipeline，例如保存阶段只构造写文件的对象
+    :return: int 完成的样本数
+    """
+    plan = plan_workers(workers)
+    stages = [(name, plan[name]) for name in STAGES]
+    return Pipeline(builder, stages, queue_size, builders).run(total, desc)